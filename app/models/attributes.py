@@ -4,7 +4,7 @@ from typing import Any, Optional
 import numpy as np
 from enum import Enum, auto
 
-from app.utils.helpers import validate_location, verify_did, StakeholderType, prob_transform, MetricNames
+from app.utils.helpers import validate_location, verify_did, StakeholderType, prob_transform_array, MetricNames
 from app.models.did import DID
 from app.trust_evaluation.probabilistic import SingleFeatureTrustModel
 
@@ -31,6 +31,10 @@ RANGES = {
         MetricNames.UTILIZATION_RATE: (0, 1, 1)
 }
 
+# RANGES as arrays for vectorized transformations, aligned with RANGES_INDEX
+RANGES_INDEX = {metric_name: index for index, metric_name in enumerate(RANGES)}
+RANGES_MINIMUM, RANGES_MAXIMUM, RANGES_BEHAVIOUR = (np.array(column, dtype=float) for column in zip(*RANGES.values()))
+
 class TrustCalcModel(Enum):
     DETERMINISTIC = auto()
     PROBABILISTIC = auto()
@@ -38,6 +42,9 @@ class TrustCalcModel(Enum):
 DEFAULT_TRUST_ATTRIBUTE = 0.5
 
 class Attribute(ABC):
+    # Fleets hold millions of attributes, slots keep them small
+    __slots__ = ("trust", "weight")
+
     trust: float
     weight: Optional[float]  # Weight is optional
 
@@ -51,6 +58,7 @@ class Attribute(ABC):
 
 
 class Identity(Attribute):
+    __slots__ = ("did",)
 
     def __init__(self, entity: StakeholderType, did: DID):
         super().__init__()
@@ -66,6 +74,7 @@ class Identity(Attribute):
 
 
 class Reputation(Attribute):
+    __slots__ = ()
 
     def __init__(self, entity: StakeholderType, trust: Optional[Any] = None):
         super().__init__(AttributeWeights.REPUTATION[entity])
@@ -79,6 +88,7 @@ class Reputation(Attribute):
 
         
 class DirectTrust(Attribute):
+    __slots__ = ()
 
     def __init__(self, entity: StakeholderType, trust: Optional[Any] = None):
         super().__init__(AttributeWeights.DIRECT_TRUST[entity])
@@ -93,6 +103,7 @@ class DirectTrust(Attribute):
 
 
 class Compliance(Attribute):
+    __slots__ = ()
 
     def __init__(self, entity: StakeholderType, trust: Optional[Any] = None):
         super().__init__(AttributeWeights.COMPLIANCE[entity])
@@ -105,6 +116,7 @@ class Compliance(Attribute):
 
 
 class HistoricalBehavior(Attribute):
+    __slots__ = ()
 
     def __init__(self, entity: StakeholderType, trust: Optional[Any] = None):
         super().__init__(AttributeWeights.HISTORICAL_BEHAVIOR[entity])
@@ -118,6 +130,7 @@ class HistoricalBehavior(Attribute):
 
 
 class Performance(Attribute):
+    __slots__ = ("metrics", "sftm")
 
     def __init__(self, entity: StakeholderType, metrics: Any):
         super().__init__(AttributeWeights.PERFORMANCE[entity])
@@ -128,28 +141,47 @@ class Performance(Attribute):
             self.sftm.append(SingleFeatureTrustModel(name=key))
         pass
 
+    def normalize_metrics(self, metric_keys) -> dict:
+        """
+        Transform the values of the given metrics to probabilities with a single vectorized pass.
+        Metrics without a range are expected to be probabilities already.
+        """
+        ranged_keys = [key for key in metric_keys if key in RANGES_INDEX]
+        values = np.fromiter(
+            (value for key in ranged_keys for value in self.metrics[key]), dtype=float
+        )
+        range_indices = np.repeat(
+            [RANGES_INDEX[key] for key in ranged_keys], [len(self.metrics[key]) for key in ranged_keys]
+        ).astype(int)
+        probabilities = prob_transform_array(
+            RANGES_MINIMUM[range_indices], RANGES_MAXIMUM[range_indices], RANGES_BEHAVIOUR[range_indices], values
+        )
+
+        normalized_metrics = {}
+        offset = 0
+        for key in metric_keys:
+            if key in RANGES_INDEX:
+                normalized_metrics[key] = probabilities[offset:offset + len(self.metrics[key])]
+                offset += len(self.metrics[key])
+            else:
+                normalized_metrics[key] = self.metrics[key]
+        return normalized_metrics
+
     def compute_performance(self, model):
 
         if model == TrustCalcModel.DETERMINISTIC:
-            normalized_metrics = []
-            for metric_key in self.metrics.keys():
-                for metric_value in self.metrics[metric_key]:
-                    minimum, maximum, behavior = RANGES[metric_key]
-                    v_prob = prob_transform(minimum, maximum, behavior, metric_value)
-                    normalized_metrics.append(v_prob)
-            trust = np.mean(normalized_metrics)
+            normalized_metrics = self.normalize_metrics(list(self.metrics.keys()))
+            measurements = np.concatenate(list(normalized_metrics.values()))
+            # Without measurements, e.g. after a failed aggregator request, the trust is the default one
+            trust = np.mean(measurements) if len(measurements) else DEFAULT_TRUST_ATTRIBUTE
             for key in self.metrics.keys():
                 self.metrics[key] = []
             return trust
             
         elif model == TrustCalcModel.PROBABILISTIC:
+            normalized_metrics = self.normalize_metrics([m.name for m in self.sftm])
             for m in self.sftm:
-                for v in self.metrics[m.name]:
-                    if m.name in RANGES:
-                        minimum, maximum, behavior = RANGES[m.name]
-                        v_prob = prob_transform(minimum, maximum, behavior, v)
-                    else: 
-                        v_prob = v
+                for v_prob in normalized_metrics[m.name]:
                     m.observe(v_prob)
 
             for key in self.metrics.keys():
@@ -163,6 +195,7 @@ class Performance(Attribute):
 
 
 class Location(Attribute):
+    __slots__ = ("lat", "lon")
 
     def __init__(self, entity: StakeholderType, lat: float, lon: float):
         super().__init__()
@@ -179,6 +212,7 @@ class Location(Attribute):
 
 
 class ContextualFit(Attribute):
+    __slots__ = ()
 
     def __init__(self, entity: StakeholderType, trust: Optional[Any] = None):
         super().__init__(AttributeWeights.CONTEXTUAL_FIT[entity])
@@ -192,6 +226,7 @@ class ContextualFit(Attribute):
 
 
 class ThirdPartyValidation(Attribute):
+    __slots__ = ()
 
     def __init__(self, entity: StakeholderType, trust: Optional[Any] = None):
         super().__init__(AttributeWeights.THIRD_PARTY_VALIDATION[entity])
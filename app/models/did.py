@@ -1,7 +1,7 @@
 
 
 class DID:
-
+    __slots__ = ("raw",)
 
     def __init__(self, did_raw):
         self.raw: str = did_raw
@@ -0,0 +1,59 @@
+import hashlib
+from enum import StrEnum
+from pathlib import Path
+from typing import NamedTuple
+
+from app.utils.helpers import build_batched_graphql_query
+
+
+QUERY_DIRECTORY = Path(__file__).parent.absolute()
+
+
+class GraphQLQueryFPath(StrEnum):
+    RESOURCE_PROVIDER = "query_resource_provider.graphql"
+    RESOURCE_CAPACITY = "query_resource_capacity.graphql"
+    APPLICATION_PROVIDER = "query_application_provider.graphql"
+
+
+class GraphQLQuery(NamedTuple):
+    document: str
+    # Identifies the document as an automatic persisted query
+    sha256_hash: str
+
+    @classmethod
+    def from_document(cls, document: str) -> "GraphQLQuery":
+        return cls(document, hashlib.sha256(document.encode()).hexdigest())
+
+
+class GraphQLQueryRegistry:
+    """
+    Documents of all aggregator queries, read once from `directory`, and the batched documents
+    built from them, which are cached by batch size on first use.
+    """
+
+    def __init__(self, directory: Path = QUERY_DIRECTORY):
+        self.queries: dict[GraphQLQueryFPath, GraphQLQuery] = {}
+        for query_fpath in GraphQLQueryFPath:
+            with open(directory / query_fpath, 'r') as query_file:
+                self.queries[query_fpath] = GraphQLQuery.from_document(query_file.read())
+        self._batched_queries: dict[tuple[GraphQLQueryFPath, int], GraphQLQuery] = {}
+
+    def get(self, query_fpath: GraphQLQueryFPath) -> GraphQLQuery:
+        return self.queries[query_fpath]
+
+    def get_batched(self, query_fpath: GraphQLQueryFPath, batch_size: int) -> GraphQLQuery:
+        """
+        Document of `batch_size` aliased copies of the query, see `build_batched_graphql_query`.
+        """
+        key = (query_fpath, batch_size)
+        batched_query = self._batched_queries.get(key)
+        if batched_query is None:
+            # Concurrent misses build the same document, so the race is harmless
+            batched_query = GraphQLQuery.from_document(
+                build_batched_graphql_query(self.queries[query_fpath].document, batch_size)
+            )
+            self._batched_queries[key] = batched_query
+        return batched_query
+
+
+query_registry = GraphQLQueryRegistry()
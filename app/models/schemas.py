@@ -1,5 +1,5 @@
 
-from typing import List
+from typing import List, Optional
 from datetime import datetime
 
 from pydantic import BaseModel
@@ -12,4 +12,26 @@ class StakeholderResponse(BaseModel):
     deterministic_trust: int
 
 class AllStakeholdersResponse(BaseModel):
-    stakeholders: List[StakeholderResponse]
\ No newline at end of file
+    stakeholders: List[StakeholderResponse]
+    # DID to pass as `after` to get the next page, None on the last page
+    next_cursor: Optional[str] = None
+
+class StakeholderCreate(BaseModel):
+    did: str
+    stakeholder_type: int
+    name: str
+    owner: str
+    metrics_url: Optional[str] = None
+    provider: Optional[str] = None
+
+class StakeholderRowError(BaseModel):
+    # Position of the row in the request
+    index: int
+    did: Optional[str] = None
+    detail: str
+
+class BulkInsertResponse(BaseModel):
+    inserted: int
+    errors: List[StakeholderRowError]
+    # Only with evaluate=true, otherwise trust is evaluated on the first request or by the precomputation
+    stakeholders: List[StakeholderResponse] = []
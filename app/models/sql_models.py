@@ -2,6 +2,7 @@ import uuid
 from datetime import datetime
 from typing import Optional
 
+from sqlalchemy import Column, JSON
 from sqlmodel import Field, SQLModel
 
 
@@ -10,9 +11,9 @@ class Stakeholder(SQLModel, table=True):
         primary_key=True, index=True
     )
 
-    type: int
+    type: int = Field(index=True)
     name: str
-    provider: Optional[str] = None
+    provider: Optional[str] = Field(default=None, index=True)
     metrics_url: Optional[str] = None
 
     identity: str = Field()
@@ -26,5 +27,25 @@ class Stakeholder(SQLModel, table=True):
     third_party_validation: Optional[float] = None
 
     created_at: datetime
-    owner: str
+    owner: str = Field(index=True)
 
+
+class TrustModelState(SQLModel, table=True):
+    did: str = Field(primary_key=True)
+    metric: str = Field(primary_key=True)
+
+    alpha: float
+    beta: float
+    n_eff: float
+    measurements: list[float] = Field(default_factory=list, sa_column=Column(JSON))
+
+    updated_at: datetime
+
+
+class TrustScore(SQLModel, table=True):
+    did: str = Field(primary_key=True)
+
+    probabilistic_trust: int
+    deterministic_trust: int
+
+    computed_at: datetime = Field(index=True)
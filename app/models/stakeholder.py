@@ -1,13 +1,16 @@
+import asyncio
+import logging
 import uuid
-from typing import Any, Optional
+from typing import Any, Optional, Iterable, Iterator
 from abc import ABC
-from enum import StrEnum
-from pathlib import Path
 
 from .did import DID
-from app.utils.helpers import StakeholderType, get_graphql_query_json, camel_to_snake_case
+from .graphql_queries import GraphQLQueryFPath, query_registry
+from app.utils.helpers import StakeholderType, get_graphql_query_json, get_batched_graphql_query_json, \
+                             get_batched_graphql_query_json_async, camel_to_snake_case
 from app.utils.settings import settings
 from app.utils.helpers import MetricNames
+from app.utils.metrics import STAGE_DURATION, ATTRIBUTE_BINDING
 from .attributes import Identity, \
                        Reputation, \
                        DirectTrust, \
@@ -24,14 +27,7 @@ DEFAULT_ATTRIBUTE_VALUE = 1
 DEFAULT_LONGITUDE = 15.0
 DEFAULT_LATITUDE = 46.0
 
-TRUST_METRIC_AGGREGATOR_HOST = settings.trust_metric_aggregator_host
-TRUST_METRIC_AGGREGATOR_PORT = settings.trust_metric_aggregator_port
-
-class GraphQLQueryFPath(StrEnum):
-    RESOURCE_PROVIDER = "query_resource_provider.graphql"
-    RESOURCE_CAPACITY = "query_resource_capacity.graphql"
-    APPLICATION_PROVIDER = "query_application_provider.graphql"
-
+logger = logging.getLogger(__name__)
 
 class Stakeholder(ABC):
 
@@ -62,36 +58,159 @@ class Stakeholder(ABC):
         self.direct_trust = DirectTrust(entity_idx, direct_trust)
 
     def get_new_attributes(self) -> dict:
-        aggregator_url = f"http://{TRUST_METRIC_AGGREGATOR_HOST}:{TRUST_METRIC_AGGREGATOR_PORT}"
-        query_abs_fpath = Path(__file__).parent.absolute() / self.graphql_query_fpath
+        # The client pulls in httpx, so it is only imported once attributes are fetched
+        from app.utils.aggregator_client import get_aggregator_client
+
         query_variables = {"did": self.did.raw}
-        aggregator_data = get_graphql_query_json(aggregator_url, query_abs_fpath, query_variables)
+        aggregator_data = get_graphql_query_json(
+            get_aggregator_client(), query_registry.get(self.graphql_query_fpath), query_variables
+        )
         return aggregator_data
 
-    def update_attributes(self):
+    def update_attributes(self, new_trust_attributes: Optional[dict] = None):
         """
-        Used for updating attributes.
+        Used for updating attributes. Attributes already fetched from the aggregator
+        (e.g. by `get_new_attributes_batch`) can be passed to avoid another request.
         """
-        new_trust_attributes = self.get_new_attributes()
         if new_trust_attributes is None:
-            print(f"No trust attributes returned for stakeholder {self.did.raw}. Skipping update.")
+            new_trust_attributes = self.get_new_attributes()
+        if new_trust_attributes is None:
+            logger.warning("No trust attributes returned for stakeholder %s. Skipping update.", self.did.raw)
             return
 
-        # Iterate and determine new values of attributes of trust attributes
-        # Important: attributes (in snake case) must have the same name as GraphQL attributes (in camel case)
-        for trust_attribute_key, trust_attribute_value in new_trust_attributes.items():
-            for attr_key, attr_value in trust_attribute_value.items():
-                trust_attribute = getattr(self, camel_to_snake_case(trust_attribute_key))
-
-                # For performance metrics instead append the value
-                if camel_to_snake_case(trust_attribute_key) == 'performance':
-                    if (trust_attribute and
-                            hasattr(trust_attribute, 'metrics') and
-                            camel_to_snake_case(attr_key) in trust_attribute.metrics):
-                        trust_attribute.metrics[camel_to_snake_case(attr_key)].append(attr_value)
-                else:
-                    if trust_attribute and hasattr(trust_attribute, camel_to_snake_case(attr_key)):
-                        setattr(trust_attribute, camel_to_snake_case(attr_key), attr_value)
+        with STAGE_DURATION.time(ATTRIBUTE_BINDING):
+            self._bind_attributes(new_trust_attributes)
+
+    def _bind_attributes(self, new_trust_attributes: dict):
+        binder = _attribute_binders.get(type(self))
+        if binder is None:
+            binder = _attribute_binders.setdefault(type(self), AttributeBinder())
+        binder.bind(self, new_trust_attributes)
+
+
+class AttributeBinder:
+    """
+    Binds GraphQL responses of the aggregator to the trust attributes of one stakeholder class.
+    Important: attributes (in snake case) must have the same name as GraphQL attributes (in camel case).
+
+    The target of every GraphQL field is resolved once per class, on its first occurrence: the name of
+    the trust attribute, and per subfield the performance metric its value is appended to or the member
+    of the attribute which is set, or None if the attribute has no such member. Binding a response then
+    needs no name conversions or lookups of members. Only the trust attribute itself is looked up on
+    every call (`getattr(stakeholder, attribute_name)`), as it belongs to the bound stakeholder.
+    """
+
+    def __init__(self):
+        # Per GraphQL field: name of the trust attribute, whether it is the performance, and targets of subfields
+        self._fields: dict[str, tuple[str, bool, dict[str, Optional[str]]]] = {}
+
+    def _resolve_field(self, field: str) -> tuple[str, bool, dict[str, Optional[str]]]:
+        attribute_name = camel_to_snake_case(field)
+        binding = self._fields[field] = (attribute_name, attribute_name == 'performance', {})
+        return binding
+
+    @staticmethod
+    def _resolve_subfield(trust_attribute, is_performance: bool, subfield: str) -> Optional[str]:
+        member_name = camel_to_snake_case(subfield)
+        if is_performance:
+            metrics = getattr(trust_attribute, 'metrics', None)
+            return member_name if metrics is not None and member_name in metrics else None
+        return member_name if hasattr(trust_attribute, member_name) else None
+
+    def bind(self, stakeholder: "Stakeholder", new_trust_attributes: dict):
+        fields = self._fields
+        for field, values in new_trust_attributes.items():
+            binding = fields.get(field)
+            if binding is None:
+                binding = self._resolve_field(field)
+            attribute_name, is_performance, targets = binding
+
+            trust_attribute = getattr(stakeholder, attribute_name)
+            if not trust_attribute:
+                continue
+            if is_performance:
+                metrics = trust_attribute.metrics
+                for subfield, value in values.items():
+                    if subfield not in targets:
+                        targets[subfield] = self._resolve_subfield(trust_attribute, True, subfield)
+                    metric_name = targets[subfield]
+                    if metric_name is not None:
+                        metrics[metric_name].append(value)
+            else:
+                for subfield, value in values.items():
+                    if subfield not in targets:
+                        targets[subfield] = self._resolve_subfield(trust_attribute, False, subfield)
+                    member_name = targets[subfield]
+                    if member_name is not None:
+                        setattr(trust_attribute, member_name, value)
+
+
+# Binder of every stakeholder class, created on the first update of its attributes
+_attribute_binders: dict[type, AttributeBinder] = {}
+
+
+def _chunk_query_targets(query_targets: Iterable[tuple[str, GraphQLQueryFPath]],
+                         batch_size: int) -> Iterator[tuple[GraphQLQueryFPath, list[str]]]:
+    """
+    Group `(did, graphql_query_fpath)` pairs by query and split them into chunks of `batch_size` DIDs.
+    Pairs without a DID, e.g. of a capacity whose provider is not set, are skipped.
+    """
+    dids_by_query = {}
+    for did, graphql_query_fpath in query_targets:
+        if did is None:
+            continue
+        dids_by_query.setdefault(graphql_query_fpath, {})[did] = None
+
+    for graphql_query_fpath, dids in dids_by_query.items():
+        dids = list(dids)
+        for chunk_start in range(0, len(dids), batch_size):
+            yield graphql_query_fpath, dids[chunk_start:chunk_start + batch_size]
+
+
+def get_new_attributes_batch(query_targets: Iterable[tuple[str, GraphQLQueryFPath]],
+                             batch_size: Optional[int] = None) -> dict[str, Optional[dict]]:
+    """
+    Fetch the trust attributes of many stakeholders with as few aggregator requests as possible.
+    Targets are `(did, graphql_query_fpath)` pairs which are grouped by query and sent in chunks
+    of `batch_size` aliased queries (the `aggregator_batch_size` setting by default). Returns the
+    attributes of every DID in the same format as `Stakeholder.get_new_attributes`, ready to be
+    passed to `Stakeholder.update_attributes`.
+    """
+    from app.utils.aggregator_client import get_aggregator_client
+
+    aggregator_client = get_aggregator_client()
+
+    new_attributes = {}
+    for graphql_query_fpath, chunk in _chunk_query_targets(query_targets, batch_size or settings.aggregator_batch_size):
+        query_variables = [{"did": did} for did in chunk]
+        batched_query = query_registry.get_batched(graphql_query_fpath, len(chunk))
+        aggregator_data = get_batched_graphql_query_json(aggregator_client, batched_query, query_variables)
+        # Failed requests are already reported, so their stakeholders are skipped instead of refetched
+        new_attributes.update((did, data or {}) for did, data in zip(chunk, aggregator_data))
+    return new_attributes
+
+
+async def get_new_attributes_batch_async(query_targets: Iterable[tuple[str, GraphQLQueryFPath]],
+                                         batch_size: Optional[int] = None) -> dict[str, Optional[dict]]:
+    """
+    Async variant of `get_new_attributes_batch` which sends the requests of all chunks concurrently.
+    """
+    from app.utils.aggregator_client import get_aggregator_client
+
+    aggregator_client = get_aggregator_client()
+
+    chunks = list(_chunk_query_targets(query_targets, batch_size or settings.aggregator_batch_size))
+    aggregator_data = await asyncio.gather(*(
+        get_batched_graphql_query_json_async(
+            aggregator_client, query_registry.get_batched(graphql_query_fpath, len(chunk)), [{"did": did} for did in chunk]
+        )
+        for graphql_query_fpath, chunk in chunks
+    ))
+
+    new_attributes = {}
+    for (_, chunk), chunk_data in zip(chunks, aggregator_data):
+        new_attributes.update((did, data or {}) for did, data in zip(chunk, chunk_data))
+    return new_attributes
 
 
 class ResourceProvider(Stakeholder): # or Resource Capacity provider
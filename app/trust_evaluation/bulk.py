@@ -0,0 +1,172 @@
+import json
+from datetime import datetime
+from random import random
+from typing import Optional
+
+from pydantic import ValidationError
+from sqlalchemy import delete, or_
+from sqlmodel import Session, select
+
+from app.models.schemas import StakeholderCreate, StakeholderRowError
+from app.models.sql_models import Stakeholder, TrustModelState, TrustScore
+from app.trust_evaluation.table import CAPACITY_TYPES, PROVIDER_TYPES
+from app.utils.database import dialect_insert
+from app.utils.helpers import StakeholderType
+
+
+def new_stakeholder_values(stakeholder_did: str, stakeholder_type: int, name: str, owner: str,
+                           metrics_url: Optional[str] = None, provider: Optional[str] = None) -> dict:
+    """
+    Column values of a newly registered stakeholder.
+    """
+    # Use valid Slovenian coordinates
+    slovenia_lat = 46.0
+    slovenia_lon = 15.0
+    return dict(
+        did=stakeholder_did,
+        type=stakeholder_type,
+        name=name,
+        provider=provider,
+        metrics_url=metrics_url,
+        identity="vc",
+        reputation=random(),
+        direct_trust=random(),
+        compliance=random(),
+        historical_behavior=random(),
+        location_lat=slovenia_lat,
+        location_lon=slovenia_lon,
+        contextual_fit=random(),
+        third_party_validation=random(),
+        created_at=datetime.now(),
+        owner=owner
+    )
+
+
+def parse_stakeholders(body: bytes, ndjson: bool) -> tuple[list[tuple[int, StakeholderCreate]], list[StakeholderRowError]]:
+    """
+    Parse a JSON list or NDJSON lines of stakeholders. Returns the valid rows with their index and the errors
+    of the invalid ones. Raises ValueError if the body is not a JSON list.
+    """
+    if ndjson:
+        raw_rows = [line for line in body.splitlines() if line.strip()]
+    else:
+        raw_rows = json.loads(body)
+        if not isinstance(raw_rows, list):
+            raise ValueError("Expected a list of stakeholders.")
+
+    stakeholders = []
+    errors = []
+    for index, raw_row in enumerate(raw_rows):
+        try:
+            if ndjson:
+                stakeholder = StakeholderCreate.model_validate_json(raw_row)
+            else:
+                stakeholder = StakeholderCreate.model_validate(raw_row)
+        except ValidationError as e:
+            errors.append(StakeholderRowError(index=index, detail=str(e)))
+            continue
+        stakeholders.append((index, stakeholder))
+    return stakeholders, errors
+
+
+def insert_stakeholders(session: Session, stakeholders: list[tuple[int, StakeholderCreate]],
+                        errors: list[StakeholderRowError]) -> list[str]:
+    """
+    Insert the stakeholders which can be registered with one executemany statement and commit them.
+    Rows with an unknown type, a DID which is already registered (also concurrently) or a missing provider
+    are added to `errors` instead. Returns the DIDs of the inserted stakeholders.
+    """
+    dids = [stakeholder.did for _, stakeholder in stakeholders]
+    registered_dids = set(session.exec(select(Stakeholder.did).where(Stakeholder.did.in_(dids))).all())
+    provider_dids = {stakeholder.provider for _, stakeholder in stakeholders if stakeholder.provider is not None}
+    registered_provider_dids = set(
+        session.exec(select(Stakeholder.did).where(Stakeholder.did.in_(provider_dids))).all()
+    )
+
+    accepted = {}
+    for index, stakeholder in stakeholders:
+        if stakeholder.stakeholder_type not in StakeholderType._value2member_map_:
+            detail = "Incorrect stakeholder type."
+        elif stakeholder.did in registered_dids:
+            detail = "Stakeholder is already registered."
+        elif stakeholder.did in accepted:
+            detail = "Duplicate stakeholder in request."
+        else:
+            accepted[stakeholder.did] = (index, stakeholder)
+            continue
+        errors.append(StakeholderRowError(index=index, did=stakeholder.did, detail=detail))
+
+    # Capacities may refer to providers registered in the same request
+    for did, (index, stakeholder) in list(accepted.items()):
+        if stakeholder.stakeholder_type in CAPACITY_TYPES and \
+                stakeholder.provider not in registered_provider_dids and stakeholder.provider not in accepted:
+            del accepted[did]
+            errors.append(StakeholderRowError(index=index, did=did, detail="No such provider."))
+
+    if accepted:
+        # Stakeholders registered concurrently since the check above are skipped instead of failing the batch
+        statement = dialect_insert(session, Stakeholder.__table__).on_conflict_do_nothing(index_elements=["did"])
+        inserted_dids = set(session.connection().execute(
+            statement.returning(Stakeholder.__table__.c.did),
+            [
+                new_stakeholder_values(stakeholder.did, stakeholder.stakeholder_type, stakeholder.name,
+                                       stakeholder.owner, stakeholder.metrics_url, stakeholder.provider)
+                for _, stakeholder in accepted.values()
+            ]
+        ).scalars())
+        delete_stored_trust(session, inserted_dids)
+        session.commit()
+        for did, (index, _) in list(accepted.items()):
+            if did not in inserted_dids:
+                del accepted[did]
+                errors.append(StakeholderRowError(index=index, did=did, detail="Stakeholder is already registered."))
+
+    errors.sort(key=lambda error: error.index)
+    return list(accepted)
+
+
+def delete_stored_trust(session: Session, dids) -> None:
+    """
+    Delete the trust model states and scores stored for `dids` without committing, e.g. left behind by
+    evaluations of a stakeholder with the same DID which ran while it was deleted.
+    """
+    connection = session.connection()
+    connection.execute(delete(TrustModelState).where(TrustModelState.did.in_(dids)))
+    connection.execute(delete(TrustScore).where(TrustScore.did.in_(dids)))
+
+
+def delete_stakeholders(session: Session, dids: list[str]) -> dict:
+    """
+    Delete stakeholders, the resources of the providers among them and their stored trust model states
+    and scores with set-based statements in one transaction. Returns the DIDs which were not registered
+    and the number of deleted rows of every table.
+    """
+    registered = session.exec(select(Stakeholder.did, Stakeholder.type).where(Stakeholder.did.in_(dids))).all()
+    registered_dids = [did for did, _ in registered]
+    provider_dids = [did for did, stakeholder_type in registered if stakeholder_type in PROVIDER_TYPES]
+
+    # Remember that some resources have null providers, they are never matched
+    resource_dids = select(Stakeholder.did).where(Stakeholder.provider.in_(provider_dids))
+    connection = session.connection()
+    deleted_trust_model_states = connection.execute(
+        delete(TrustModelState).where(or_(TrustModelState.did.in_(registered_dids), TrustModelState.did.in_(resource_dids)))
+    ).rowcount
+    deleted_trust_scores = connection.execute(
+        delete(TrustScore).where(or_(TrustScore.did.in_(registered_dids), TrustScore.did.in_(resource_dids)))
+    ).rowcount
+    deleted_resources = connection.execute(
+        delete(Stakeholder).where(Stakeholder.provider.in_(provider_dids), Stakeholder.did.not_in(registered_dids))
+    ).rowcount
+    deleted_stakeholders = connection.execute(
+        delete(Stakeholder).where(Stakeholder.did.in_(registered_dids))
+    ).rowcount
+    session.commit()
+
+    registered_dids = set(registered_dids)
+    return {
+        "not_found": [did for did in dict.fromkeys(dids) if did not in registered_dids],
+        "stakeholders": deleted_stakeholders,
+        "resources": deleted_resources,
+        "trust_model_states": deleted_trust_model_states,
+        "trust_scores": deleted_trust_scores,
+    }
@@ -1,125 +1,284 @@
-from fastapi import FastAPI, Depends, Response, status, HTTPException
+import logging
+from contextlib import asynccontextmanager
+
+from fastapi import APIRouter, Body, FastAPI, Depends, Query, Request, Response, status, HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
+from pydantic import BaseModel
 from sqlmodel import select
-from datetime import datetime
-from typing import Optional
+from sqlalchemy import true
+from typing import Annotated, AsyncIterator, Iterator, Optional
 from fastapi.middleware.cors import CORSMiddleware
-from random import random
+from starlette.concurrency import run_in_threadpool
 
-from app.models.schemas import StakeholderResponse, AllStakeholdersResponse
-from app.utils.helpers import StakeholderType
-from app.utils.database import get_session, Session, SessionDep
+from app.models.schemas import StakeholderResponse, AllStakeholdersResponse, StakeholderCreate, StakeholderRowError, \
+                               BulkInsertResponse
+from app.utils.database import get_session, Session, SessionDep, AsyncSession, AsyncSessionDep, create_db_and_tables, \
+                               get_engine, get_async_engine, dispose_engines
+from app.utils.aggregator_client import close_aggregator_client
+from app.utils.settings import settings
+from app.utils.profiling import ProfilingMiddleware
+from app.utils.metrics import STAGE_DURATION, DB_FETCH, SERIALIZATION, PROMETHEUS_MEDIA_TYPE, expose_metrics
 from app.models.sql_models import Stakeholder
-from app.models.stakeholder import ResourceProvider, ResourceCapacity, ApplicationProvider
-from app.trust_evaluation.trust_evaluator import TrustEvaluator
-from app.models.attributes import TrustCalcModel
-
-evaluator_app = FastAPI()
-
-evaluator_app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],            # or use ["*"] to allow all origins (not recommended in production)
-    allow_credentials=True,
-    allow_methods=["*"],              # Allows all HTTP methods: GET, POST, PUT, DELETE, etc.
-    allow_headers=["*"],              # Allows all headers
-)
-
-
-@evaluator_app.get("/stakeholder/{stakeholder_did}", response_model=StakeholderResponse)
-def get_stakeholder(stakeholder_did: str, session: SessionDep):
-    stakeholder_model = session.get(Stakeholder, stakeholder_did)
-
-    # Prepare a local TrustEvaluator instance
-    evaluator_probabilistic = TrustEvaluator(model=TrustCalcModel.PROBABILISTIC)
-    evaluator_deterministic = TrustEvaluator(model=TrustCalcModel.DETERMINISTIC)
-
-    # If resource/resource capacity, evaluate provider first and add to trusted list
-    if stakeholder_model.type == StakeholderType.RESOURCE_PROVIDER or stakeholder_model.type == StakeholderType.CAPACITY_PROVIDER:
-        stakeholder = ResourceProvider(name=stakeholder_model.name, did_raw=stakeholder_did)
-    elif stakeholder_model.type == StakeholderType.RESOURCE_CAPACITY or stakeholder_model.type == StakeholderType.RESOURCE:
-        provider = session.get(Stakeholder, stakeholder_model.provider)
-        provider_obj = ResourceProvider(name=provider.name, did_raw=provider.did)
-        # Evaluate provider and add to trusted list if trusted
-        evaluator_probabilistic.compute_trust(provider_obj)
-        evaluator_probabilistic.trust_evaluation(provider_obj)
-        evaluator_deterministic.compute_trust(provider_obj)
-        evaluator_deterministic.trust_evaluation(provider_obj)
-        stakeholder = ResourceCapacity(name=stakeholder_model.name, did_raw=stakeholder_did, provider=provider_obj)
-    elif stakeholder_model.type == StakeholderType.APPLICATION_PROVIDER:
-        stakeholder = ApplicationProvider(name=stakeholder_model.name, did_raw=stakeholder_did)
-    else:
+from app.trust_evaluation.evaluation import TRUST_MODELS, get_trust_result_cache, select_stakeholders_with_providers, \
+                                           iter_stakeholder_responses, get_stakeholder_responses_async, \
+                                           iter_stakeholder_responses_async
+from app.trust_evaluation.scheduler import TrustPrecomputeScheduler
+from app.trust_evaluation.table import InvalidStakeholderError
+from app.trust_evaluation.bulk import new_stakeholder_values, parse_stakeholders, insert_stakeholders, \
+                                     delete_stakeholders, delete_stored_trust
+
+
+logger = logging.getLogger(__name__)
+
+
+def configure_logging():
+    """
+    Gate the log messages of the evaluator (e.g. distrust reasons) by the LOG_LEVEL setting.
+    """
+    app_logger = logging.getLogger("app")
+    app_logger.setLevel(settings.log_level)
+    if not app_logger.handlers:
+        log_handler = logging.StreamHandler()
+        log_handler.setFormatter(logging.Formatter("%(levelname)s %(name)s: %(message)s"))
+        app_logger.addHandler(log_handler)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Creates tables owned by the evaluator, e.g. the stored trust model states
+    create_db_and_tables()
+    if settings.async_mode:
+        get_async_engine()
+    scheduler = None
+    if settings.precompute_interval > 0:
+        scheduler = TrustPrecomputeScheduler(
+            get_engine(), settings.precompute_interval, settings.precompute_batch_size, settings.precompute_concurrency
+        )
+        scheduler.start()
+    yield
+    if scheduler is not None:
+        await scheduler.stop()
+    # Release the pooled aggregator and database connections
+    close_aggregator_client()
+    await dispose_engines()
+
+
+async def invalid_stakeholder_handler(request: Request, e: InvalidStakeholderError):
+    return JSONResponse(status_code=status.HTTP_404_NOT_FOUND, content={"detail": str(e)})
+
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# Maximal age (seconds) of materialized scores which are served instead of evaluating again, see request_max_age
+MaxAge = Annotated[Optional[float], Query(ge=0)]
+PageLimit = Annotated[Optional[int], Query(ge=1)]
+
+# Trust endpoints are served by one of the routers, selected with the async_mode setting, the others by `router`
+router = APIRouter()
+sync_router = APIRouter()
+async_router = APIRouter()
+
+
+def request_max_age(max_age: Optional[float]) -> Optional[float]:
+    """
+    The `max_age` of a request, the `default_max_age` setting if it passes none.
+    """
+    return settings.default_max_age if max_age is None else max_age
+
+
+def json_response(response_model: BaseModel) -> Response:
+    """
+    Serialize a response once instead of validating it again against the response_model of the endpoint.
+    """
+    with STAGE_DURATION.time(SERIALIZATION):
+        content = response_model.model_dump_json()
+    return Response(content, media_type="application/json")
+
+
+@sync_router.get("/stakeholder/{stakeholder_did}", response_model=StakeholderResponse)
+def get_stakeholder(stakeholder_did: str, session: SessionDep, max_age: MaxAge = None):
+    max_age = request_max_age(max_age)
+    cached_response = get_trust_result_cache().get(stakeholder_did, TRUST_MODELS, max_age)
+    if cached_response is not None:
+        return json_response(cached_response)
+
+    with STAGE_DURATION.time(DB_FETCH):
+        stakeholder_rows = session.exec(
+            select_stakeholders_with_providers(Stakeholder.did == stakeholder_did)
+        ).all()
+    if not stakeholder_rows:
+        raise HTTPException(status_code=404, detail="No such stakeholder.")
+
+    # One snapshot of the stakeholder and its provider is shared by both trust models
+    stakeholder_response, = iter_stakeholder_responses(stakeholder_rows, session.get_bind(), max_age)
+    return json_response(stakeholder_response)
+
+
+def stream_stakeholders(stakeholder_rows: list[tuple[Stakeholder, Optional[Stakeholder]]], bind,
+                        max_age: Optional[float]) -> Iterator[str]:
+    """
+    Evaluate stakeholders incrementally and yield one NDJSON line per stakeholder.
+    """
+    # The session of the request is closed before the response is streamed, so only its bind is used
+    for stakeholder_response in iter_stakeholder_responses(stakeholder_rows, bind, max_age):
+        with STAGE_DURATION.time(SERIALIZATION):
+            line = stakeholder_response.model_dump_json() + "\n"
+        yield line
+
+
+def select_stakeholder_page(whereclause, limit: Optional[int], after: Optional[str]):
+    """
+    Select one page of the stakeholders matching `whereclause`, ordered by DID (keyset pagination).
+    """
+    statement = select_stakeholders_with_providers(whereclause).order_by(Stakeholder.did)
+    if after is not None:
+        statement = statement.where(Stakeholder.did > after)
+    if limit is not None:
+        # One more row tells whether there is a next page
+        statement = statement.limit(limit + 1)
+    return statement
+
+
+def split_stakeholder_page(stakeholder_rows, limit: Optional[int]):
+    """
+    Drop the extra row selected by `select_stakeholder_page` and return the page with its next cursor.
+    """
+    next_cursor = None
+    if limit is not None and len(stakeholder_rows) > limit:
+        stakeholder_rows = stakeholder_rows[:limit]
+        next_cursor = stakeholder_rows[-1][0].did
+    return stakeholder_rows, next_cursor
+
+
+def request_limit(limit: Optional[int]) -> int:
+    """
+    The page size of a listing, the `max_page_size` setting if the request passes no `limit`.
+    """
+    if limit is None:
+        return settings.max_page_size
+    if limit > settings.max_page_size:
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="Incorrect stakeholder type."
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"limit must not be greater than {settings.max_page_size}."
         )
+    return limit
 
-    evaluator_probabilistic.compute_trust(stakeholder)
-    evaluator_probabilistic.trust_evaluation(stakeholder)
-    probabilistic_trust = round(stakeholder.trust * 100)
 
-    evaluator_deterministic.compute_trust(stakeholder)
-    evaluator_deterministic.trust_evaluation(stakeholder)
-    deterministic_trust = round(stakeholder.trust * 100)
+def wants_stream(request: Request, stream: bool) -> bool:
+    return stream or NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
 
-    return StakeholderResponse(
-        did=stakeholder.did.raw,
-        name=stakeholder.name,
-        created_at=stakeholder_model.created_at,
-        probabilistic_trust=probabilistic_trust,
-        deterministic_trust=deterministic_trust
-    )
 
+def list_stakeholders(request: Request, session: Session, whereclause, limit: Optional[int],
+                      after: Optional[str], stream: bool, max_age: Optional[float]):
+    """
+    Evaluate one page of the stakeholders matching `whereclause`, ordered by DID (keyset pagination).
+    With `stream` or an NDJSON Accept header the stakeholders are streamed as NDJSON while they are evaluated.
+    """
+    max_age = request_max_age(max_age)
+    limit = request_limit(limit)
+    with STAGE_DURATION.time(DB_FETCH):
+        stakeholder_rows = session.exec(select_stakeholder_page(whereclause, limit, after)).all()
+    stakeholder_rows, next_cursor = split_stakeholder_page(stakeholder_rows, limit)
 
-@evaluator_app.get("/all_stakeholders", response_model=AllStakeholdersResponse)
-def get_all_stakeholders(session: SessionDep):
-    all_stakeholders_model = session.exec(
-        select(Stakeholder)
-    ).all()
-
-    # Sort: providers first, then resource capacities/resources, then others
-    # def sort_key(stakeholder_model):
-    #     if stakeholder_model.type in [StakeholderType.RESOURCE_PROVIDER, StakeholderType.CAPACITY_PROVIDER]:
-    #         return 0
-    #     elif stakeholder_model.type in [StakeholderType.RESOURCE_CAPACITY, StakeholderType.RESOURCE]:
-    #         return 1
-    #     else:
-    #         return 2
-    # all_stakeholders_model.sort(key=sort_key)
-
-    print(all_stakeholders_model)
-
-    return AllStakeholdersResponse(
-        stakeholders=[
-            get_stakeholder(stakeholder_model.did, session)
-            for stakeholder_model in all_stakeholders_model
-        ]
-    )
+    logger.debug("Listing stakeholders: %s", [stakeholder_model for stakeholder_model, _ in stakeholder_rows])
 
-@evaluator_app.get("/stakeholders/{owner_did}", response_model=AllStakeholdersResponse)
-def get_stakeholders_from_owner(owner_did:str, session: SessionDep):
-    all_stakeholders_model = session.exec(
-        select(Stakeholder)
-    ).all()
-
-    # Sort: providers first, then resource capacities/resources, then others
-    # def sort_key(stakeholder_model):
-    #     if stakeholder_model.type in [StakeholderType.RESOURCE_PROVIDER, StakeholderType.CAPACITY_PROVIDER]:
-    #         return 0
-    #     elif stakeholder_model.type in [StakeholderType.RESOURCE_CAPACITY, StakeholderType.RESOURCE]:
-    #         return 1
-    #     else:
-    #         return 2
-    # all_stakeholders_model.sort(key=sort_key)
-
-    print(all_stakeholders_model)
-
-    return AllStakeholdersResponse(
-        stakeholders=[
-            get_stakeholder(stakeholder_model.did, session)
-            for stakeholder_model in all_stakeholders_model
-            if stakeholder_model.owner == owner_did
-        ]
+    if wants_stream(request, stream):
+        headers = {"X-Next-Cursor": next_cursor} if next_cursor is not None else None
+        return StreamingResponse(
+            stream_stakeholders(stakeholder_rows, session.get_bind(), max_age),
+            media_type=NDJSON_MEDIA_TYPE, headers=headers
+        )
+
+    return json_response(AllStakeholdersResponse(
+        stakeholders=list(iter_stakeholder_responses(stakeholder_rows, session.get_bind(), max_age)),
+        next_cursor=next_cursor
+    ))
+
+
+@sync_router.get("/all_stakeholders", response_model=AllStakeholdersResponse)
+def get_all_stakeholders(request: Request, session: SessionDep, limit: PageLimit = None,
+                         after: Optional[str] = None, stream: bool = False, max_age: MaxAge = None):
+    return list_stakeholders(request, session, true(), limit, after, stream, max_age)
+
+@sync_router.get("/stakeholders/{owner_did}", response_model=AllStakeholdersResponse)
+def get_stakeholders_from_owner(owner_did:str, request: Request, session: SessionDep, limit: PageLimit = None,
+                                after: Optional[str] = None, stream: bool = False, max_age: MaxAge = None):
+    return list_stakeholders(request, session, Stakeholder.owner == owner_did, limit, after, stream, max_age)
+
+
+@async_router.get("/stakeholder/{stakeholder_did}", response_model=StakeholderResponse)
+async def get_stakeholder_async(stakeholder_did: str, session: AsyncSessionDep, max_age: MaxAge = None):
+    max_age = request_max_age(max_age)
+    cached_response = get_trust_result_cache().get(stakeholder_did, TRUST_MODELS, max_age)
+    if cached_response is not None:
+        return json_response(cached_response)
+
+    with STAGE_DURATION.time(DB_FETCH):
+        stakeholder_rows = (await session.exec(
+            select_stakeholders_with_providers(Stakeholder.did == stakeholder_did)
+        )).all()
+    if not stakeholder_rows:
+        raise HTTPException(status_code=404, detail="No such stakeholder.")
+
+    stakeholder_response, = await get_stakeholder_responses_async(stakeholder_rows, session, max_age)
+    return json_response(stakeholder_response)
+
+
+async def stream_stakeholders_async(stakeholder_rows: list[tuple[Stakeholder, Optional[Stakeholder]]], bind,
+                                    max_age: Optional[float]) -> AsyncIterator[str]:
+    """
+    Async variant of `stream_stakeholders`, every chunk is fetched and evaluated before its lines are sent.
+    """
+    async with AsyncSession(bind, expire_on_commit=False) as session:
+        async for stakeholder_responses in iter_stakeholder_responses_async(stakeholder_rows, session, max_age):
+            for stakeholder_response in stakeholder_responses:
+                with STAGE_DURATION.time(SERIALIZATION):
+                    line = stakeholder_response.model_dump_json() + "\n"
+                yield line
+
+
+async def list_stakeholders_async(request: Request, session: AsyncSession, whereclause, limit: Optional[int],
+                                  after: Optional[str], stream: bool, max_age: Optional[float]):
+    """
+    Async variant of `list_stakeholders`.
+    """
+    max_age = request_max_age(max_age)
+    limit = request_limit(limit)
+    with STAGE_DURATION.time(DB_FETCH):
+        stakeholder_rows = (await session.exec(select_stakeholder_page(whereclause, limit, after))).all()
+    stakeholder_rows, next_cursor = split_stakeholder_page(stakeholder_rows, limit)
+
+    logger.debug("Listing stakeholders: %s", [stakeholder_model for stakeholder_model, _ in stakeholder_rows])
+
+    if wants_stream(request, stream):
+        headers = {"X-Next-Cursor": next_cursor} if next_cursor is not None else None
+        return StreamingResponse(
+            stream_stakeholders_async(stakeholder_rows, session.bind, max_age),
+            media_type=NDJSON_MEDIA_TYPE, headers=headers
+        )
+
+    return json_response(AllStakeholdersResponse(
+        stakeholders=await get_stakeholder_responses_async(stakeholder_rows, session, max_age),
+        next_cursor=next_cursor
+    ))
+
+
+@async_router.get("/all_stakeholders", response_model=AllStakeholdersResponse)
+async def get_all_stakeholders_async(request: Request, session: AsyncSessionDep, limit: PageLimit = None,
+                                     after: Optional[str] = None, stream: bool = False, max_age: MaxAge = None):
+    return await list_stakeholders_async(request, session, true(), limit, after, stream, max_age)
+
+
+@async_router.get("/stakeholders/{owner_did}", response_model=AllStakeholdersResponse)
+async def get_stakeholders_from_owner_async(owner_did: str, request: Request, session: AsyncSessionDep,
+                                            limit: PageLimit = None, after: Optional[str] = None,
+                                            stream: bool = False, max_age: MaxAge = None):
+    return await list_stakeholders_async(
+        request, session, Stakeholder.owner == owner_did, limit, after, stream, max_age
     )
 
-@evaluator_app.post("/stakeholder/{stakeholder_did}", response_model=StakeholderResponse)
+
+@router.post("/stakeholder/{stakeholder_did}", response_model=StakeholderResponse)
 def insert_new_stakeholder(
         session: SessionDep,
         stakeholder_did: str,
@@ -129,35 +288,51 @@ def insert_new_stakeholder(
         metrics_url: Optional[str] = None,
         provider: Optional[str] = None
 ):
-    # Use valid Slovenian coordinates
-    slovenia_lat = 46.0
-    slovenia_lon = 15.0
     new_stakeholder = Stakeholder(
-        did=stakeholder_did,
-        type=stakeholder_type,
-        name=name,
-        provider=provider,
-        metrics_url=metrics_url,
-        identity="vc",
-        reputation=random(),
-        direct_trust=random(),
-        compliance=random(),
-        historical_behavior=random(),
-        location_lat=slovenia_lat,
-        location_lon=slovenia_lon,
-        contextual_fit=random(),
-        third_party_validation=random(),
-        created_at=datetime.now(),
-        owner=owner
+        **new_stakeholder_values(stakeholder_did, stakeholder_type, name, owner, metrics_url, provider)
     )
     session.add(new_stakeholder)
+    # Trust stored for an earlier stakeholder with the same DID must not be served for the new one
+    delete_stored_trust(session, [stakeholder_did])
     session.commit()
     session.refresh(new_stakeholder)
+    # A new provider changes the trust of the capacities referring to it
+    get_trust_result_cache().invalidate(stakeholder_did)
 
     return get_stakeholder(stakeholder_did, session)
 
 
-@evaluator_app.delete("/stakeholder/{stakeholder_did}")
+def register_stakeholders(session: Session, stakeholders: list[tuple[int, StakeholderCreate]],
+                          errors: list[StakeholderRowError], evaluate: bool) -> BulkInsertResponse:
+    inserted_dids = insert_stakeholders(session, stakeholders, errors)
+    # New providers change the trust of the capacities referring to them
+    for inserted_did in inserted_dids:
+        get_trust_result_cache().invalidate(inserted_did)
+
+    stakeholder_responses = []
+    if evaluate and inserted_dids:
+        stakeholder_rows = session.exec(
+            select_stakeholders_with_providers(Stakeholder.did.in_(inserted_dids)).order_by(Stakeholder.did)
+        ).all()
+        stakeholder_responses = list(iter_stakeholder_responses(stakeholder_rows, session.get_bind()))
+    return BulkInsertResponse(inserted=len(inserted_dids), errors=errors, stakeholders=stakeholder_responses)
+
+
+@router.post("/stakeholders", response_model=BulkInsertResponse)
+async def insert_new_stakeholders(request: Request, session: SessionDep, evaluate: bool = False):
+    """
+    Register a JSON list or NDJSON lines of stakeholders in one transaction. Invalid rows are reported
+    without aborting the others. Trust is evaluated in one batch with `evaluate`, otherwise it is deferred.
+    """
+    ndjson = NDJSON_MEDIA_TYPE in request.headers.get("content-type", "")
+    try:
+        stakeholders, errors = parse_stakeholders(await request.body(), ndjson)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return await run_in_threadpool(register_stakeholders, session, stakeholders, errors, evaluate)
+
+
+@router.delete("/stakeholder/{stakeholder_did}")
 def remove_stakeholder(session: SessionDep, stakeholder_did: str):
     target_stakeholder = session.exec(
         select(Stakeholder)
@@ -166,16 +341,60 @@ def remove_stakeholder(session: SessionDep, stakeholder_did: str):
 
     if target_stakeholder is None:
         raise HTTPException(status_code=404, detail="No such stakeholder.")
-    print(f"Removing stakeholder Did: {target_stakeholder.did}, Name: {target_stakeholder.name}")
-    if target_stakeholder.type == StakeholderType.RESOURCE_PROVIDER or target_stakeholder.type == StakeholderType.CAPACITY_PROVIDER:
-        # we need to remove the resources as well but remember some reources have null providers
-        resources = session.exec(
-            select(Stakeholder).where(Stakeholder.provider == target_stakeholder.did)
-        ).all()
-        for resource in resources:
-            print(f"Removing resource Did: {resource.did}, Name: {resource.name}")
-            session.delete(resource)
-    session.delete(target_stakeholder)
-    session.commit()
+    logger.info("Removing stakeholder Did: %s, Name: %s", target_stakeholder.did, target_stakeholder.name)
+    # Resources of providers are removed with a single statement in the same transaction
+    deleted = delete_stakeholders(session, [stakeholder_did])
+    logger.info("Removed %d resources of stakeholder Did: %s", deleted["resources"], stakeholder_did)
+    # Cached capacities depend on their provider and are invalidated with it
+    get_trust_result_cache().invalidate(stakeholder_did)
+    del deleted["not_found"]
+
+    return {"ok": True, **deleted}
+
+
+@router.delete("/stakeholders")
+def remove_stakeholders(session: SessionDep, stakeholder_dids: Annotated[list[str], Body()]):
+    """
+    Remove a list of stakeholders and the resources of the providers among them in one transaction.
+    """
+    deleted = delete_stakeholders(session, stakeholder_dids)
+    for stakeholder_did in stakeholder_dids:
+        get_trust_result_cache().invalidate(stakeholder_did)
+
+    return {"ok": True, **deleted}
+
+
+@router.get("/cache_stats")
+def get_cache_stats():
+    return get_trust_result_cache().stats()
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    return PlainTextResponse(expose_metrics(), media_type=PROMETHEUS_MEDIA_TYPE)
+
+
+def create_app() -> FastAPI:
+    """
+    Build the app from the settings, which are read here and not when the module is imported.
+    """
+    configure_logging()
+    app = FastAPI(lifespan=lifespan)
+
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],            # or use ["*"] to allow all origins (not recommended in production)
+        allow_credentials=True,
+        allow_methods=["*"],              # Allows all HTTP methods: GET, POST, PUT, DELETE, etc.
+        allow_headers=["*"],              # Allows all headers
+    )
+    # Without the setting the middleware is not installed at all, so requests pay nothing for it
+    if settings.profiling_enabled:
+        app.add_middleware(
+            ProfilingMiddleware, directory=settings.profiling_dir, max_profiles=settings.profiling_max_profiles
+        )
 
-    return {"ok": True}
+    app.add_exception_handler(InvalidStakeholderError, invalid_stakeholder_handler)
+    app.include_router(router)
+    app.include_router(async_router if settings.async_mode else sync_router)
+    return app
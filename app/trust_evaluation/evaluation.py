@@ -0,0 +1,323 @@
+import asyncio
+import threading
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Iterable, Iterator, Optional
+
+import numpy as np
+from sqlalchemy.orm import aliased
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.models.attributes import TrustCalcModel
+from app.models.schemas import StakeholderResponse
+from app.models.sql_models import Stakeholder, TrustScore
+from app.models.stakeholder import GraphQLQueryFPath, get_new_attributes_batch_async
+from app.trust_evaluation.probabilistic import SingleFeatureTrustModelBank
+from app.trust_evaluation.state_store import TrustModelStateStore
+from app.trust_evaluation.table import StakeholderTable, METRIC_COLUMNS, PROVIDER_TYPES
+from app.trust_evaluation.trust_evaluator import DualModelTrustEvaluator
+from app.utils.cache import TrustResultCache
+from app.utils.database import dialect_insert, get_engine
+from app.utils.helpers import StakeholderType
+from app.utils.settings import settings
+from app.utils.metrics import STAGE_DURATION, DB_FETCH
+
+
+# Responses contain the trust of both models
+TRUST_MODELS = (TrustCalcModel.PROBABILISTIC, TrustCalcModel.DETERMINISTIC)
+_trust_result_cache: Optional[TrustResultCache] = None
+_trust_result_cache_lock = threading.Lock()
+
+
+def get_trust_result_cache() -> TrustResultCache:
+    """
+    Return the process wide cache of stakeholder responses, created from the settings on first use.
+    """
+    global _trust_result_cache
+    if _trust_result_cache is not None:
+        return _trust_result_cache
+    with _trust_result_cache_lock:
+        if _trust_result_cache is None:
+            _trust_result_cache = TrustResultCache(max_size=settings.trust_cache_max_size, ttl=settings.trust_cache_ttl)
+        return _trust_result_cache
+
+
+def select_stakeholders_with_providers(*whereclause):
+    """
+    Select stakeholders together with their provider (or None) in a single query.
+    """
+    provider = aliased(Stakeholder)
+    return (
+        select(Stakeholder, provider)
+        .outerjoin(provider, Stakeholder.provider == provider.did)
+        .where(*whereclause)
+    )
+
+
+def get_query_targets(stakeholder_rows: Iterable[tuple[Stakeholder, Optional[Stakeholder]]]) -> Iterator[tuple[str, GraphQLQueryFPath]]:
+    """
+    Yield the `(did, graphql_query_fpath)` pairs needed to evaluate the given stakeholders, including their providers.
+    """
+    for stakeholder_model, provider_model in stakeholder_rows:
+        if stakeholder_model.type in PROVIDER_TYPES:
+            yield stakeholder_model.did, GraphQLQueryFPath.RESOURCE_PROVIDER
+        elif stakeholder_model.type == StakeholderType.RESOURCE_CAPACITY or stakeholder_model.type == StakeholderType.RESOURCE:
+            yield stakeholder_model.did, GraphQLQueryFPath.RESOURCE_CAPACITY
+            if provider_model is not None:
+                yield provider_model.did, GraphQLQueryFPath.RESOURCE_PROVIDER
+        elif stakeholder_model.type == StakeholderType.APPLICATION_PROVIDER:
+            yield stakeholder_model.did, GraphQLQueryFPath.APPLICATION_PROVIDER
+
+
+def get_provider_query_targets(stakeholder_rows: Iterable[tuple[Stakeholder, Optional[Stakeholder]]]) -> Iterator[tuple[str, GraphQLQueryFPath]]:
+    """
+    Yield the `(did, graphql_query_fpath)` pairs of the stakeholders which `iter_evaluated_stakeholders`
+    evaluates as providers before all others.
+    """
+    for stakeholder_model, provider_model in stakeholder_rows:
+        if stakeholder_model.type in PROVIDER_TYPES:
+            yield stakeholder_model.did, GraphQLQueryFPath.RESOURCE_PROVIDER
+        if provider_model is not None:
+            yield provider_model.did, GraphQLQueryFPath.RESOURCE_PROVIDER
+
+
+def iter_evaluated_stakeholders(stakeholder_rows: list[tuple[Stakeholder, Optional[Stakeholder]]],
+                                state_store: Optional[TrustModelStateStore] = None,
+                                chunk_size: Optional[int] = None,
+                                trust_attributes: Optional[dict] = None) -> Iterator[StakeholderResponse]:
+    """
+    Compute the probabilistic and deterministic trust of stakeholders selected with
+    `select_stakeholders_with_providers` and yield their responses in the same order.
+    Every provider is evaluated exactly once and before the other stakeholders, so its capacities
+    are checked against its result. The others are evaluated in chunks of `chunk_size`, each
+    with one batched aggregator fetch per query, and their model states are written back per chunk.
+    All of them are evaluated on the columns of one StakeholderTable instead of per object.
+    Attributes already fetched for the stakeholders and their providers can be passed as `trust_attributes` (by DID).
+    """
+    chunk_size = chunk_size or settings.aggregator_batch_size
+    evaluator = DualModelTrustEvaluator()
+    table = StakeholderTable.from_rows(
+        (
+            (stakeholder_model.did, stakeholder_model.name, stakeholder_model.type),
+            None if provider_model is None else (provider_model.did, provider_model.name, provider_model.type)
+        )
+        for stakeholder_model, provider_model in stakeholder_rows
+    )
+    probabilistic_trust = np.zeros(len(table))
+    deterministic_trust = np.zeros(len(table))
+
+    provider_rows = np.flatnonzero(table.types == StakeholderType.RESOURCE_PROVIDER)
+    for chunk_start in range(0, len(provider_rows), chunk_size):
+        chunk = provider_rows[chunk_start:chunk_start + chunk_size]
+        probabilistic_trust[chunk], deterministic_trust[chunk] = evaluator.evaluate_table(table, chunk, trust_attributes)
+
+    for chunk_start in range(0, len(stakeholder_rows), chunk_size):
+        chunk_rows = stakeholder_rows[chunk_start:chunk_start + chunk_size]
+        table_rows = [table.rows[stakeholder_model.did] for stakeholder_model, _ in chunk_rows]
+        others = np.fromiter(
+            (row for row in dict.fromkeys(table_rows) if table.types[row] != StakeholderType.RESOURCE_PROVIDER),
+            dtype=np.intp
+        )
+        if len(others):
+            performance_models = None
+            if state_store is not None:
+                capacity_rows = table.rows_of_type(others, StakeholderType.RESOURCE_CAPACITY)
+                performance_models = SingleFeatureTrustModelBank(len(capacity_rows), METRIC_COLUMNS)
+                state_store.restore_bank(performance_models, table.dids[capacity_rows])
+            probabilistic_trust[others], deterministic_trust[others] = evaluator.evaluate_table(
+                table, others, trust_attributes, performance_models
+            )
+        if state_store is not None:
+            state_store.flush()
+
+        for (stakeholder_model, _), row in zip(chunk_rows, table_rows):
+            stakeholder_response = StakeholderResponse(
+                did=stakeholder_model.did,
+                name=stakeholder_model.name,
+                created_at=stakeholder_model.created_at,
+                probabilistic_trust=round(probabilistic_trust[row] * 100),
+                deterministic_trust=round(deterministic_trust[row] * 100)
+            )
+            get_trust_result_cache().put(
+                stakeholder_model.did, TRUST_MODELS, stakeholder_response, stakeholder_model.provider
+            )
+            yield stakeholder_response
+
+
+def select_trust_scores(dids: list[str], computed_after: datetime):
+    return (
+        select(TrustScore)
+        .where(TrustScore.did.in_(dids))
+        .where(TrustScore.computed_at >= computed_after)
+    )
+
+
+def load_trust_scores(session: Session, dids: list[str], computed_after: datetime) -> dict[str, TrustScore]:
+    """
+    Load the materialized scores of the given DIDs which were computed after `computed_after`.
+    """
+    with STAGE_DURATION.time(DB_FETCH):
+        trust_scores = session.exec(select_trust_scores(dids, computed_after)).all()
+    return {trust_score.did: trust_score for trust_score in trust_scores}
+
+
+async def load_trust_scores_async(session: AsyncSession, dids: list[str],
+                                  computed_after: datetime) -> dict[str, TrustScore]:
+    """
+    Async variant of `load_trust_scores`.
+    """
+    with STAGE_DURATION.time(DB_FETCH):
+        trust_scores = (await session.exec(select_trust_scores(dids, computed_after))).all()
+    return {trust_score.did: trust_score for trust_score in trust_scores}
+
+
+def save_trust_scores(session: Session, stakeholder_responses: list[StakeholderResponse]):
+    """
+    Materialize computed trust in the TrustScore table with one upsert, scores written by concurrent
+    requests are overwritten.
+    """
+    if not stakeholder_responses:
+        return
+    computed_at = datetime.now()
+    insert = dialect_insert(session, TrustScore.__table__)
+    statement = insert.on_conflict_do_update(
+        index_elements=["did"],
+        set_={
+            column: insert.excluded[column] for column in ("probabilistic_trust", "deterministic_trust", "computed_at")
+        },
+    )
+    session.execute(statement, [
+        {
+            "did": stakeholder_response.did,
+            "probabilistic_trust": stakeholder_response.probabilistic_trust,
+            "deterministic_trust": stakeholder_response.deterministic_trust,
+            "computed_at": computed_at,
+        }
+        for stakeholder_response in stakeholder_responses
+    ])
+    session.commit()
+
+
+def iter_stakeholder_responses(stakeholder_rows: list[tuple[Stakeholder, Optional[Stakeholder]]], bind,
+                               max_age: Optional[float] = None,
+                               chunk_size: Optional[int] = None,
+                               trust_attributes: Optional[dict] = None,
+                               fresh_scores: Optional[dict[str, TrustScore]] = None,
+                               materialize: bool = False) -> Iterator[StakeholderResponse]:
+    """
+    Yield the responses of stakeholders selected with `select_stakeholders_with_providers` in the same order.
+    With `max_age` (seconds) materialized scores which are not older are served from the TrustScore table,
+    scores already loaded with `load_trust_scores` can be passed as `fresh_scores` instead.
+    All other stakeholders are evaluated on demand. Their scores are materialized per chunk if they replace
+    stale ones (with `max_age`) or with `materialize`, otherwise the TrustScore table is not touched.
+    """
+    materialize = materialize or max_age is not None
+    chunk_size = chunk_size or settings.aggregator_batch_size
+    scores_session = Session(bind, expire_on_commit=False) if materialize else nullcontext()
+    with scores_session as session, TrustModelStateStore(bind, settings.observation_interval) as state_store:
+        fresh_scores = fresh_scores or {}
+        if max_age is not None and not fresh_scores:
+            fresh_scores = load_trust_scores(
+                session,
+                [stakeholder_model.did for stakeholder_model, _ in stakeholder_rows],
+                datetime.now() - timedelta(seconds=max_age)
+            )
+        evaluated_responses = iter_evaluated_stakeholders(
+            [row for row in stakeholder_rows if row[0].did not in fresh_scores], state_store, chunk_size, trust_attributes
+        )
+
+        computed_responses = []
+        for stakeholder_model, _ in stakeholder_rows:
+            trust_score = fresh_scores.get(stakeholder_model.did)
+            if trust_score is not None:
+                yield StakeholderResponse(
+                    did=stakeholder_model.did,
+                    name=stakeholder_model.name,
+                    created_at=stakeholder_model.created_at,
+                    probabilistic_trust=trust_score.probabilistic_trust,
+                    deterministic_trust=trust_score.deterministic_trust
+                )
+                continue
+            stakeholder_response = next(evaluated_responses)
+            yield stakeholder_response
+            if materialize:
+                computed_responses.append(stakeholder_response)
+                if len(computed_responses) >= chunk_size:
+                    save_trust_scores(session, computed_responses)
+                    computed_responses = []
+        if materialize:
+            save_trust_scores(session, computed_responses)
+
+
+async def load_fresh_trust_scores_async(stakeholder_rows: list[tuple[Stakeholder, Optional[Stakeholder]]],
+                                        session: AsyncSession, max_age: Optional[float]) -> dict[str, TrustScore]:
+    if max_age is None:
+        return {}
+    return await load_trust_scores_async(
+        session,
+        [stakeholder_model.did for stakeholder_model, _ in stakeholder_rows],
+        datetime.now() - timedelta(seconds=max_age)
+    )
+
+
+async def get_stakeholder_responses_async(stakeholder_rows: list[tuple[Stakeholder, Optional[Stakeholder]]],
+                                          session: AsyncSession, max_age: Optional[float] = None,
+                                          chunk_size: Optional[int] = None) -> list[StakeholderResponse]:
+    """
+    Async variant of `iter_stakeholder_responses`. The session only loads the materialized scores, the attributes
+    of all stakeholders which are evaluated are then fetched with concurrent aggregator requests. The evaluation
+    and its writes run in a worker thread on the sync engine, so they do not block the event loop.
+    """
+    fresh_scores = await load_fresh_trust_scores_async(stakeholder_rows, session, max_age)
+    trust_attributes = await get_new_attributes_batch_async(
+        get_query_targets(row for row in stakeholder_rows if row[0].did not in fresh_scores), chunk_size
+    )
+    return await asyncio.to_thread(list, iter_stakeholder_responses(
+        stakeholder_rows, get_engine(), None, chunk_size, trust_attributes, fresh_scores, max_age is not None
+    ))
+
+
+def _next_responses(stakeholder_responses: Iterator[StakeholderResponse], fresh_scores: dict[str, TrustScore],
+                    n_evaluated: int) -> list[StakeholderResponse]:
+    """
+    Advance `stakeholder_responses` up to its next `n_evaluated` evaluated responses, or to its end without them.
+    """
+    next_responses = []
+    for stakeholder_response in stakeholder_responses:
+        next_responses.append(stakeholder_response)
+        if stakeholder_response.did not in fresh_scores:
+            n_evaluated -= 1
+            if n_evaluated == 0:
+                break
+    return next_responses
+
+
+async def iter_stakeholder_responses_async(stakeholder_rows: list[tuple[Stakeholder, Optional[Stakeholder]]],
+                                           session: AsyncSession, max_age: Optional[float] = None,
+                                           chunk_size: Optional[int] = None
+                                           ) -> AsyncIterator[list[StakeholderResponse]]:
+    """
+    Variant of `get_stakeholder_responses_async` which yields the responses chunk by chunk. Providers are fetched
+    before the first chunk and evaluated once, the attributes of every chunk are fetched before it is evaluated.
+    """
+    chunk_size = chunk_size or settings.aggregator_batch_size
+    fresh_scores = await load_fresh_trust_scores_async(stakeholder_rows, session, max_age)
+    evaluated_rows = [row for row in stakeholder_rows if row[0].did not in fresh_scores]
+    trust_attributes = await get_new_attributes_batch_async(get_provider_query_targets(evaluated_rows), chunk_size)
+    # The chunks of evaluated_rows are those of iter_evaluated_stakeholders, one generator keeps the providers
+    stakeholder_responses = iter_stakeholder_responses(
+        stakeholder_rows, get_engine(), None, chunk_size, trust_attributes, fresh_scores, max_age is not None
+    )
+    try:
+        for chunk_start in range(0, len(evaluated_rows), chunk_size):
+            chunk_rows = evaluated_rows[chunk_start:chunk_start + chunk_size]
+            trust_attributes.update(await get_new_attributes_batch_async(
+                (target for target in get_query_targets(chunk_rows) if target[0] not in trust_attributes), chunk_size
+            ))
+            yield await asyncio.to_thread(_next_responses, stakeholder_responses, fresh_scores, len(chunk_rows))
+        remaining_responses = await asyncio.to_thread(list, stakeholder_responses)
+        if remaining_responses:
+            yield remaining_responses
+    finally:
+        await asyncio.to_thread(stakeholder_responses.close)
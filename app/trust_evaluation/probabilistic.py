@@ -1,8 +1,12 @@
+import math
+
 import numpy as np
-from scipy.stats import beta
 
 class SingleFeatureTrustModel:
-    def __init__(self, name ,base_lambda=0.1, growth_rate=0.8, uncertainty_penalty=0.8):
+    __slots__ = ("name", "base_lambda", "growth_rate", "uncertainty_penalty", "n_eff", "alpha", "beta", "window_size",
+                 "_window", "_window_start", "_window_count", "_window_mean", "_window_m2")
+
+    def __init__(self, name ,base_lambda=0.1, growth_rate=0.8, uncertainty_penalty=0.8, window_size=5):
         self.name = name
         self.base_lambda = base_lambda
         self.growth_rate = growth_rate
@@ -10,13 +14,67 @@ class SingleFeatureTrustModel:
         self.n_eff = 2.0       # start with very low effective sample size
         self.alpha = 1.0
         self.beta = 1.0
+        # number of last measurements used for the volatility
+        if window_size < 1:
+            raise ValueError("Window size must be at least 1")
+        self.window_size = window_size
         self.measurements = []
 
+    @property
+    def measurements(self):
+        """
+        Measurements in the volatility window, oldest first. A read-only tuple instead of the former list:
+        the window is a ring buffer now, so `measurements.append` no longer works. Measurements are added
+        with `observe` or replaced by assigning a new sequence.
+        """
+        return tuple(self._window[(self._window_start + i) % self.window_size] for i in range(self._window_count))
+
+    @measurements.setter
+    def measurements(self, measurements):
+        # Ring buffer with the running mean and sum of squared deviations (Welford) of its values
+        self._window = [0.0] * self.window_size
+        self._window_start = 0
+        self._window_count = 0
+        self._window_mean = 0.0
+        self._window_m2 = 0.0
+        for measurement in list(measurements)[-self.window_size:]:
+            self._push_measurement(measurement)
+
+    def _push_measurement(self, measurement):
+        if self._window_count < self.window_size:
+            self._window[(self._window_start + self._window_count) % self.window_size] = measurement
+            self._window_count += 1
+            delta = measurement - self._window_mean
+            self._window_mean += delta / self._window_count
+            self._window_m2 += delta * (measurement - self._window_mean)
+        else:
+            # Replace the oldest measurement, the window size stays the same
+            oldest = self._window[self._window_start]
+            self._window[self._window_start] = measurement
+            self._window_start = (self._window_start + 1) % self.window_size
+            previous_mean = self._window_mean
+            self._window_mean += (measurement - oldest) / self._window_count
+            self._window_m2 += (measurement - oldest) * (measurement - self._window_mean + oldest - previous_mean)
+        # Rounding must not make the sum of squares negative
+        self._window_m2 = max(self._window_m2, 0.0)
+
+    def get_state(self) -> dict:
+        """State of the model needed to continue observing after a restart."""
+        return {
+            "alpha": self.alpha,
+            "beta": self.beta,
+            "n_eff": self.n_eff,
+            "measurements": list(self.measurements),
+        }
+
+    def set_state(self, alpha, beta, n_eff, measurements):
+        self.alpha = alpha
+        self.beta = beta
+        self.n_eff = n_eff
+        self.measurements = list(measurements)
+
     def observe(self, observation):
-        self.measurements.append(observation)
-        
-        while len(self.measurements) > 5:
-            self.measurements.pop(0)
+        self._push_measurement(observation)
 
         volatility = self.estimate_volatility()
         adaptive_lambda = self.compute_lambda(volatility)
@@ -40,9 +98,10 @@ class SingleFeatureTrustModel:
         
 
     def estimate_volatility(self):
-        if len(self.measurements) < 2:
+        # Population standard deviation of the window, as np.std
+        if self._window_count < 2:
             return 0.0
-        return np.std(self.measurements)
+        return math.sqrt(self._window_m2 / self._window_count)
 
     def compute_lambda(self, volatility):
         # higher volatility -> higher lambda -> higher importance of new observations
@@ -74,6 +133,8 @@ class SingleFeatureTrustModel:
             return self.trust_score
 
     def confidence_interval(self, confidence=0.95):
+        # scipy.stats takes most of the import time of the service and is only needed here
+        from scipy.stats import beta
         return beta.interval(confidence, self.alpha, self.beta)
 
     def __repr__(self):
@@ -82,3 +143,141 @@ class SingleFeatureTrustModel:
                 f"n_eff={self.n_eff:.1f}, "
                 f"std={self.stddev:.4f}, "
                 f"CI95={self.confidence_interval()})")
+
+
+class SingleFeatureTrustModelBank:
+    """
+    Many SingleFeatureTrustModel instances stored as NumPy arrays indexed by (stakeholder, metric).
+    Observations of all models are processed with vectorized math and give the same results as
+    observing every scalar model on its own, up to the rounding of the volatility.
+    """
+
+    def __init__(self, n_stakeholders, names, base_lambda=0.1, growth_rate=0.8, uncertainty_penalty=0.8, window_size=5):
+        self.names = list(names)
+        self.base_lambda = base_lambda
+        self.growth_rate = growth_rate
+        self.uncertainty_penalty = uncertainty_penalty
+        if window_size < 1:
+            raise ValueError("Window size must be at least 1")
+        self.window_size = window_size
+
+        shape = (n_stakeholders, len(self.names))
+        self.n_eff = np.full(shape, 2.0)
+        self.alpha = np.ones(shape)
+        self.beta = np.ones(shape)
+        # Ring buffers of the last measurements, the number of filled slots and the next slot to write
+        self.measurements = np.zeros(shape + (window_size,))
+        self.measurement_count = np.zeros(shape, dtype=int)
+        self.measurement_position = np.zeros(shape, dtype=int)
+        # Models which ignore observations, e.g. restored ones which already observed the current measurements
+        self.frozen = np.zeros(shape, dtype=bool)
+
+    @property
+    def shape(self):
+        return self.alpha.shape
+
+    @classmethod
+    def from_models(cls, models):
+        """
+        Build a bank from rows of SingleFeatureTrustModel with the same metric names in every row.
+        """
+        first_row = models[0]
+        bank = cls(len(models), [model.name for model in first_row], first_row[0].base_lambda,
+                   first_row[0].growth_rate, first_row[0].uncertainty_penalty, first_row[0].window_size)
+        for row, row_models in enumerate(models):
+            for column, model in enumerate(row_models):
+                bank.set_state(row, column, **model.get_state())
+        return bank
+
+    def set_state(self, row, column, alpha, beta, n_eff, measurements):
+        measurements = list(measurements)[-self.window_size:]
+        self.alpha[row, column] = alpha
+        self.beta[row, column] = beta
+        self.n_eff[row, column] = n_eff
+        self.measurements[row, column, :len(measurements)] = measurements
+        self.measurement_count[row, column] = len(measurements)
+        self.measurement_position[row, column] = len(measurements) % self.window_size
+
+    def get_state(self, row, column) -> dict:
+        """State of a single model in the format of `SingleFeatureTrustModel.get_state`."""
+        count = self.measurement_count[row, column]
+        window = self.measurements[row, column]
+        # Oldest measurement first, as in the list of the scalar model
+        start = self.measurement_position[row, column] if count == self.window_size else 0
+        return {
+            "alpha": self.alpha[row, column],
+            "beta": self.beta[row, column],
+            "n_eff": self.n_eff[row, column],
+            "measurements": [window[(start + offset) % self.window_size] for offset in range(count)],
+        }
+
+    def to_model(self, row, column):
+        model = SingleFeatureTrustModel(self.names[column], self.base_lambda, self.growth_rate,
+                                        self.uncertainty_penalty, self.window_size)
+        model.set_state(**self.get_state(row, column))
+        return model
+
+    def observe(self, observations):
+        """
+        Observe one value per model. `observations` is broadcast to (stakeholders, metrics),
+        NaN entries and frozen models stay unchanged.
+        """
+        observations = np.broadcast_to(np.asarray(observations, dtype=float), self.shape)
+        observed = ~np.isnan(observations) & ~self.frozen
+        rows, columns = np.nonzero(observed)
+        self.measurements[rows, columns, self.measurement_position[rows, columns]] = observations[rows, columns]
+        self.measurement_position[observed] = (self.measurement_position[observed] + 1) % self.window_size
+        self.measurement_count[observed] = np.minimum(self.measurement_count[observed] + 1, self.window_size)
+
+        volatility = self.estimate_volatility()
+        adaptive_lambda = self.compute_lambda(volatility)
+
+        alpha = self.alpha * (1 / self.n_eff)
+        beta_val = self.beta * (1 / self.n_eff)
+        n_eff = self.n_eff + self.growth_rate / (volatility + 1)
+        with np.errstate(invalid='ignore'):
+            alpha = ((1 - adaptive_lambda) * alpha + adaptive_lambda * observations) * n_eff
+            beta_val = ((1 - adaptive_lambda) * beta_val + adaptive_lambda * (1 - observations)) * n_eff
+
+        self.alpha = np.where(observed, alpha, self.alpha)
+        self.beta = np.where(observed, beta_val, self.beta)
+        self.n_eff = np.where(observed, n_eff, self.n_eff)
+
+    def estimate_volatility(self):
+        filled = np.arange(self.window_size) < self.measurement_count[..., np.newaxis]
+        count = np.maximum(self.measurement_count, 1)
+        mean = np.sum(self.measurements, axis=-1, where=filled) / count
+        squared_deviation = np.where(filled, (self.measurements - mean[..., np.newaxis]) ** 2, 0.0)
+        volatility = np.sqrt(np.sum(squared_deviation, axis=-1) / count)
+        return np.where(self.measurement_count < 2, 0.0, volatility)
+
+    def compute_lambda(self, volatility):
+        return np.clip(self.base_lambda * (1 + 2.5 * volatility), 0, 1)
+
+    @property
+    def trust_score(self):
+        return self.alpha / (self.alpha + self.beta)
+
+    @property
+    def variance(self):
+        denom = (self.alpha + self.beta)**2 * (self.alpha + self.beta + 1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(denom > 0, (self.alpha * self.beta) / denom, 0.0)
+
+    @property
+    def stddev(self):
+        return np.sqrt(self.variance)
+
+    @property
+    def adjusted_trust_score(self):
+        """Trust penalized by uncertainty (standard deviation)."""
+        adjusted = np.clip(self.trust_score * (1 - self.uncertainty_penalty * self.stddev), 0.0, 1.0)
+        return np.where(self.n_eff >= 4, adjusted, self.trust_score)
+
+    def confidence_interval(self, confidence=0.95):
+        from scipy.stats import beta
+        return beta.interval(confidence, self.alpha, self.beta)
+
+    def __repr__(self):
+        return (f"SingleFeatureTrustModelBank(stakeholders={self.shape[0]}, "
+                f"metrics={self.names})")
@@ -0,0 +1,60 @@
+import threading
+from typing import Optional
+
+from app.models.did import DID
+
+
+class TrustedStakeholderRegistry:
+    """
+    Thread safe registry of trusted stakeholders keyed by their raw DID, with O(1) membership,
+    insertion and removal and a reverse index from providers to their trusted capacities.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        # (name, DID) of trusted stakeholders by raw DID, in insertion order
+        self._stakeholders: dict[str, tuple[str, DID]] = {}
+        self._capacities_by_provider: dict[str, set[str]] = {}
+        self._provider_by_capacity: dict[str, str] = {}
+
+    def add(self, stakeholder):
+        provider = getattr(stakeholder, "provider", None)
+        self.add_raw(stakeholder.did.raw, stakeholder.name, provider.did.raw if provider is not None else None,
+                     stakeholder.did)
+
+    def add_raw(self, did_raw: str, name: str, provider_did_raw: Optional[str] = None, did: Optional[DID] = None):
+        """Add a stakeholder by its raw DID, e.g. a row of a StakeholderTable."""
+        with self._lock:
+            if did_raw in self._stakeholders:
+                return
+            self._stakeholders[did_raw] = (name, did if did is not None else DID(did_raw))
+            if provider_did_raw is not None:
+                self._capacities_by_provider.setdefault(provider_did_raw, set()).add(did_raw)
+                self._provider_by_capacity[did_raw] = provider_did_raw
+
+    def remove(self, did_raw: str):
+        with self._lock:
+            if self._stakeholders.pop(did_raw, None) is None:
+                return
+            provider_did_raw = self._provider_by_capacity.pop(did_raw, None)
+            if provider_did_raw is not None:
+                capacities = self._capacities_by_provider[provider_did_raw]
+                capacities.discard(did_raw)
+                if not capacities:
+                    del self._capacities_by_provider[provider_did_raw]
+
+    def __contains__(self, did_raw: str) -> bool:
+        return did_raw in self._stakeholders
+
+    def __len__(self) -> int:
+        return len(self._stakeholders)
+
+    def trusted_capacities(self, provider_did_raw: str) -> set[str]:
+        """Raw DIDs of the trusted capacities of a provider."""
+        with self._lock:
+            return set(self._capacities_by_provider.get(provider_did_raw, ()))
+
+    def as_list(self) -> list[tuple[str, DID]]:
+        """Trusted stakeholders as (name, DID) tuples in the order they were trusted."""
+        with self._lock:
+            return list(self._stakeholders.values())
@@ -0,0 +1,92 @@
+import asyncio
+import logging
+from contextlib import suppress
+from typing import Optional
+
+from sqlalchemy import true
+from sqlmodel import Session
+
+from app.models.sql_models import Stakeholder
+from app.trust_evaluation.evaluation import select_stakeholders_with_providers, iter_stakeholder_responses
+
+logger = logging.getLogger(__name__)
+
+
+class TrustPrecomputeScheduler:
+    """
+    Periodically re-evaluates all stakeholders in the background and materializes their trust in the
+    TrustScore table. Stakeholders are paged by DID into batches of `batch_size`, at most `concurrency`
+    batches are evaluated at the same time in worker threads.
+    """
+
+    def __init__(self, bind, interval: float, batch_size: int, concurrency: int):
+        self.bind = bind
+        self.interval = interval
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        with suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.precompute_all()
+            except Exception as e:
+                logger.error("Error in trust precomputation: %r", e)
+            await asyncio.sleep(self.interval)
+
+    def _select_batch(self, after: Optional[str]):
+        with Session(self.bind) as session:
+            return session.exec(
+                select_stakeholders_with_providers(Stakeholder.did > after if after is not None else true())
+                .order_by(Stakeholder.did)
+                .limit(self.batch_size)
+            ).all()
+
+    def _precompute_batch(self, stakeholder_rows):
+        for _ in iter_stakeholder_responses(stakeholder_rows, self.bind, materialize=True):
+            pass
+
+    async def precompute_all(self):
+        """
+        Evaluate all stakeholders once and materialize their trust.
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def precompute_batch(stakeholder_rows):
+            try:
+                await asyncio.to_thread(self._precompute_batch, stakeholder_rows)
+            except Exception as e:
+                logger.error("Error in trust precomputation of batch starting at %s: %r", stakeholder_rows[0][0].did, e)
+            finally:
+                semaphore.release()
+
+        batches = []
+        after = None
+        try:
+            while True:
+                # Wait for a free slot before reading the next batch, so only bounded batches are held in memory
+                await semaphore.acquire()
+                stakeholder_rows = await asyncio.to_thread(self._select_batch, after)
+                if not stakeholder_rows:
+                    semaphore.release()
+                    break
+                batches.append(asyncio.create_task(precompute_batch(stakeholder_rows)))
+                after = stakeholder_rows[-1][0].did
+        except BaseException:
+            # Batches already started are not left running when the selection fails or the scheduler stops
+            for batch in batches:
+                batch.cancel()
+            await asyncio.gather(*batches, return_exceptions=True)
+            raise
+        await asyncio.gather(*batches)
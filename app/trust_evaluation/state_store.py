@@ -0,0 +1,130 @@
+from datetime import datetime, timedelta
+from typing import Iterable, Iterator, Optional
+
+import numpy as np
+from sqlalchemy import bindparam
+from sqlmodel import Session, select
+
+from app.models.sql_models import TrustModelState
+from app.trust_evaluation.probabilistic import SingleFeatureTrustModelBank
+from app.utils.database import dialect_insert
+from app.utils.metrics import STAGE_DURATION, DB_FETCH
+
+# Columns of a state overwritten when it is written again
+STATE_COLUMNS = ("alpha", "beta", "n_eff", "measurements", "updated_at")
+
+
+class TrustModelStateStore:
+    """
+    Persists the SingleFeatureTrustModel of every performance metric of resource capacities, so the
+    probabilistic model keeps its history between requests. States are loaded in bulk with `load`,
+    restored into the rows of a SingleFeatureTrustModelBank with `restore_bank` and written back together
+    with `flush`.
+
+    The aggregator only returns the latest measurements, without a timestamp. Models of a bank which
+    observed less than `observation_interval` seconds ago are restored frozen, so repeated requests do
+    not observe the same measurements again. The `updated_at` column of a state is the time of its last
+    observation and also its version: `flush` does not overwrite states written concurrently since they
+    were loaded.
+    """
+
+    def __init__(self, bind, observation_interval: float = 0.0):
+        # Own session, so that commits of the store do not expire the objects of the request session
+        self.session = Session(bind, expire_on_commit=False)
+        self.observation_interval = observation_interval
+        # Loaded rows by DID and metric name
+        self.states: dict[str, dict[str, TrustModelState]] = {}
+        # Bank, row and restored n_eff of the models of DIDs restored with `restore_bank`
+        self.tracked_rows: dict[str, tuple[SingleFeatureTrustModelBank, int, np.ndarray]] = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.session.close()
+
+    def load(self, dids: Iterable[str]):
+        """
+        Load the stored model states of all given DIDs with a single query.
+        """
+        dids = [did for did in set(dids) if did not in self.states]
+        if not dids:
+            return
+        for did in dids:
+            self.states[did] = {}
+        with STAGE_DURATION.time(DB_FETCH):
+            rows = self.session.exec(
+                select(TrustModelState).where(TrustModelState.did.in_(dids))
+            ).all()
+        for row in rows:
+            self.states[row.did][row.metric] = row
+
+    def restore_bank(self, performance_models: SingleFeatureTrustModelBank, dids: Iterable[str]):
+        """
+        Continue the rows of a bank of performance models from the stored states of the given DIDs
+        (one per row) and track them for `flush`.
+        """
+        dids = list(dids)
+        self.load(dids)
+        observed_after = datetime.now() - timedelta(seconds=self.observation_interval)
+        for row, did in enumerate(dids):
+            states = self.states[did]
+            for column, metric_name in enumerate(performance_models.names):
+                state = states.get(metric_name)
+                if state is not None:
+                    performance_models.set_state(row, column, state.alpha, state.beta, state.n_eff, state.measurements)
+                    performance_models.frozen[row, column] = state.updated_at > observed_after
+            self.tracked_rows[did] = (performance_models, row, performance_models.n_eff[row].copy())
+
+    def flush(self):
+        """
+        Write the states of all tracked models back in one transaction. Every state is upserted
+        only if its row is still the version which was loaded (compare and set), states written
+        concurrently in the meantime are kept, as they observed the same measurements.
+        """
+        if not self.tracked_rows:
+            return
+        self._write(datetime.now())
+        # Later restores load the states again, whichever write won
+        for did in self.tracked_rows:
+            self.states.pop(did, None)
+        self.tracked_rows.clear()
+
+    def _tracked_states(self) -> Iterator[tuple[str, str, dict]]:
+        """The DID, metric name and state of every tracked model which observed since it was restored."""
+        for did, (performance_models, row, restored_n_eff) in self.tracked_rows.items():
+            for column, metric_name in enumerate(performance_models.names):
+                # Every observation increases n_eff, models which did not observe are not written
+                if performance_models.n_eff[row, column] != restored_n_eff[column]:
+                    yield did, metric_name, performance_models.get_state(row, column)
+
+    def _loaded_at(self, did: str, metric_name: str) -> Optional[datetime]:
+        state = self.states[did].get(metric_name)
+        return state.updated_at if state is not None else None
+
+    def _write(self, updated_at: datetime):
+        values = [
+            {
+                "did": did,
+                "metric": metric_name,
+                "alpha": float(state["alpha"]),
+                "beta": float(state["beta"]),
+                "n_eff": float(state["n_eff"]),
+                "measurements": [float(measurement) for measurement in state["measurements"]],
+                "updated_at": updated_at,
+                "loaded_at": self._loaded_at(did, metric_name),
+            }
+            for did, metric_name, state in self._tracked_states()
+        ]
+        if not values:
+            return
+        # Core statement on the table, the ORM would drop the `loaded_at` parameter of the compare and set
+        insert = dialect_insert(self.session, TrustModelState.__table__)
+        statement = insert.on_conflict_do_update(
+            index_elements=["did", "metric"],
+            set_={column: insert.excluded[column] for column in STATE_COLUMNS},
+            # States which were not loaded compare with NULL and are never overwritten
+            where=insert.table.c.updated_at == bindparam("loaded_at"),
+        )
+        self.session.execute(statement, values)
+        self.session.commit()
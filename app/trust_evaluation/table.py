@@ -0,0 +1,178 @@
+from typing import Iterable, Iterator, Optional
+
+import numpy as np
+
+from app.models.attributes import DEFAULT_TRUST_ATTRIBUTE, RANGES_INDEX, RANGES_MINIMUM, RANGES_MAXIMUM, \
+                                  RANGES_BEHAVIOUR
+from app.models.graphql_queries import GraphQLQueryFPath
+from app.models.stakeholder import DEFAULT_ATTRIBUTE_VALUE, DEFAULT_LATITUDE, DEFAULT_LONGITUDE, \
+                                   get_new_attributes_batch
+from app.utils.helpers import StakeholderType, MetricNames, prob_transform_array, verify_raw_did
+from app.utils.metrics import STAGE_DURATION, ATTRIBUTE_BINDING
+
+# Columns of `StakeholderTable.attributes`, the trust of every attribute
+ATTRIBUTE_COLUMNS = ("identity", "location", "performance", "compliance", "historical_behavior", "contextual_fit",
+                     "third_party_validation", "reputation", "direct_trust")
+ATTRIBUTE_INDEX = {attribute_name: column for column, attribute_name in enumerate(ATTRIBUTE_COLUMNS)}
+
+# Columns of `StakeholderTable.metrics`, in the order of the performance metrics of ResourceCapacity
+METRIC_COLUMNS = tuple(MetricNames)
+_METRIC_RANGES = np.array([RANGES_INDEX[metric_name] for metric_name in METRIC_COLUMNS])
+
+# Columns of the GraphQL fields with the trust of an attribute, and of the performance subfields
+TRUST_FIELD_COLUMNS = {
+    "compliance": ATTRIBUTE_INDEX["compliance"],
+    "historicalBehavior": ATTRIBUTE_INDEX["historical_behavior"],
+    "contextualFit": ATTRIBUTE_INDEX["contextual_fit"],
+    "thirdPartyValidation": ATTRIBUTE_INDEX["third_party_validation"],
+    "reputation": ATTRIBUTE_INDEX["reputation"],
+    "directTrust": ATTRIBUTE_INDEX["direct_trust"],
+}
+METRIC_FIELD_COLUMNS = {
+    "".join(word.capitalize() if index else word for index, word in enumerate(metric_name.split("_"))): column
+    for column, metric_name in enumerate(METRIC_COLUMNS)
+}
+
+PROVIDER_TYPES = (StakeholderType.RESOURCE_PROVIDER, StakeholderType.CAPACITY_PROVIDER)
+# Stakeholders which can only be evaluated together with their provider
+CAPACITY_TYPES = (StakeholderType.RESOURCE_CAPACITY, StakeholderType.RESOURCE)
+
+GRAPHQL_QUERY_FPATHS = {
+    StakeholderType.RESOURCE_PROVIDER: GraphQLQueryFPath.RESOURCE_PROVIDER,
+    StakeholderType.RESOURCE_CAPACITY: GraphQLQueryFPath.RESOURCE_CAPACITY,
+    StakeholderType.APPLICATION_PROVIDER: GraphQLQueryFPath.APPLICATION_PROVIDER,
+}
+
+
+# `(did, name, type)` of a stakeholder
+StakeholderValues = tuple[str, str, int]
+
+
+class InvalidStakeholderError(ValueError):
+    """
+    A stakeholder which cannot be evaluated, e.g. a capacity without a provider.
+    """
+
+
+class StakeholderTable:
+    """
+    Columnar counterpart of the ResourceProvider, ResourceCapacity and ApplicationProvider objects for
+    evaluating large fleets. Every stakeholder is a row of typed NumPy columns: the type it is evaluated
+    as, the row of its provider (-1 if none), the trust of every attribute in ATTRIBUTE_COLUMNS, its
+    location and the latest measurement of every performance metric (NaN if missing).
+    """
+
+    def __init__(self, dids: list[str], names: list[str], types: Iterable[int], provider_rows: Iterable[int]):
+        n_rows = len(dids)
+        self.dids = np.array(dids, dtype=object)
+        self.names = np.array(names, dtype=object)
+        self.types = np.fromiter(types, dtype=np.int8, count=n_rows)
+        self.provider_rows = np.fromiter(provider_rows, dtype=np.int32, count=n_rows)
+        self.rows = {did: row for row, did in enumerate(dids)}
+
+        self.attributes = np.full((n_rows, len(ATTRIBUTE_COLUMNS)), float(DEFAULT_ATTRIBUTE_VALUE))
+        # DIDs never change, so their verification is done once
+        self.attributes[:, ATTRIBUTE_INDEX["identity"]] = np.fromiter(
+            (verify_raw_did(did) for did in dids), dtype=bool, count=n_rows
+        )
+        self.lat = np.full(n_rows, DEFAULT_LATITUDE)
+        self.lon = np.full(n_rows, DEFAULT_LONGITUDE)
+        self.metrics = np.full((n_rows, len(METRIC_COLUMNS)), np.nan)
+
+    def __len__(self) -> int:
+        return len(self.dids)
+
+    @classmethod
+    def from_rows(cls, stakeholder_rows: Iterable[tuple[StakeholderValues, Optional[StakeholderValues]]]
+                  ) -> "StakeholderTable":
+        """
+        Build the table of stakeholders and their providers (or None), given as `(did, name, type)`, with
+        one row per DID. Providers are evaluated as resource providers whatever their own type.
+        Raises InvalidStakeholderError for capacities without a provider and unknown types.
+        """
+        values = {}
+        providers = set()
+        provider_dids = {}
+        for (did, name, stakeholder_type), provider_values in stakeholder_rows:
+            if stakeholder_type in CAPACITY_TYPES and provider_values is None:
+                raise InvalidStakeholderError(f"No provider of stakeholder {did}.")
+            if stakeholder_type not in PROVIDER_TYPES + CAPACITY_TYPES + (StakeholderType.APPLICATION_PROVIDER,):
+                raise InvalidStakeholderError("Incorrect stakeholder type.")
+            values.setdefault(did, (name, stakeholder_type))
+            if provider_values is not None:
+                provider_did, provider_name, provider_type = provider_values
+                values.setdefault(provider_did, (provider_name, provider_type))
+                providers.add(provider_did)
+                if stakeholder_type in CAPACITY_TYPES:
+                    provider_dids[did] = provider_did
+
+        rows = {did: row for row, did in enumerate(values)}
+        return cls(
+            list(values),
+            [name for name, _ in values.values()],
+            (
+                StakeholderType.RESOURCE_PROVIDER
+                if did in providers or stakeholder_type in PROVIDER_TYPES
+                else StakeholderType.RESOURCE_CAPACITY if stakeholder_type in CAPACITY_TYPES
+                else StakeholderType.APPLICATION_PROVIDER
+                for did, (_, stakeholder_type) in values.items()
+            ),
+            (rows[provider_dids[did]] if did in provider_dids else -1 for did in values)
+        )
+
+    def rows_of_type(self, rows: np.ndarray, stakeholder_type: StakeholderType) -> np.ndarray:
+        return rows[self.types[rows] == stakeholder_type]
+
+    def query_targets(self, rows: Iterable[int]) -> Iterator[tuple[str, GraphQLQueryFPath]]:
+        """
+        Yield the `(did, graphql_query_fpath)` pairs of the given rows for `get_new_attributes_batch`.
+        """
+        for row in rows:
+            yield self.dids[row], GRAPHQL_QUERY_FPATHS[self.types[row]]
+
+    def update_attributes(self, rows: np.ndarray, trust_attributes: Optional[dict] = None):
+        """
+        Bind the attributes of the given rows, as `Stakeholder.update_attributes` does for objects.
+        Attributes already fetched can be passed as `trust_attributes` (by DID), the others are fetched in batches.
+        """
+        trust_attributes = trust_attributes or {}
+        missing_rows = [row for row in rows if self.dids[row] not in trust_attributes]
+        if missing_rows:
+            trust_attributes = {**trust_attributes, **get_new_attributes_batch(self.query_targets(missing_rows))}
+
+        with STAGE_DURATION.time(ATTRIBUTE_BINDING):
+            self._bind_attributes(rows, trust_attributes)
+
+    def _bind_attributes(self, rows: np.ndarray, trust_attributes: dict):
+        attributes, metrics, lat, lon, dids = self.attributes, self.metrics, self.lat, self.lon, self.dids
+        # Measurements are only used once, as the metrics of Performance are cleared after every computation
+        metrics[rows] = np.nan
+        for row in rows:
+            new_trust_attributes = trust_attributes.get(dids[row])
+            if not new_trust_attributes:
+                continue
+            for field, values in new_trust_attributes.items():
+                column = TRUST_FIELD_COLUMNS.get(field)
+                if column is not None:
+                    if "trust" in values:
+                        trust = values["trust"]
+                        attributes[row, column] = DEFAULT_TRUST_ATTRIBUTE if trust is None else trust
+                elif field == "performance":
+                    for subfield, value in values.items():
+                        metric_column = METRIC_FIELD_COLUMNS.get(subfield)
+                        if metric_column is not None and value is not None:
+                            metrics[row, metric_column] = value
+                elif field == "location":
+                    if "lat" in values:
+                        lat[row] = np.nan if values["lat"] is None else values["lat"]
+                    if "lon" in values:
+                        lon[row] = np.nan if values["lon"] is None else values["lon"]
+
+    def normalized_metrics(self, rows: np.ndarray) -> np.ndarray:
+        """
+        Measurements of the given rows transformed to probabilities, missing measurements stay NaN.
+        """
+        return prob_transform_array(
+            RANGES_MINIMUM[_METRIC_RANGES], RANGES_MAXIMUM[_METRIC_RANGES], RANGES_BEHAVIOUR[_METRIC_RANGES],
+            self.metrics[rows]
+        )
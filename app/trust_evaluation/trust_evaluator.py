@@ -1,27 +1,62 @@
+import logging
+
 import numpy as np
 
-from app.models.stakeholder import ResourceProvider, ResourceCapacity, ApplicationProvider
+from app.models.stakeholder import ResourceProvider, ResourceCapacity, ApplicationProvider, get_new_attributes_batch
+from app.models.attributes import TrustCalcModel, AttributeWeights, DEFAULT_TRUST_ATTRIBUTE
+from app.utils.helpers import StakeholderType, validate_location_array
+from app.trust_evaluation.probabilistic import SingleFeatureTrustModelBank
+from app.trust_evaluation.registry import TrustedStakeholderRegistry
+from app.trust_evaluation.table import ATTRIBUTE_INDEX, METRIC_COLUMNS
+from app.utils.metrics import STAGE_DURATION, DISTRUST, compute_stage, model_label
+
+logger = logging.getLogger(__name__)
 
 # The ontology is defined here
 
+# Weighted attributes of every stakeholder type, in the order in which compute_trust combines them
+WEIGHTED_ATTRIBUTES = {
+    StakeholderType.RESOURCE_PROVIDER: ("compliance", "historical_behavior", "reputation", "direct_trust"),
+    StakeholderType.RESOURCE_CAPACITY: ("performance", "historical_behavior", "contextual_fit",
+                                        "third_party_validation", "reputation", "direct_trust"),
+    StakeholderType.APPLICATION_PROVIDER: ("compliance", "reputation", "direct_trust"),
+}
+
+# Columns of the weighted attributes of every stakeholder type in a StakeholderTable and their weights
+WEIGHTED_COLUMNS = {
+    entity_idx: (
+        [ATTRIBUTE_INDEX[attribute_name] for attribute_name in attribute_names],
+        np.array([getattr(AttributeWeights, attribute_name.upper())[entity_idx] for attribute_name in attribute_names],
+                 dtype=float)
+    )
+    for entity_idx, attribute_names in WEIGHTED_ATTRIBUTES.items()
+}
+IDENTITY_COLUMN = ATTRIBUTE_INDEX["identity"]
+LOCATION_COLUMN = ATTRIBUTE_INDEX["location"]
+PERFORMANCE_COLUMN = ATTRIBUTE_INDEX["performance"]
+
 class TrustEvaluator:
     
     def __init__(self, model):
-        self.trusted_stakeholders = []
+        self.trusted_stakeholders = TrustedStakeholderRegistry()
         self.model = model
 
     def get_trusted_stakeholders(self):
 
-        print('Trusted stakeholders:', [i[0] for i in self.trusted_stakeholders])
-        return self.trusted_stakeholders
+        trusted_stakeholders = self.trusted_stakeholders.as_list()
+        logger.debug("Trusted stakeholders: %s", [i[0] for i in trusted_stakeholders])
+        return trusted_stakeholders
         
-    def compute_trust(self, stakeholder):
+    def compute_trust(self, stakeholder, trust_attributes=None):
+        stakeholder.update_attributes(trust_attributes)  # Update/initialize attributes on trust
+        with STAGE_DURATION.time(compute_stage(self.model)):
+            self._compute_trust(stakeholder)
+
+    def _compute_trust(self, stakeholder):
         attributes_trust = []
         weights = []
         distrust = 0
 
-        stakeholder.update_attributes()  # Update/initialize attributes on trust
-
         if isinstance(stakeholder, ResourceProvider):
             # stakeholder.update_attributes()
             # provider trust estimation 
@@ -30,7 +65,8 @@ class TrustEvaluator:
             # did verification
             stakeholder.identity.calculate_trust()
             if stakeholder.identity.trust == 0:
-                print(f"{stakeholder.name}: distrust due to identity")
+                logger.debug("%s: distrust due to identity", stakeholder.name)
+                DISTRUST.inc((model_label(self.model), "identity"))
                 distrust = 1
             
             # 2) Stochastic part
@@ -63,17 +99,20 @@ class TrustEvaluator:
             # did verification
             stakeholder.identity.calculate_trust()
             if stakeholder.identity.trust == 0:
-                print(f"{stakeholder.name}: distrust due to identity")
+                logger.debug("%s: distrust due to identity", stakeholder.name)
+                DISTRUST.inc((model_label(self.model), "identity"))
                 distrust = 1
             
             stakeholder.location.calculate_trust()
             if stakeholder.location.trust == 0:
-                print(f"{stakeholder.name}: distrust due to location")
+                logger.debug("%s: distrust due to location", stakeholder.name)
+                DISTRUST.inc((model_label(self.model), "location"))
                 distrust = 1
             
             # provider trust
-            if not any(stakeholder.provider.did == trusted[1] for trusted in self.trusted_stakeholders):
-                print(f"{stakeholder.name}: distrust due to provider not trusted (provider did: {stakeholder.provider.did})")
+            if stakeholder.provider.did.raw not in self.trusted_stakeholders:
+                logger.debug("%s: distrust due to provider not trusted (provider did: %s)", stakeholder.name, stakeholder.provider.did.raw)
+                DISTRUST.inc((model_label(self.model), "provider not trusted"))
                 distrust = 1
             
             # 2) Stochastic part
@@ -117,12 +156,14 @@ class TrustEvaluator:
             # did verification
             stakeholder.identity.calculate_trust()
             if stakeholder.identity.trust == 0:
-                print(f"{stakeholder.name}: distrust due to identity")
+                logger.debug("%s: distrust due to identity", stakeholder.name)
+                DISTRUST.inc((model_label(self.model), "identity"))
                 distrust = 1
             
             stakeholder.location.calculate_trust()
             if stakeholder.location.trust == 0:
-                print(f"{stakeholder.name}: distrust due to location")
+                logger.debug("%s: distrust due to location", stakeholder.name)
+                DISTRUST.inc((model_label(self.model), "location"))
                 distrust = 1
             
             # 2) Stochastic part
@@ -142,7 +183,7 @@ class TrustEvaluator:
             attributes_trust.append(stakeholder.direct_trust.trust)
 
         else:
-            print(f"Warning: {stakeholder.name} does not belong to a valid group")
+            logger.warning("%s does not belong to a valid group", stakeholder.name)
             return
         
         # final weighted trust
@@ -151,13 +192,228 @@ class TrustEvaluator:
             return
         stakeholder.trust = np.dot(weights, attributes_trust)/np.sum(weights)
     
+    def compute_trust_batch(self, stakeholders, trust_attributes=None):
+        """
+        Compute the trust of many stakeholders, equivalent to calling compute_trust on each of them.
+        Stakeholders are grouped by type, every group is scored with one matrix-vector product of its
+        attribute trusts and weights, and the identity, location and provider checks are applied as masks.
+        Attributes are fetched in batches unless `trust_attributes` (by DID) is given.
+        Returns the trust of every stakeholder in the given order.
+        """
+        stakeholders = list(stakeholders)
+        if trust_attributes is None:
+            trust_attributes = get_new_attributes_batch(
+                (stakeholder.did.raw, stakeholder.graphql_query_fpath) for stakeholder in stakeholders
+            )
+
+        trust = np.zeros(len(stakeholders))
+        groups = {}
+        for index, stakeholder in enumerate(stakeholders):
+            if not isinstance(stakeholder, (ResourceProvider, ResourceCapacity, ApplicationProvider)):
+                logger.warning("%s does not belong to a valid group", stakeholder.name)
+                continue
+            stakeholder.update_attributes(trust_attributes.get(stakeholder.did.raw))
+            groups.setdefault(stakeholder.entity_idx, []).append(index)
+
+        with STAGE_DURATION.time(compute_stage(self.model)):
+            self._compute_trust_groups(stakeholders, groups, trust)
+        return trust
+
+    def _compute_trust_groups(self, stakeholders, groups, trust):
+        for entity_idx, indices in groups.items():
+            group = [stakeholders[index] for index in indices]
+            names = [stakeholder.name for stakeholder in group]
+            attribute_names = WEIGHTED_ATTRIBUTES[entity_idx]
+
+            # 1) Deterministic part
+            distrust = np.zeros(len(group), dtype=bool)
+            for stakeholder in group:
+                stakeholder.identity.calculate_trust()
+            distrust |= self._distrust_mask(names, np.array([s.identity.trust == 0 for s in group]), "identity")
+            if entity_idx != StakeholderType.RESOURCE_PROVIDER:
+                for stakeholder in group:
+                    stakeholder.location.calculate_trust()
+                distrust |= self._distrust_mask(names, np.array([s.location.trust == 0 for s in group]), "location")
+            if entity_idx == StakeholderType.RESOURCE_CAPACITY:
+                distrust |= self._distrust_mask(
+                    names, np.array([s.provider.did.raw not in self.trusted_stakeholders for s in group]),
+                    "provider not trusted"
+                )
+
+            # 2) Stochastic part
+            attributes_trust = np.empty((len(group), len(attribute_names)))
+            for row, stakeholder in enumerate(group):
+                for column, attribute_name in enumerate(attribute_names):
+                    attribute = getattr(stakeholder, attribute_name)
+                    if attribute_name == "performance":
+                        attribute.calculate_trust(self.model)
+                    else:
+                        attribute.calculate_trust()
+                    attributes_trust[row, column] = attribute.trust
+
+            # final weighted trust
+            weights = WEIGHTED_COLUMNS[entity_idx][1]
+            group_trust = np.where(distrust, 0.0, attributes_trust @ weights / np.sum(weights))
+            trust[indices] = group_trust
+            for stakeholder, stakeholder_trust in zip(group, group_trust):
+                stakeholder.trust = stakeholder_trust
+
+    def _distrust_mask(self, names, mask, reason):
+        """
+        Count and log the stakeholders distrusted by `mask`, `names` holds their names in the same order.
+        """
+        distrusted = np.flatnonzero(mask)
+        if len(distrusted):
+            DISTRUST.inc((model_label(self.model), reason), len(distrusted))
+            if logger.isEnabledFor(logging.DEBUG):
+                for index in distrusted:
+                    logger.debug("%s: distrust due to %s", names[index], reason)
+        return mask
+
+    def compute_trust_table(self, table, rows, performance_models=None):
+        """
+        Compute the trust of rows of a StakeholderTable, equivalent to compute_trust_batch on the objects.
+        Their attributes must be bound with `StakeholderTable.update_attributes` first. The probabilistic
+        model continues `performance_models`, a SingleFeatureTrustModelBank with one row per resource
+        capacity among `rows` in the same order, or starts from fresh models without it.
+        Returns the trust of every row.
+        """
+        rows = np.asarray(rows, dtype=np.intp)
+        trust = np.zeros(len(rows))
+        with STAGE_DURATION.time(compute_stage(self.model)):
+            for entity_idx in WEIGHTED_ATTRIBUTES:
+                group = np.flatnonzero(table.types[rows] == entity_idx)
+                if len(group):
+                    trust[group] = self._compute_trust_table_group(table, rows[group], entity_idx, performance_models)
+        return trust
+
+    def _compute_trust_table_group(self, table, rows, entity_idx, performance_models):
+        attributes = table.attributes
+        names = table.names[rows]
+
+        # 1) Deterministic part
+        distrust = self._distrust_mask(names, attributes[rows, IDENTITY_COLUMN] == 0, "identity")
+        if entity_idx != StakeholderType.RESOURCE_PROVIDER:
+            location_trust = validate_location_array(table.lat[rows], table.lon[rows])
+            attributes[rows, LOCATION_COLUMN] = location_trust
+            distrust |= self._distrust_mask(names, ~location_trust, "location")
+        if entity_idx == StakeholderType.RESOURCE_CAPACITY:
+            provider_dids = table.dids[table.provider_rows[rows]]
+            distrust |= self._distrust_mask(
+                names,
+                np.fromiter((did not in self.trusted_stakeholders for did in provider_dids), dtype=bool, count=len(rows)),
+                "provider not trusted"
+            )
+            attributes[rows, PERFORMANCE_COLUMN] = self._compute_performance_table(table, rows, performance_models)
+
+        # 2) Stochastic part and final weighted trust
+        columns, weights = WEIGHTED_COLUMNS[entity_idx]
+        return np.where(distrust, 0.0, attributes[np.ix_(rows, columns)] @ weights / np.sum(weights))
+
+    def _compute_performance_table(self, table, rows, performance_models):
+        probabilities = table.normalized_metrics(rows)
+        if self.model == TrustCalcModel.DETERMINISTIC:
+            measured = ~np.isnan(probabilities)
+            counts = measured.sum(axis=1)
+            totals = np.where(measured, probabilities, 0.0).sum(axis=1)
+            # Capacities without measurements, e.g. after a failed aggregator request, get the default trust
+            return np.divide(totals, counts, out=np.full(len(rows), DEFAULT_TRUST_ATTRIBUTE), where=counts > 0)
+        elif self.model == TrustCalcModel.PROBABILISTIC:
+            if performance_models is None:
+                performance_models = SingleFeatureTrustModelBank(len(rows), METRIC_COLUMNS)
+            performance_models.observe(probabilities)
+            return np.mean(performance_models.adjusted_trust_score, axis=1)
+        else:
+            raise ValueError(f"Unknown trust model {self.model}")
+
+    def trust_evaluation_table(self, table, rows, trust):
+        """
+        `trust_evaluation` of rows of a StakeholderTable with the trust returned by `compute_trust_table`.
+        """
+        for row, stakeholder_trust in zip(rows, trust):
+            if stakeholder_trust > 0.5:
+                provider_row = table.provider_rows[row]
+                self.trusted_stakeholders.add_raw(
+                    table.dids[row], table.names[row], table.dids[provider_row] if provider_row >= 0 else None
+                )
+                logger.debug("%s is trustworthy", table.names[row])
+            else:
+                self.trusted_stakeholders.remove(table.dids[row])
+                logger.debug("%s is not trustworthy", table.names[row])
+
     def trust_evaluation(self, stakeholder):
         # Gets stakeholder trust if above a certain threshold add to trusted_stakeholders
         if stakeholder.trust > 0.5:
-            if (stakeholder.name, stakeholder.did) not in self.trusted_stakeholders:
-                self.trusted_stakeholders.append((stakeholder.name, stakeholder.did))
-            print(f"{stakeholder.name} is trustworthy")
+            self.trusted_stakeholders.add(stakeholder)
+            logger.debug("%s is trustworthy", stakeholder.name)
         else:
-            if (stakeholder.name, stakeholder.did) in self.trusted_stakeholders:    
-                self.trusted_stakeholders.remove((stakeholder.name, stakeholder.did))
-            print(f"{stakeholder.name} is not trustworthy")
\ No newline at end of file
+            self.trusted_stakeholders.remove(stakeholder.did.raw)
+            logger.debug("%s is not trustworthy", stakeholder.name)
+
+
+class DualModelTrustEvaluator:
+    """
+    Evaluates stakeholders with both the probabilistic and the deterministic model while
+    fetching their trust attributes from the aggregator only once.
+    """
+
+    def __init__(self):
+        self.probabilistic = TrustEvaluator(model=TrustCalcModel.PROBABILISTIC)
+        self.deterministic = TrustEvaluator(model=TrustCalcModel.DETERMINISTIC)
+
+    def evaluate(self, stakeholder, trust_attributes=None):
+        """
+        Compute and evaluate the trust of a stakeholder with both models from one attribute snapshot.
+        Returns the probabilistic and the deterministic trust.
+        """
+        if trust_attributes is None:
+            # Failed fetches are already reported, an empty snapshot keeps both models from refetching
+            trust_attributes = stakeholder.get_new_attributes() or {}
+
+        self.probabilistic.compute_trust(stakeholder, trust_attributes)
+        self.probabilistic.trust_evaluation(stakeholder)
+        probabilistic_trust = stakeholder.trust
+
+        self.deterministic.compute_trust(stakeholder, trust_attributes)
+        self.deterministic.trust_evaluation(stakeholder)
+        deterministic_trust = stakeholder.trust
+
+        return probabilistic_trust, deterministic_trust
+
+    def evaluate_batch(self, stakeholders, trust_attributes=None):
+        """
+        Batch variant of `evaluate` built on `TrustEvaluator.compute_trust_batch`. Providers are only
+        trusted after their batch, so they have to be evaluated before the batch of their capacities.
+        Returns arrays of the probabilistic and the deterministic trust.
+        """
+        stakeholders = list(stakeholders)
+        if trust_attributes is None:
+            trust_attributes = get_new_attributes_batch(
+                (stakeholder.did.raw, stakeholder.graphql_query_fpath) for stakeholder in stakeholders
+            )
+
+        probabilistic_trust = self.probabilistic.compute_trust_batch(stakeholders, trust_attributes)
+        for stakeholder in stakeholders:
+            self.probabilistic.trust_evaluation(stakeholder)
+
+        deterministic_trust = self.deterministic.compute_trust_batch(stakeholders, trust_attributes)
+        for stakeholder in stakeholders:
+            self.deterministic.trust_evaluation(stakeholder)
+
+        return probabilistic_trust, deterministic_trust
+
+    def evaluate_table(self, table, rows, trust_attributes=None, performance_models=None):
+        """
+        Variant of `evaluate_batch` for rows of a StakeholderTable, whose attributes are bound once for both
+        models. See `TrustEvaluator.compute_trust_table` for `performance_models`.
+        Returns arrays of the probabilistic and the deterministic trust.
+        """
+        table.update_attributes(rows, trust_attributes)
+
+        probabilistic_trust = self.probabilistic.compute_trust_table(table, rows, performance_models)
+        self.probabilistic.trust_evaluation_table(table, rows, probabilistic_trust)
+
+        deterministic_trust = self.deterministic.compute_trust_table(table, rows)
+        self.deterministic.trust_evaluation_table(table, rows, deterministic_trust)
+
+        return probabilistic_trust, deterministic_trust
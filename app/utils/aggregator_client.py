@@ -0,0 +1,194 @@
+import asyncio
+import importlib.util
+import logging
+import random
+import threading
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Optional
+
+import httpx
+
+from app.utils.settings import settings
+from app.utils.metrics import STAGE_DURATION, AGGREGATOR_FETCH
+
+
+# Responses with these status codes are worth retrying, other errors are returned immediately
+RETRYABLE_STATUS_CODES = {429, 502, 503, 504}
+# Errors of automatic persisted queries, identified by their code or message
+PERSISTED_QUERY_NOT_FOUND = "PERSISTED_QUERY_NOT_FOUND"
+PERSISTED_QUERY_NOT_SUPPORTED = "PERSISTED_QUERY_NOT_SUPPORTED"
+PERSISTED_QUERY_ERRORS = {
+    "PersistedQueryNotFound": PERSISTED_QUERY_NOT_FOUND,
+    "PersistedQueryNotSupported": PERSISTED_QUERY_NOT_SUPPORTED,
+}
+
+logger = logging.getLogger(__name__)
+
+
+class AggregatorClient:
+    """
+    Pooled client for the GraphQL API of the Trust Metric Aggregator.
+
+    All requests share one `httpx.AsyncClient` (and therefore its keep-alive connection pool),
+    which lives on a dedicated event loop thread. Synchronous request handlers use `query_sync`,
+    asynchronous code awaits `query`; both are bounded by a per-call timeout and a total deadline
+    covering all retries.
+
+    With `persisted_queries` queries with a hash are first sent as automatic persisted queries, i.e.
+    only the SHA-256 hash of the document, and with the full document only if the aggregator does
+    not know the hash yet. If the aggregator does not support them, full documents are sent again.
+    """
+
+    def __init__(self, base_url: str, timeout: float, total_timeout: float, max_connections: int,
+                 max_keepalive_connections: int, retries: int, retry_backoff: float, http2: bool,
+                 persisted_queries: bool = False, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.total_timeout = total_timeout
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        # HTTP/2 is only negotiated when the optional h2 package is installed
+        self.http2 = http2 and importlib.util.find_spec("h2") is not None
+        self.persisted_queries = persisted_queries
+        # Transport of the client instead of the network, e.g. an httpx.MockTransport
+        self.transport = transport
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="aggregator-client", daemon=True)
+        self._thread.start()
+        self._client = asyncio.run_coroutine_threadsafe(self._create_client(), self._loop).result()
+
+    async def _create_client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=httpx.Timeout(self.timeout),
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive_connections,
+            ),
+            http2=self.http2,
+            transport=self.transport,
+        )
+
+    def _retry_delay(self, attempt: int) -> float:
+        # Exponential backoff randomized by ±50% so that concurrent retries do not synchronise
+        return self.retry_backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+
+    async def _post_with_retries(self, payload: dict) -> httpx.Response:
+        for attempt in range(self.retries + 1):
+            try:
+                response = await self._client.post("/graphql", json=payload)
+                if response.status_code not in RETRYABLE_STATUS_CODES or attempt == self.retries:
+                    response.raise_for_status()
+                    return response
+            except httpx.TransportError:
+                if attempt == self.retries:
+                    raise
+            await asyncio.sleep(self._retry_delay(attempt))
+
+    async def _post_persisted_query(self, query: str, variables: dict, query_hash: str) -> dict:
+        extensions = {"persistedQuery": {"version": 1, "sha256Hash": query_hash}}
+        try:
+            response_json = (await self._post_with_retries({'variables': variables, 'extensions': extensions})).json()
+        except httpx.HTTPStatusError as e:
+            # Some servers answer unknown hashes with 400 Bad Request
+            if e.response.status_code != 400:
+                raise
+            response_json = e.response.json()
+
+        error_codes = {
+            (error.get("extensions") or {}).get("code") or PERSISTED_QUERY_ERRORS.get(error.get("message"))
+            for error in response_json.get("errors") or ()
+        }
+        if PERSISTED_QUERY_NOT_SUPPORTED in error_codes:
+            logger.warning("The aggregator does not support persisted queries, sending full queries")
+            self.persisted_queries = False
+            return (await self._post_with_retries({'query': query, 'variables': variables})).json()
+        if PERSISTED_QUERY_NOT_FOUND in error_codes:
+            # Register the document under its hash
+            return (await self._post_with_retries(
+                {'query': query, 'variables': variables, 'extensions': extensions}
+            )).json()
+        return response_json
+
+    async def _query(self, query: str, variables: dict, query_hash: Optional[str]) -> Optional[dict]:
+        try:
+            with STAGE_DURATION.time(AGGREGATOR_FETCH):
+                async with asyncio.timeout(self.total_timeout):
+                    if self.persisted_queries and query_hash is not None:
+                        response_json = await self._post_persisted_query(query, variables, query_hash)
+                    else:
+                        response_json = (await self._post_with_retries({'query': query, 'variables': variables})).json()
+            graphql_data = response_json.get("data")
+            if graphql_data is None:
+                logger.error("GraphQL response missing 'data': %s", response_json)
+            return graphql_data
+        except Exception as e:
+            logger.error("Error in AggregatorClient query: %r", e)
+            return None
+
+    async def query(self, query: str, variables: dict, query_hash: Optional[str] = None) -> Optional[dict]:
+        """
+        Send a GraphQL query to the aggregator and return the 'data' of the response or None on failure.
+        `query_hash` is the SHA-256 of `query`, which is needed to send it as a persisted query.
+        """
+        return await asyncio.wrap_future(
+            asyncio.run_coroutine_threadsafe(self._query(query, variables, query_hash), self._loop)
+        )
+
+    def query_sync(self, query: str, variables: dict, query_hash: Optional[str] = None) -> Optional[dict]:
+        """
+        Blocking variant of `query` for synchronous code.
+        """
+        future = asyncio.run_coroutine_threadsafe(self._query(query, variables, query_hash), self._loop)
+        try:
+            # The coroutine enforces the total deadline itself, the margin only guards against a stuck loop
+            return future.result(timeout=self.total_timeout + 1)
+        except FutureTimeoutError:
+            future.cancel()
+            logger.error("Error in AggregatorClient query: total deadline exceeded")
+            return None
+
+    def close(self):
+        """
+        Close all pooled connections and stop the event loop thread.
+        """
+        asyncio.run_coroutine_threadsafe(self._client.aclose(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+
+_aggregator_client: Optional[AggregatorClient] = None
+_aggregator_client_lock = threading.Lock()
+
+
+def get_aggregator_client() -> AggregatorClient:
+    """
+    Return the process wide aggregator client, creating it on first use.
+    """
+    global _aggregator_client
+    with _aggregator_client_lock:
+        if _aggregator_client is None:
+            _aggregator_client = AggregatorClient(
+                base_url=f"http://{settings.trust_metric_aggregator_host}:{settings.trust_metric_aggregator_port}",
+                timeout=settings.aggregator_timeout,
+                total_timeout=settings.aggregator_total_timeout,
+                max_connections=settings.aggregator_max_connections,
+                max_keepalive_connections=settings.aggregator_max_keepalive_connections,
+                retries=settings.aggregator_retries,
+                retry_backoff=settings.aggregator_retry_backoff,
+                http2=settings.aggregator_http2,
+                persisted_queries=settings.aggregator_persisted_queries,
+            )
+        return _aggregator_client
+
+
+def close_aggregator_client():
+    global _aggregator_client
+    with _aggregator_client_lock:
+        if _aggregator_client is not None:
+            _aggregator_client.close()
+            _aggregator_client = None
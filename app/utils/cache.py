@@ -0,0 +1,131 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+class TrustResultCache:
+    """
+    Thread safe in-process cache of trust results keyed by DID and trust model.
+
+    Entries expire `ttl` seconds after they were stored, or earlier for a `get` with a smaller `max_age`,
+    and the least recently used entry is evicted once more than `max_size` entries are stored. Entries of resource capacities remember their
+    provider, so that invalidating a provider also invalidates its capacities.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+
+        # Time each entry was stored and its value
+        self._entries: OrderedDict[tuple[str, Hashable], tuple[float, Any]] = OrderedDict()
+        # Keys of the entries of every DID, so a DID is invalidated without scanning all entries
+        self._keys: dict[str, set[tuple[str, Hashable]]] = {}
+        # Cached DIDs by the provider they depend on and the provider of every cached DID
+        self._dependents: dict[str, set[str]] = {}
+        self._providers: dict[str, str] = {}
+        self._lock = threading.RLock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0 and self.ttl > 0
+
+    def get(self, did: str, model: Hashable, max_age: Optional[float] = None) -> Optional[Any]:
+        """
+        The cached value, if it was stored less than `ttl` and `max_age` (seconds) ago.
+        """
+        with self._lock:
+            entry = self._entries.get((did, model))
+            if entry is None:
+                self.misses += 1
+                return None
+            stored_at, value = entry
+            age = time.monotonic() - stored_at
+            if age >= self.ttl:
+                self._remove((did, model))
+                self.expirations += 1
+                self.misses += 1
+                return None
+            if max_age is not None and age >= max_age:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((did, model))
+            self.hits += 1
+            return value
+
+    def put(self, did: str, model: Hashable, value: Any, provider_did: Optional[str] = None):
+        if not self.enabled:
+            return
+        with self._lock:
+            key = (did, model)
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            self._keys.setdefault(did, set()).add(key)
+            if provider_did is not None and self._providers.get(did) != provider_did:
+                self._remove_dependent(did)
+                self._dependents.setdefault(provider_did, set()).add(did)
+                self._providers[did] = provider_did
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, did: str) -> int:
+        """
+        Remove all entries of a DID and of the stakeholders depending on it. Returns the number of removed entries.
+        """
+        with self._lock:
+            keys = [
+                key
+                for invalidated_did in (did, *self._dependents.get(did, ()))
+                for key in self._keys.get(invalidated_did, ())
+            ]
+            for key in keys:
+                self._remove(key)
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def _remove(self, key: tuple[str, Hashable]):
+        """
+        Remove an entry, and the DID from the index and its provider once it has no entries left.
+        """
+        del self._entries[key]
+        did = key[0]
+        keys = self._keys[did]
+        keys.discard(key)
+        if not keys:
+            del self._keys[did]
+            self._remove_dependent(did)
+
+    def _remove_dependent(self, did: str):
+        provider_did = self._providers.pop(did, None)
+        if provider_did is not None:
+            dependents = self._dependents[provider_did]
+            dependents.discard(did)
+            if not dependents:
+                del self._dependents[provider_did]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys.clear()
+            self._dependents.clear()
+            self._providers.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
@@ -1,25 +1,102 @@
-from typing import Annotated
+import threading
+from typing import Annotated, Optional
 
 from fastapi import Depends
+from sqlalchemy import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
 from sqlmodel import Session, SQLModel, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.utils.settings import settings
 
 
-DATABASE_URL = f"postgresql://{settings.database_username}:{settings.database_password}@{settings.database_hostname}:{settings.database_port}/{settings.database_name}"
+def get_database_url() -> str:
+    return settings.database_url or f"postgresql://{settings.database_username}:{settings.database_password}@{settings.database_hostname}:{settings.database_port}/{settings.database_name}"
+
+
+def get_async_database_url() -> str:
+    return settings.async_database_url or f"postgresql+asyncpg://{settings.database_username}:{settings.database_password}@{settings.database_hostname}:{settings.database_port}/{settings.database_name}"
+
+
+# Engines are created on first use, the app creates them in its lifespan instead of on import
+_engine: Optional[Engine] = None
+_async_engine: Optional[AsyncEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> Engine:
+    global _engine
+    if _engine is not None:
+        return _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = create_engine(
+                get_database_url(),
+                pool_size=20,        # Increase from 5
+                max_overflow=30,     # Increase from 10
+                pool_timeout=30,     # Keep or increase as needed
+            )
+        return _engine
+
+
+def get_async_engine() -> AsyncEngine:
+    global _async_engine
+    if _async_engine is not None:
+        return _async_engine
+    with _engine_lock:
+        if _async_engine is None:
+            _async_engine = create_async_engine(
+                get_async_database_url(),
+                pool_size=20,
+                max_overflow=30,
+                pool_timeout=30,
+            )
+        return _async_engine
+
+
+async def dispose_engines():
+    """
+    Close the pooled connections of the engines which were created.
+    """
+    global _engine, _async_engine
+    with _engine_lock:
+        engine, async_engine = _engine, _async_engine
+        _engine = _async_engine = None
+    if engine is not None:
+        engine.dispose()
+    if async_engine is not None:
+        await async_engine.dispose()
+
+
+def dialect_insert(session: Session, model):
+    """
+    INSERT statement of the dialect of the session, which supports `on_conflict_do_update`,
+    `on_conflict_do_nothing` and `returning` (PostgreSQL and SQLite).
+    """
+    dialect_name = session.get_bind().dialect.name
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"Upserts are not supported on {dialect_name}")
+    return insert(model)
+
 
-engine = create_engine(
-    DATABASE_URL,
-    pool_size=20,        # Increase from 5
-    max_overflow=30,     # Increase from 10
-    pool_timeout=30,     # Keep or increase as needed
-)
 def create_db_and_tables():
-    SQLModel.metadata.create_all(engine)
+    SQLModel.metadata.create_all(get_engine())
 
 
 def get_session():
-    with Session(engine) as session:
+    with Session(get_engine()) as session:
+        yield session
+
+SessionDep = Annotated[Session, Depends(get_session)]
+
+
+async def get_async_session():
+    # Loaded rows stay usable after commits, lazy loading is not possible with an async session
+    async with AsyncSession(get_async_engine(), expire_on_commit=False) as session:
         yield session
 
-SessionDep = Annotated[Session, Depends(get_session)]
\ No newline at end of file
+AsyncSessionDep = Annotated[AsyncSession, Depends(get_async_session)]
@@ -1,12 +1,17 @@
-from typing import NamedTuple
+import logging
+from typing import NamedTuple, Optional, TYPE_CHECKING
 from enum import IntEnum, StrEnum
-import requests
-from pathlib import Path
 import re
 import numpy as np
 
 from app.models.did import DID
 
+if TYPE_CHECKING:
+    from app.models.graphql_queries import GraphQLQuery
+    from app.utils.aggregator_client import AggregatorClient
+
+logger = logging.getLogger(__name__)
+
 class StakeholderType(IntEnum):
     RESOURCE_PROVIDER = 0
     RESOURCE_CAPACITY = 1
@@ -26,22 +31,132 @@ class MetricNames(StrEnum):
     UTILIZATION_RATE = "utilization_rate"
 
 
-def get_graphql_query_json(graphql_server_url: str, query_fpath: Path, variables: dict) -> dict:
-    with open(query_fpath, 'r') as query_file:
-        query = query_file.read()
-    try:
-        response = requests.post(
-            f"{graphql_server_url}/graphql",
-            json={'query': query, 'variables': variables},
-        )
-        response.raise_for_status()
-        graphql_data = response.json().get("data")
-        if graphql_data is None:
-            print(f"GraphQL response missing 'data': {response.text}")
-        return graphql_data
-    except Exception as e:
-        print(f"Error in get_graphql_query_json: {e}")
-        return None
+def get_graphql_query_json(aggregator_client: "AggregatorClient", query: "GraphQLQuery", variables: dict) -> dict:
+    return aggregator_client.query_sync(query.document, variables, query.sha256_hash)
+
+_GRAPHQL_TOKEN = re.compile(r'"(?:\\.|[^"\\])*"|#[^\n]*|\.\.\.|[_A-Za-z][_0-9A-Za-z]*|\s+|.', re.DOTALL)
+BATCH_ALIAS_PREFIX = "s"
+
+
+def _split_graphql_document(document: str) -> tuple[list[str], str, str]:
+    """
+    Split a GraphQL document into its fragment definitions and the variable definitions and
+    selection set (both without the enclosing brackets) of its single operation.
+    """
+    fragments = []
+    variable_definitions = ""
+    selection_set = ""
+    depth = 0
+    definition_start = None
+    for token in _GRAPHQL_TOKEN.finditer(document):
+        value = token.group()
+        if depth == 0 and definition_start is None and not value.isspace() and not value.startswith("#"):
+            definition_start = token.start()
+        if value in "{(":
+            depth += 1
+        elif value in "})":
+            depth -= 1
+            if depth == 0 and value == "}":
+                definition = document[definition_start:token.end()]
+                if definition.startswith("fragment"):
+                    fragments.append(definition)
+                else:
+                    body_start = definition.index("{", definition.find(")") + 1)
+                    if "(" in definition[:body_start]:
+                        variable_definitions = definition[definition.index("(") + 1:definition.rindex(")", 0, body_start)]
+                    selection_set = definition[body_start + 1:-1]
+                definition_start = None
+    return fragments, variable_definitions, selection_set
+
+
+def _alias_top_level_fields(selection_set: str, alias_prefix: str) -> str:
+    """
+    Prefix every top level field of a selection set with an alias.
+    """
+    aliased = []
+    depth = 0
+    previous = ""
+    for token in _GRAPHQL_TOKEN.finditer(selection_set):
+        value = token.group()
+        if value in "{(":
+            depth += 1
+        elif value in "})":
+            depth -= 1
+        elif depth == 0 and (value[0].isalpha() or value[0] == "_") and previous != "...":
+            value = f"{alias_prefix}{value}: {value}"
+        if not value.isspace():
+            previous = value
+        aliased.append(value)
+    return "".join(aliased)
+
+
+def build_batched_graphql_query(query: str, batch_size: int) -> str:
+    """
+    Build a single GraphQL document which repeats the operation of `query` `batch_size` times.
+    Every copy gets its top level fields aliased with `s<index>_` and its variables suffixed with
+    `_<index>`, so the variables of the n-th stakeholder are passed as e.g. `did_<n>`.
+    """
+    fragments, variable_definitions, selection_set = _split_graphql_document(query)
+    batched_variable_definitions = []
+    batched_selection_sets = []
+    for index in range(batch_size):
+        suffix_variables = lambda match: f"${match.group(1)}_{index}"
+        batched_variable_definitions.append(re.sub(r"\$(\w+)", suffix_variables, variable_definitions).strip())
+        aliased_selection_set = _alias_top_level_fields(selection_set, f"{BATCH_ALIAS_PREFIX}{index}_")
+        batched_selection_sets.append(re.sub(r"\$(\w+)", suffix_variables, aliased_selection_set))
+    batched_query = "\n".join(fragments)
+    batched_query += f"\nquery ({', '.join(batched_variable_definitions)}) {{{''.join(batched_selection_sets)}}}\n"
+    return batched_query
+
+
+def build_batched_graphql_variables(variables: list[dict]) -> dict:
+    """
+    Flatten the variables of every stakeholder in a batch to match `build_batched_graphql_query`.
+    """
+    return {
+        f"{variable_name}_{index}": variable_value
+        for index, stakeholder_variables in enumerate(variables)
+        for variable_name, variable_value in stakeholder_variables.items()
+    }
+
+
+def split_batched_graphql_data(graphql_data: Optional[dict], batch_size: int) -> list[Optional[dict]]:
+    """
+    Split the data of a batched GraphQL response back into one response per stakeholder,
+    in the same order as the variables of the batch.
+    """
+    if graphql_data is None:
+        return [None] * batch_size
+    split_data = [{} for _ in range(batch_size)]
+    for aliased_key, value in graphql_data.items():
+        index, key = aliased_key[len(BATCH_ALIAS_PREFIX):].split("_", 1)
+        split_data[int(index)][key] = value
+    return split_data
+
+
+def get_batched_graphql_query_json(aggregator_client: "AggregatorClient", batched_query: "GraphQLQuery", variables: list[dict]) -> list[Optional[dict]]:
+    """
+    Fetch the attributes of many stakeholders with a single aliased GraphQL request.
+    `batched_query` must repeat the query once per stakeholder, see `GraphQLQueryRegistry.get_batched`.
+    """
+    graphql_data = aggregator_client.query_sync(
+        batched_query.document,
+        build_batched_graphql_variables(variables),
+        batched_query.sha256_hash
+    )
+    return split_batched_graphql_data(graphql_data, len(variables))
+
+
+async def get_batched_graphql_query_json_async(aggregator_client: "AggregatorClient", batched_query: "GraphQLQuery", variables: list[dict]) -> list[Optional[dict]]:
+    """
+    Non-blocking variant of `get_batched_graphql_query_json` for the async request path.
+    """
+    graphql_data = await aggregator_client.query(
+        batched_query.document,
+        build_batched_graphql_variables(variables),
+        batched_query.sha256_hash
+    )
+    return split_batched_graphql_data(graphql_data, len(variables))
 
 def camel_to_snake_case(camel_case_string: str) -> str:
     """
@@ -51,14 +166,15 @@ def camel_to_snake_case(camel_case_string: str) -> str:
     return snake_case_string
 
 def verify_did(did: DID):
-    if did.raw.startswith("did:"):
+    return verify_raw_did(did.raw)
+
+def verify_raw_did(did_raw: str):
+    if did_raw.startswith("did:"):
         return True
     else:
-        print(f"Warning: {did} is not a valid DID")
+        logger.warning("%s is not a valid DID", did_raw)
         return False
 
-import numpy as np
-
 def prob_transform(minimum: float, maximum: float, behaviour: float, value: float) -> float:
     if behaviour == 1:
         if value <= minimum:
@@ -96,6 +212,35 @@ def prob_transform(minimum: float, maximum: float, behaviour: float, value: floa
         raise ValueError("Behaviour must be 1, -1, or 0")
 
 
+def prob_transform_array(minimum, maximum, behaviour, values) -> np.ndarray:
+    """
+    Vectorized `prob_transform`. All arguments are broadcast against each other, so whole arrays of
+    values can be transformed in one pass, either with scalar limits or with limits aligned to the values.
+    """
+    values = np.asarray(values, dtype=float)
+    minimum, maximum, behaviour = (np.asarray(argument, dtype=float) for argument in (minimum, maximum, behaviour))
+    if not np.isin(behaviour, (1, -1, 0)).all():
+        raise ValueError("Behaviour must be 1, -1, or 0")
+
+    mid = (minimum + maximum) / 2
+    below = values <= minimum
+    above = values >= maximum
+    # Degenerate ranges only produce values outside the limits, so their division results are never selected
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        sigmoid = 1 / (1 + np.exp(-(values - mid) / ((maximum - minimum) / 6)))
+        normalized_value = (values - mid) / ((maximum - minimum) / 2)
+
+    increasing = np.where(below, 0.0, np.where(above, 1.0, sigmoid))
+    decreasing = np.where(below, 1.0, np.where(above, 0.0, 1 - sigmoid))
+    centered = np.where(below | above, 0.0, np.maximum(0.0, 1.0 - normalized_value**2))
+    return np.select([behaviour == 1, behaviour == -1], [increasing, decreasing], centered)
+
+
+# Boundaries of the Slovenian territory
+LATITUDE_RANGE = (45.42, 46.88)
+LONGITUDE_RANGE = (13.38, 16.60)
+
+
 def validate_location(lat: float, lon: float):
     """
     Validates if the given coordinates are within Slovenian territory.
@@ -104,12 +249,24 @@ def validate_location(lat: float, lon: float):
         bool: True if the location is within Slovenia, False otherwise.
     """
 
-    min_lat, max_lat = 45.42, 46.88 
-    min_lon, max_lon = 13.38, 16.60
-    print(f"Validating location: lat={lat}, lon={lon}")
+    min_lat, max_lat = LATITUDE_RANGE
+    min_lon, max_lon = LONGITUDE_RANGE
+    logger.debug("Validating location: lat=%s, lon=%s", lat, lon)
     # Check if the coordinates are within the boundaries
     if min_lat <= lat <= max_lat:
         if min_lon <= lon <= max_lon:
             return True
 
-    return False
\ No newline at end of file
+    return False
+
+
+def validate_location_array(lat, lon) -> np.ndarray:
+    """
+    Vectorized `validate_location`, NaN coordinates are outside the territory.
+    """
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    return (
+        (LATITUDE_RANGE[0] <= lat) & (lat <= LATITUDE_RANGE[1])
+        & (LONGITUDE_RANGE[0] <= lon) & (lon <= LONGITUDE_RANGE[1])
+    )
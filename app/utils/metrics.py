@@ -0,0 +1,118 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+
+# Upper bounds (seconds) of the latency buckets, from a single attribute binding up to a slow aggregator
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+PROMETHEUS_MEDIA_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Histogram:
+    """
+    Thread safe histogram with one label, exported in the Prometheus text format.
+    """
+
+    def __init__(self, name: str, documentation: str, label: str, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label = label
+        self.buckets = buckets
+        # Bucket counts (not cumulative), sum and count by label value
+        self._series: dict[str, tuple[list[int], list[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_value: str, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][index] += 1
+            series[1][0] += value
+
+    @contextmanager
+    def time(self, label_value: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(label_value, time.perf_counter() - start)
+
+    def expose(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_value, (counts, total) in sorted(self._series.items()):
+                labels = f'{self.label}="{label_value}"'
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                cumulative += counts[-1]
+                lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {cumulative}')
+                lines.append(f"{self.name}_sum{{{labels}}} {total[0]}")
+                lines.append(f"{self.name}_count{{{labels}}} {cumulative}")
+        return lines
+
+
+class Counter:
+    """
+    Thread safe counter with labels, exported in the Prometheus text format.
+    """
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...]):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values: dict[tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label_values: tuple[str, ...], amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def expose(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                labels = ",".join(f'{label}="{label_value}"' for label, label_value in zip(self.labels, label_values))
+                lines.append(f"{self.name}{{{labels}}} {value}")
+        return lines
+
+
+STAGE_DURATION = Histogram(
+    "trust_stage_duration_seconds", "Duration of the stages of the trust evaluation pipeline.", "stage"
+)
+DISTRUST = Counter(
+    "trust_distrust_total", "Stakeholders distrusted by a deterministic check, by trust model and reason.",
+    ("model", "reason")
+)
+
+# Stages of STAGE_DURATION
+DB_FETCH = "db_fetch"
+AGGREGATOR_FETCH = "aggregator_fetch"
+ATTRIBUTE_BINDING = "attribute_binding"
+SERIALIZATION = "serialization"
+
+
+def model_label(model) -> str:
+    """
+    Label value of a TrustCalcModel.
+    """
+    return model.name.lower()
+
+
+def compute_stage(model) -> str:
+    """
+    Stage of STAGE_DURATION measuring the trust computation of a TrustCalcModel.
+    """
+    return f"compute_{model_label(model)}"
+
+
+def expose_metrics() -> str:
+    """
+    All metrics in the Prometheus text format.
+    """
+    return "\n".join(STAGE_DURATION.expose() + DISTRUST.expose()) + "\n"
@@ -0,0 +1,79 @@
+import asyncio
+import cProfile
+import logging
+import re
+import threading
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Request header which asks for a profile, and response header with the name of the stored profile
+PROFILE_HEADER = b"x-profile"
+PROFILE_FILE_HEADER = b"x-profile-file"
+PROFILE_SUFFIX = ".prof"
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware which profiles single requests sending the header `X-Profile: true` with cProfile,
+    including streamed response bodies. Profiles are stored in the pstats format in `directory`, of
+    which only the newest `max_profiles` are kept.
+
+    Since Python 3.12 cProfile is built on sys.monitoring, so a profile also contains the worker threads
+    of the request (and of concurrent requests) and only one profiler may be active at a time. Requests
+    arriving while another one is profiled are served without a profile.
+    """
+
+    def __init__(self, app, directory: str, max_profiles: int):
+        self.app = app
+        self.directory = Path(directory)
+        self.max_profiles = max_profiles
+        self._lock = threading.Lock()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or dict(scope["headers"]).get(PROFILE_HEADER, b"").lower() not in (b"1", b"true"):
+            await self.app(scope, receive, send)
+            return
+        if not self._lock.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+        try:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError as e:
+                # Another profiling tool is active
+                logger.warning("Request is not profiled: %s", e)
+                await self.app(scope, receive, send)
+                return
+
+            profile_path = self.directory / self._profile_name(scope)
+
+            async def send_with_profile_header(message):
+                if message["type"] == "http.response.start":
+                    message["headers"] = list(message.get("headers", [])) + \
+                                         [(PROFILE_FILE_HEADER, profile_path.name.encode())]
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_profile_header)
+            finally:
+                profiler.disable()
+                await asyncio.to_thread(self._store, profiler, profile_path)
+        finally:
+            self._lock.release()
+
+    @staticmethod
+    def _profile_name(scope) -> str:
+        path = re.sub(r"[^0-9A-Za-z_.-]+", "_", scope["path"]).strip("_")[:100]
+        return f"{time.time_ns()}-{scope['method']}-{path}{PROFILE_SUFFIX}"
+
+    def _store(self, profiler: cProfile.Profile, profile_path: Path):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        profiler.dump_stats(profile_path)
+        # Names start with the time, so the oldest profiles sort first
+        profiles = sorted(self.directory.glob(f"*{PROFILE_SUFFIX}"))
+        for old_profile in profiles[:max(len(profiles) - self.max_profiles, 0)]:
+            old_profile.unlink(missing_ok=True)
+        logger.info("Stored profile %s", profile_path)
@@ -1,3 +1,6 @@
+import threading
+from typing import Optional
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -5,14 +8,92 @@ class Settings(BaseSettings):
 
     trust_metric_aggregator_host: str
     trust_metric_aggregator_port: int
+    # Maximal number of stakeholders fetched from the aggregator with a single GraphQL request
+    aggregator_batch_size: int = 50
+    # Timeout of a single aggregator request and deadline of a query including its retries (seconds)
+    aggregator_timeout: float = 5.0
+    aggregator_total_timeout: float = 15.0
+    # Connection pool of the aggregator client shared by all requests
+    aggregator_max_connections: int = 20
+    aggregator_max_keepalive_connections: int = 10
+    # Retries of failed aggregator requests with jittered exponential backoff (seconds)
+    aggregator_retries: int = 2
+    aggregator_retry_backoff: float = 0.2
+    # Negotiate HTTP/2 with the aggregator if the h2 package is installed
+    aggregator_http2: bool = True
+    # Send automatic persisted queries (SHA-256 hashes instead of query documents) to the aggregator
+    aggregator_persisted_queries: bool = False
 
     database_hostname: str
     database_port: int
     database_username: str
     database_password: str
     database_name: str
+    # Complete SQLAlchemy URLs replacing the PostgreSQL URLs built from the settings above, e.g. for a local fixture
+    database_url: Optional[str] = None
+    async_database_url: Optional[str] = None
+    # Serve the trust endpoints with async handlers on the asyncpg engine instead of the thread pool. Only the reads
+    # of stakeholders and the aggregator requests are async, the evaluation and the writes of model states and trust
+    # scores still run in worker threads (asyncio.to_thread) on the sync engine, so both engines are needed
+    async_mode: bool = False
+
+    # Default `max_age` (seconds) of the GET requests of stakeholders, so their trust is served from the TrustScore
+    # table while it is fresh. With None requests without `max_age` are evaluated without materializing their trust
+    default_max_age: Optional[float] = None
+
+    # Minimal interval (seconds) between two observations of the performance of a capacity by the probabilistic
+    # model, requests within it do not observe the same measurements of the aggregator again
+    observation_interval: float = 60.0
+
+    # Maximal number of stakeholders evaluated for one page of a listing, also the page size without `limit`
+    max_page_size: int = 1000
+
+    # Cache of computed trust, entries expire after the TTL (seconds), 0 disables the cache
+    trust_cache_ttl: float = 30.0
+    trust_cache_max_size: int = 10000
+
+    # Interval (seconds) of the background precomputation of all trust scores, 0 disables it
+    precompute_interval: float = 0.0
+    # Number of stakeholders evaluated per batch and number of batches evaluated concurrently
+    precompute_batch_size: int = 200
+    precompute_concurrency: int = 4
+
+    # Profile requests sending the header `X-Profile: true`, the newest profiles are kept in the directory
+    profiling_enabled: bool = False
+    profiling_dir: str = "profiles"
+    profiling_max_profiles: int = 20
+
+    # Level of the evaluator logs, DEBUG also logs every trust decision
+    log_level: str = "WARNING"
 
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
 
 
-settings = Settings()
+_settings: Optional[Settings] = None
+_settings_lock = threading.Lock()
+
+
+def get_settings() -> Settings:
+    """
+    Return the process wide settings, reading the environment on first use.
+    """
+    global _settings
+    if _settings is not None:
+        return _settings
+    with _settings_lock:
+        if _settings is None:
+            _settings = Settings()
+        return _settings
+
+
+class LazySettings:
+    """
+    Reads attributes from `get_settings()`, so that importing a module does not read the environment
+    as long as its settings are only used at call time.
+    """
+
+    def __getattr__(self, name: str):
+        return getattr(get_settings(), name)
+
+
+settings = LazySettings()
@@ -0,0 +1,174 @@
+"""
+Local stand-in for the GraphQL API of the Trust Metric Aggregator, for load tests without the real service.
+
+It answers the queries in `app/models/*.graphql`, also as aliased batches and automatic persisted
+queries, with stable synthetic values per DID and injects latency, jitter and errors:
+
+    python -m benchmarks.fake_aggregator --port 8999 --latency 0.02 --jitter 0.005 --error-rate 0.01
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+# Top level selections of a query, e.g. `performance(stakeholderDid: $did)` or
+# `s3_performance: performance(stakeholderDid: $did_3)`
+SELECTION = re.compile(r"(?:(\w+)\s*:\s*)?(\w+)\s*\(\s*stakeholderDid\s*:\s*\$(\w+)\s*\)")
+
+PERFORMANCE_FIELDS = ("availability", "reliability", "energyEfficiency", "latency", "throughput", "bandwidth",
+                      "jitter", "packetLoss", "utilizationRate")
+
+
+@dataclass
+class FaultProfile:
+    # Mean and standard deviation of the added latency (seconds)
+    latency: float = 0.0
+    jitter: float = 0.0
+    # Share of requests answered with `error_status` instead of data
+    error_rate: float = 0.0
+    error_status: int = 503
+    seed: Optional[int] = None
+
+
+def field_value(did: str, field: str, noise: random.Random) -> dict:
+    """
+    Synthetic value of a field of a stakeholder, the same for every request except for the performance
+    measurements, which get noise drawn from `noise`.
+    """
+    rng = random.Random(zlib.crc32(f"{did}/{field}".encode()))
+    if field == "performance":
+        # Measurements vary between requests like the ones of a real capacity
+        return {name: min(1.0, max(0.0, rng.gauss(0.8, 0.1) + noise.normalvariate(0, 0.05))) for name in PERFORMANCE_FIELDS}
+    if field == "location":
+        # Inside Slovenia, see validate_location
+        return {"lat": rng.uniform(45.5, 46.8), "lon": rng.uniform(13.5, 16.5)}
+    return {"trust": rng.uniform(0.4, 1.0)}
+
+
+def resolve_query(query: str, variables: dict, noise: random.Random) -> dict:
+    data = {}
+    for alias, field, variable in SELECTION.findall(query):
+        data[alias or field] = field_value(variables.get(variable, ""), field, noise)
+    return data
+
+
+def persisted_query_error(message: str, code: str) -> dict:
+    return {"errors": [{"message": message, "extensions": {"code": code}}]}
+
+
+class FakeAggregator:
+    """
+    Fake aggregator served by a ThreadingHTTPServer. `requests` counts the received GraphQL requests
+    and `received_bytes` the size of their bodies. Automatic persisted queries are only answered
+    with `persisted_queries`.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, faults: FaultProfile = FaultProfile(),
+                 persisted_queries: bool = True):
+        self.faults = faults
+        self.persisted_queries = persisted_queries
+        self.requests = 0
+        self.received_bytes = 0
+        # Documents of automatic persisted queries by SHA-256 hash
+        self._documents: dict[str, str] = {}
+        self._rng = random.Random(faults.seed)
+        # Separate from the fault draws so measurements do not depend on the injected faults
+        self._noise = random.Random(faults.seed)
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def port(self) -> int:
+        return self.server.server_address[1]
+
+    def _handler_class(self):
+        aggregator = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                content = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                with aggregator._lock:
+                    aggregator.received_bytes += len(content)
+                status, body = aggregator.respond(json.loads(content))
+                content = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def respond(self, payload: dict) -> tuple[int, dict]:
+        with self._lock:
+            self.requests += 1
+            delay = max(0.0, self._rng.gauss(self.faults.latency, self.faults.jitter)) if self.faults.latency else 0.0
+            failed = self._rng.random() < self.faults.error_rate
+        if delay:
+            time.sleep(delay)
+        if failed:
+            return self.faults.error_status, {"errors": [{"message": "Injected error"}]}
+
+        query = payload.get("query")
+        persisted_query = (payload.get("extensions") or {}).get("persistedQuery")
+        if persisted_query is not None:
+            if not self.persisted_queries:
+                return 200, persisted_query_error("PersistedQueryNotSupported", "PERSISTED_QUERY_NOT_SUPPORTED")
+            query_hash = persisted_query.get("sha256Hash")
+            if query is None:
+                query = self._documents.get(query_hash)
+                if query is None:
+                    return 200, persisted_query_error("PersistedQueryNotFound", "PERSISTED_QUERY_NOT_FOUND")
+            elif hashlib.sha256(query.encode()).hexdigest() != query_hash:
+                return 400, {"errors": [{"message": "provided sha does not match query"}]}
+            else:
+                self._documents[query_hash] = query
+        return 200, {"data": resolve_query(query or "", payload.get("variables") or {}, self._noise)}
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8999)
+    parser.add_argument("--latency", type=float, default=0.0, help="mean added latency (seconds)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="standard deviation of the latency (seconds)")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--no-persisted-queries", action="store_true", help="reject automatic persisted queries")
+    args = parser.parse_args()
+
+    faults = FaultProfile(args.latency, args.jitter, args.error_rate, args.error_status, args.seed)
+    aggregator = FakeAggregator(args.host, args.port, faults, persisted_queries=not args.no_persisted_queries)
+    print(f"Fake aggregator listening on http://{args.host}:{aggregator.port}/graphql")
+    try:
+        aggregator.server.serve_forever()
+    except KeyboardInterrupt:
+        aggregator.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Cold start benchmark: the import time of the modules of the service, measured with `python -X importtime`
+in a fresh interpreter per run.
+
+Run from the repository root:
+
+    python -m benchmarks.import_time --output imports.json
+    python -m benchmarks.import_time --compare imports.json
+
+Every module is reported with the median of its cumulative import time and the self time of the top
+level packages it pulls in, so a heavy dependency which is imported eagerly again shows up by name.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from benchmarks.trust_engine import git_commit
+
+# Entry points of the service, from the trust engine alone to the whole app
+MODULES = (
+    "app.trust_evaluation.probabilistic",
+    "app.models.stakeholder",
+    "app.trust_evaluation.trust_evaluator",
+    "app.trust_evaluation.evaluation",
+    "app.trust_evaluation.endpoints",
+)
+
+# The app reads its settings when it is built, the benchmark never contacts the aggregator or the database
+ENVIRONMENT = {
+    "TRUST_METRIC_AGGREGATOR_HOST": "localhost",
+    "TRUST_METRIC_AGGREGATOR_PORT": "8000",
+    "DATABASE_HOSTNAME": "localhost",
+    "DATABASE_PORT": "5432",
+    "DATABASE_USERNAME": "benchmark",
+    "DATABASE_PASSWORD": "benchmark",
+    "DATABASE_NAME": "benchmark",
+}
+
+
+def parse_importtime(output: str) -> list[tuple[str, int, int]]:
+    """
+    The `(module, self time, cumulative time)` of every import in the output of `-X importtime`, times in microseconds.
+    """
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_time, cumulative_time, module = line[len("import time:"):].split("|")
+        imports.append((module.strip(), int(self_time), int(cumulative_time)))
+    return imports
+
+
+def measure_import(module: str) -> tuple[int, dict[str, int]]:
+    """
+    Import `module` in a fresh interpreter. Returns its cumulative import time and the self time of every
+    top level package imported with it, in microseconds.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, env={**ENVIRONMENT, **os.environ}
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr}")
+
+    imports = parse_importtime(result.stderr)
+    package_times = defaultdict(int)
+    for imported_module, self_time, _ in imports:
+        package_times[imported_module.split(".")[0]] += self_time
+    return next(cumulative for name, _, cumulative in imports if name == module), dict(package_times)
+
+
+def run_benchmarks(modules: list[str], repeat: int, top: int) -> dict:
+    results = []
+    for module in modules:
+        totals = []
+        package_times = defaultdict(list)
+        for _ in range(repeat):
+            total, packages = measure_import(module)
+            totals.append(total)
+            for package, package_time in packages.items():
+                package_times[package].append(package_time)
+        packages = sorted(
+            ((package, statistics.median(times) / 1e6) for package, times in package_times.items()),
+            key=lambda item: item[1], reverse=True
+        )[:top]
+        result = {
+            "name": module,
+            "repeat": repeat,
+            "min": min(totals) / 1e6,
+            "median": statistics.median(totals) / 1e6,
+            "packages": dict(packages),
+        }
+        results.append(result)
+        heaviest = ", ".join(f"{package} {package_time * 1e3:.0f}" for package, package_time in packages[:5])
+        print(f"{module:<44} {result['median'] * 1e3:>10.1f} ms  ({heaviest})", file=sys.stderr)
+    return {
+        "commit": git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results,
+    }
+
+
+def compare(report: dict, baseline: dict):
+    """
+    Print the ratio of the median import times of `report` to those of `baseline` (above 1 is slower).
+    """
+    baseline_medians = {result["name"]: result["median"] for result in baseline["results"]}
+    print(f"Compared with commit {baseline.get('commit')}", file=sys.stderr)
+    for result in report["results"]:
+        baseline_median = baseline_medians.get(result["name"])
+        if baseline_median:
+            print(f"{result['name']:<44} {result['median'] / baseline_median:>8.2f}x", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modules", nargs="+", default=list(MODULES))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="number of the heaviest packages reported per module")
+    parser.add_argument("--output", help="write the results to this JSON file instead of stdout")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare with")
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.modules, args.repeat, args.top)
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            compare(report, json.load(baseline_file))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+"""
+End-to-end load test of the evaluator app with the fake aggregator and a generated stakeholder fleet.
+
+The fleet is written to a SQLite file (or any database given with `--database-url`, e.g. a local
+PostgreSQL), the app is served with uvicorn and concurrent clients request the stakeholder endpoints
+for `--duration` seconds. Run from the repository root:
+
+    python -m benchmarks.load_test --providers 20 --capacities 50 --concurrency 32 --duration 30 --latency 0.02
+
+Settings of the app (e.g. TRUST_CACHE_TTL=0, ASYNC_MODE=true, AGGREGATOR_PERSISTED_QUERIES=true) are read
+from the environment as usual, e.g. DEFAULT_MAX_AGE=60 serves scores stored within a minute instead of evaluating again.
+ASYNC_MODE needs a PostgreSQL `--database-url`, as there is no async driver for SQLite among the dependencies.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+import httpx
+import numpy as np
+from pydantic import TypeAdapter
+
+from benchmarks.fake_aggregator import FakeAggregator, FaultProfile
+
+
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg"}
+
+
+def async_database_url(database_url: str) -> str:
+    scheme, rest = database_url.split("://", 1)
+    return f"{ASYNC_DRIVERS.get(scheme.split('+')[0], scheme)}://{rest}"
+
+
+def configure_environment(args, aggregator: FakeAggregator):
+    """
+    Point the settings of the app to the fake aggregator and the fixture, they are read on first use.
+    """
+    os.environ["TRUST_METRIC_AGGREGATOR_HOST"] = "127.0.0.1"
+    os.environ["TRUST_METRIC_AGGREGATOR_PORT"] = str(aggregator.port)
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ["ASYNC_DATABASE_URL"] = async_database_url(args.database_url)
+    for variable in ("DATABASE_HOSTNAME", "DATABASE_USERNAME", "DATABASE_PASSWORD", "DATABASE_NAME"):
+        os.environ.setdefault(variable, "load_test")
+    os.environ.setdefault("DATABASE_PORT", "5432")
+
+
+def create_fixture(args) -> dict[str, list[str]]:
+    """
+    Recreate the tables and insert `providers` providers with `capacities` capacities each and `applications`
+    application providers, spread over `owners` owners. Returns the DIDs by endpoint parameter.
+    """
+    from sqlalchemy import insert
+    from sqlmodel import SQLModel, Session
+
+    from app.models.sql_models import Stakeholder
+    from app.trust_evaluation.bulk import new_stakeholder_values
+    from app.utils.database import get_engine
+    from app.utils.helpers import StakeholderType
+
+    random.seed(args.seed)
+    owners = [f"did:load:owner:{index}" for index in range(args.owners)]
+    rows = []
+    for provider_index in range(args.providers):
+        provider_did = f"did:load:provider:{provider_index}"
+        owner = owners[provider_index % len(owners)]
+        rows.append(new_stakeholder_values(provider_did, StakeholderType.RESOURCE_PROVIDER, f"Provider {provider_index}", owner))
+        for capacity_index in range(args.capacities):
+            rows.append(new_stakeholder_values(
+                f"did:load:capacity:{provider_index}:{capacity_index}", StakeholderType.RESOURCE_CAPACITY,
+                f"Capacity {provider_index}/{capacity_index}", owner, provider=provider_did
+            ))
+    for application_index in range(args.applications):
+        rows.append(new_stakeholder_values(
+            f"did:load:application:{application_index}", StakeholderType.APPLICATION_PROVIDER,
+            f"Application {application_index}", owners[application_index % len(owners)]
+        ))
+
+    engine = get_engine()
+    SQLModel.metadata.drop_all(engine)
+    SQLModel.metadata.create_all(engine)
+    if engine.dialect.name == "sqlite":
+        # Readers do not wait for the trust writes of concurrent requests, the mode is stored in the file
+        with engine.connect() as connection:
+            connection.exec_driver_sql("PRAGMA journal_mode=WAL")
+    with Session(engine) as session:
+        session.connection().execute(insert(Stakeholder), rows)
+        session.commit()
+    return {"stakeholder": [row["did"] for row in rows], "owner": owners}
+
+
+def start_server(port: int):
+    import uvicorn
+
+    from app.trust_evaluation.endpoints import create_app
+
+    server = uvicorn.Server(uvicorn.Config(create_app(), host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError("The app did not start.")
+        time.sleep(0.05)
+    return server, thread
+
+
+def request_targets(args) -> list[tuple[str, str, dict, float]]:
+    """
+    Endpoints of the load as (name, path template, query parameters, weight).
+    """
+    return [
+        ("GET /stakeholder/{did}", "/stakeholder/{stakeholder}", {}, args.weight_stakeholder),
+        ("GET /stakeholders/{owner}", "/stakeholders/{owner}", {"limit": args.page_limit}, args.weight_owner),
+        ("GET /all_stakeholders", "/all_stakeholders", {"limit": args.page_limit}, args.weight_all),
+    ]
+
+
+async def drive(args, base_url: str, fixture: dict[str, list[str]]) -> dict[str, list[tuple[float, bool]]]:
+    """
+    Send requests from `concurrency` clients for `duration` seconds after a warmup.
+    Returns the latency and success of every measured request by endpoint.
+    """
+    targets = [target for target in request_targets(args) if target[3] > 0]
+    weights = [target[3] for target in targets]
+    rng = random.Random(args.seed)
+    samples = defaultdict(list)
+    start = time.perf_counter()
+    measure_from = start + args.warmup
+    stop_at = measure_from + args.duration
+
+    async def client_loop(client: httpx.AsyncClient):
+        while (now := time.perf_counter()) < stop_at:
+            name, path, params, _ = rng.choices(targets, weights)[0]
+            url = path.format(stakeholder=rng.choice(fixture["stakeholder"]), owner=rng.choice(fixture["owner"]))
+            request_start = time.perf_counter()
+            try:
+                response = await client.get(url, params=params)
+                ok = response.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            if now >= measure_from:
+                samples[name].append((time.perf_counter() - request_start, ok))
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=args.timeout) as client:
+        await asyncio.gather(*(client_loop(client) for _ in range(args.concurrency)))
+    return samples
+
+
+def summarize(samples: dict[str, list[tuple[float, bool]]], duration: float) -> dict:
+    summary = {}
+    for name, endpoint_samples in sorted(samples.items()):
+        latencies = np.array([latency for latency, _ in endpoint_samples])
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1e3
+        summary[name] = {
+            "requests": len(endpoint_samples),
+            "errors": sum(not ok for _, ok in endpoint_samples),
+            "rps": len(endpoint_samples) / duration,
+            "p50_ms": p50,
+            "p95_ms": p95,
+            "p99_ms": p99,
+        }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    fleet = parser.add_argument_group("fleet")
+    fleet.add_argument("--database-url", help="database of the fixture, a temporary SQLite file by default")
+    fleet.add_argument("--providers", type=int, default=10)
+    fleet.add_argument("--capacities", type=int, default=20, help="capacities per provider")
+    fleet.add_argument("--applications", type=int, default=10)
+    fleet.add_argument("--owners", type=int, default=5)
+    aggregator_faults = parser.add_argument_group("fake aggregator")
+    aggregator_faults.add_argument("--latency", type=float, default=0.01, help="mean latency (seconds)")
+    aggregator_faults.add_argument("--jitter", type=float, default=0.002, help="standard deviation of the latency")
+    aggregator_faults.add_argument("--error-rate", type=float, default=0.0)
+    aggregator_faults.add_argument("--error-status", type=int, default=503)
+    load = parser.add_argument_group("load")
+    load.add_argument("--concurrency", type=int, default=16)
+    load.add_argument("--duration", type=float, default=20.0, help="measured seconds")
+    load.add_argument("--warmup", type=float, default=2.0, help="seconds before measuring")
+    load.add_argument("--timeout", type=float, default=60.0)
+    load.add_argument("--page-limit", type=int, default=50)
+    load.add_argument("--weight-stakeholder", type=float, default=8)
+    load.add_argument("--weight-owner", type=float, default=1)
+    load.add_argument("--weight-all", type=float, default=1)
+    parser.add_argument("--port", type=int, default=8011, help="port of the app")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--output", help="write the results to this JSON file instead of stdout")
+    args = parser.parse_args()
+    if TypeAdapter(bool).validate_python(os.environ.get("ASYNC_MODE", "false")) and (
+        args.database_url is None or args.database_url.startswith("sqlite")
+    ):
+        parser.error("ASYNC_MODE needs a PostgreSQL --database-url")
+
+    aggregator = FakeAggregator(
+        faults=FaultProfile(args.latency, args.jitter, args.error_rate, args.error_status, args.seed)
+    ).start()
+    temporary_directory = None
+    if args.database_url is None:
+        temporary_directory = tempfile.TemporaryDirectory()
+        args.database_url = f"sqlite:///{temporary_directory.name}/load_test.db"
+    configure_environment(args, aggregator)
+
+    fixture = create_fixture(args)
+    print(f"Fleet of {len(fixture['stakeholder'])} stakeholders in {args.database_url}", file=sys.stderr)
+    server, server_thread = start_server(args.port)
+    try:
+        samples = asyncio.run(drive(args, f"http://127.0.0.1:{args.port}", fixture))
+    finally:
+        server.should_exit = True
+        server_thread.join()
+        aggregator.stop()
+        if temporary_directory is not None:
+            temporary_directory.cleanup()
+
+    report = {
+        "fleet": {key: getattr(args, key) for key in ("providers", "capacities", "applications", "owners")},
+        "faults": {key: getattr(args, key) for key in ("latency", "jitter", "error_rate", "error_status")},
+        "concurrency": args.concurrency,
+        "duration": args.duration,
+        "async_mode": os.environ.get("ASYNC_MODE", "false"),
+        "aggregator_persisted_queries": os.environ.get("AGGREGATOR_PERSISTED_QUERIES", "false"),
+        "aggregator_requests": aggregator.requests,
+        "aggregator_received_bytes": aggregator.received_bytes,
+        "endpoints": summarize(samples, args.duration),
+    }
+    for name, endpoint in report["endpoints"].items():
+        print(f"{name:<28} {endpoint['requests']:>7} requests {endpoint['errors']:>5} errors {endpoint['rps']:>9.1f} rps "
+              f"p50 {endpoint['p50_ms']:>8.1f} ms  p95 {endpoint['p95_ms']:>8.1f} ms  p99 {endpoint['p99_ms']:>8.1f} ms",
+              file=sys.stderr)
+    print(f"aggregator: {aggregator.requests} requests, {aggregator.received_bytes} bytes received", file=sys.stderr)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
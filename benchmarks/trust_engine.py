@@ -0,0 +1,346 @@
+"""
+Micro-benchmarks of the hot paths of the trust engine on fixed-seed synthetic data.
+
+Run from the repository root:
+
+    python -m benchmarks.trust_engine --output results.json
+    python -m benchmarks.trust_engine --compare results.json
+
+Results are written as JSON with one entry per benchmark and scale, so runs of different commits
+can be compared with `--compare`.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from app.models.attributes import Performance, TrustCalcModel, RANGES
+from app.models.stakeholder import ResourceProvider, ResourceCapacity, ApplicationProvider
+from app.trust_evaluation.probabilistic import SingleFeatureTrustModel, SingleFeatureTrustModelBank
+from app.trust_evaluation.table import StakeholderTable
+from app.trust_evaluation.trust_evaluator import TrustEvaluator
+from app.utils.helpers import MetricNames, StakeholderType, prob_transform, prob_transform_array
+
+
+SEED = 1234
+DEFAULT_SCALES = (10, 100, 1000)
+# Minimal measured time of one repeat (seconds), the number of calls per repeat is calibrated to it
+MIN_REPEAT_TIME = 0.05
+
+METRIC_NAMES = list(RANGES)
+
+
+def snake_to_camel_case(snake_case_string: str) -> str:
+    first, *others = snake_case_string.split("_")
+    return first + "".join(other.capitalize() for other in others)
+
+
+def synthetic_attributes(rng: np.random.Generator, stakeholder_type: StakeholderType) -> dict:
+    """
+    Aggregator response of one stakeholder, as returned by `Stakeholder.get_new_attributes`.
+    """
+    def trust():
+        return {"trust": float(rng.uniform(0.3, 1.0))}
+
+    if stakeholder_type == StakeholderType.RESOURCE_PROVIDER:
+        return {"compliance": trust(), "historicalBehavior": trust(), "reputation": trust(), "directTrust": trust()}
+    if stakeholder_type == StakeholderType.RESOURCE_CAPACITY:
+        return {
+            "performance": {snake_to_camel_case(name): float(rng.uniform(0, 1)) for name in METRIC_NAMES},
+            "location": {"lat": float(rng.uniform(45.5, 46.8)), "lon": float(rng.uniform(13.5, 16.5))},
+            "historicalBehavior": trust(),
+            "contextualFit": trust(),
+            "thirdPartyValidation": trust(),
+            "reputation": trust(),
+            "directTrust": trust(),
+        }
+    return {
+        "location": {"lat": float(rng.uniform(45.5, 46.8)), "lon": float(rng.uniform(13.5, 16.5))},
+        "compliance": trust(),
+        "reputation": trust(),
+        "directTrust": trust(),
+    }
+
+
+def new_stakeholder(stakeholder_type: StakeholderType, index: int, provider: ResourceProvider):
+    if stakeholder_type == StakeholderType.RESOURCE_PROVIDER:
+        return ResourceProvider(name=f"Provider_{index}", did_raw=f"did:bench:provider:{index}")
+    if stakeholder_type == StakeholderType.RESOURCE_CAPACITY:
+        return ResourceCapacity(name=f"Capacity_{index}", did_raw=f"did:bench:capacity:{index}", provider=provider)
+    return ApplicationProvider(name=f"AppProvider_{index}", did_raw=f"did:bench:app:{index}")
+
+
+def new_performance(rng: np.random.Generator, measurements: int) -> Performance:
+    return Performance(
+        StakeholderType.RESOURCE_CAPACITY,
+        {name: list(rng.uniform(0, 1, measurements)) for name in METRIC_NAMES}
+    )
+
+
+# Every benchmark maps a scale to (setup, run): `setup()` builds fresh inputs outside of the timing
+# and `run(inputs)` is the measured call.
+
+def bench_prob_transform(scale):
+    values = np.random.default_rng(SEED).uniform(-0.5, 1.5, scale)
+
+    def run(_):
+        for value in values:
+            prob_transform(0, 1, 1, value)
+    return (lambda: None), run
+
+
+def bench_prob_transform_array(scale):
+    values = np.random.default_rng(SEED).uniform(-0.5, 1.5, scale)
+    return (lambda: None), (lambda _: prob_transform_array(0, 1, 1, values))
+
+
+def bench_observe(scale):
+    observations = np.random.default_rng(SEED).beta(8, 2, scale * 10)
+
+    def run(model):
+        for observation in observations:
+            model.observe(observation)
+    return (lambda: SingleFeatureTrustModel(name=MetricNames.AVAILABILITY)), run
+
+
+def bench_observe_bank(scale):
+    # `scale` stakeholders with all metrics observing 10 measurements
+    observations = np.random.default_rng(SEED).beta(8, 2, (10, scale, len(METRIC_NAMES)))
+
+    def run(bank):
+        for step in observations:
+            bank.observe(step)
+    return (lambda: SingleFeatureTrustModelBank(scale, METRIC_NAMES)), run
+
+
+def bench_compute_performance(model):
+    def bench(scale):
+        rng = np.random.default_rng(SEED)
+        # `scale` measurements of every metric
+        return (lambda: new_performance(rng, scale)), (lambda performance: performance.compute_performance(model))
+    return bench
+
+
+def bench_compute_trust(stakeholder_type, model):
+    def bench(scale):
+        rng = np.random.default_rng(SEED)
+        evaluator = TrustEvaluator(model=model)
+        provider = ResourceProvider(name="Provider", did_raw="did:bench:provider")
+        evaluator.trusted_stakeholders.add(provider)
+
+        def setup():
+            return [
+                (new_stakeholder(stakeholder_type, index, provider), synthetic_attributes(rng, stakeholder_type))
+                for index in range(scale)
+            ]
+
+        def run(stakeholders):
+            for stakeholder, trust_attributes in stakeholders:
+                evaluator.compute_trust(stakeholder, trust_attributes)
+        return setup, run
+    return bench
+
+
+def bench_compute_trust_batch(stakeholder_type, model):
+    def bench(scale):
+        rng = np.random.default_rng(SEED)
+        evaluator = TrustEvaluator(model=model)
+        provider = ResourceProvider(name="Provider", did_raw="did:bench:provider")
+        evaluator.trusted_stakeholders.add(provider)
+
+        def setup():
+            stakeholders = [new_stakeholder(stakeholder_type, index, provider) for index in range(scale)]
+            trust_attributes = {
+                stakeholder.did.raw: synthetic_attributes(rng, stakeholder_type) for stakeholder in stakeholders
+            }
+            return stakeholders, trust_attributes
+        return setup, (lambda inputs: evaluator.compute_trust_batch(*inputs))
+    return bench
+
+
+def bench_compute_trust_table(stakeholder_type, model):
+    def bench(scale):
+        rng = np.random.default_rng(SEED)
+        evaluator = TrustEvaluator(model=model)
+        evaluator.trusted_stakeholders.add_raw("did:bench:provider", "Provider")
+        # Row 0 is the provider of the capacities
+        stakeholders = [new_stakeholder(stakeholder_type, index, None) for index in range(scale)]
+        dids = ["did:bench:provider"] + [stakeholder.did.raw for stakeholder in stakeholders]
+        rows = np.arange(1, scale + 1)
+
+        def setup():
+            table = StakeholderTable(
+                dids, ["Provider"] + [stakeholder.name for stakeholder in stakeholders],
+                [StakeholderType.RESOURCE_PROVIDER] + [stakeholder_type] * scale, [-1] + [0] * scale
+            )
+            trust_attributes = {did: synthetic_attributes(rng, stakeholder_type) for did in dids[1:]}
+            return table, trust_attributes
+
+        def run(inputs):
+            table, trust_attributes = inputs
+            table.update_attributes(rows, trust_attributes)
+            evaluator.compute_trust_table(table, rows)
+        return setup, run
+    return bench
+
+
+def bench_update_attributes(stakeholder_type):
+    def bench(scale):
+        rng = np.random.default_rng(SEED)
+        provider = ResourceProvider(name="Provider", did_raw="did:bench:provider")
+
+        def setup():
+            return [
+                (new_stakeholder(stakeholder_type, index, provider), synthetic_attributes(rng, stakeholder_type))
+                for index in range(scale)
+            ]
+
+        def run(stakeholders):
+            for stakeholder, trust_attributes in stakeholders:
+                stakeholder.update_attributes(trust_attributes)
+        return setup, run
+    return bench
+
+
+STAKEHOLDER_TYPES = {
+    "resource_provider": StakeholderType.RESOURCE_PROVIDER,
+    "resource_capacity": StakeholderType.RESOURCE_CAPACITY,
+    "application_provider": StakeholderType.APPLICATION_PROVIDER,
+}
+MODELS = {"deterministic": TrustCalcModel.DETERMINISTIC, "probabilistic": TrustCalcModel.PROBABILISTIC}
+
+# Name and description of the unit of `scale` by benchmark
+BENCHMARKS = {
+    "prob_transform": (bench_prob_transform, "values"),
+    "prob_transform_array": (bench_prob_transform_array, "values"),
+    "observe": (bench_observe, "observations / 10"),
+    "observe_bank": (bench_observe_bank, "stakeholders"),
+    **{
+        f"compute_performance.{model_name}": (bench_compute_performance(model), "measurements per metric")
+        for model_name, model in MODELS.items()
+    },
+    **{
+        f"compute_trust.{type_name}.{model_name}": (bench_compute_trust(stakeholder_type, model), "stakeholders")
+        for type_name, stakeholder_type in STAKEHOLDER_TYPES.items() for model_name, model in MODELS.items()
+    },
+    **{
+        f"compute_trust_batch.{type_name}.{model_name}": (bench_compute_trust_batch(stakeholder_type, model),
+                                                          "stakeholders")
+        for type_name, stakeholder_type in STAKEHOLDER_TYPES.items() for model_name, model in MODELS.items()
+    },
+    **{
+        f"compute_trust_table.{type_name}.{model_name}": (bench_compute_trust_table(stakeholder_type, model),
+                                                          "stakeholders")
+        for type_name, stakeholder_type in STAKEHOLDER_TYPES.items() for model_name, model in MODELS.items()
+    },
+    **{
+        f"update_attributes.{type_name}": (bench_update_attributes(stakeholder_type), "stakeholders")
+        for type_name, stakeholder_type in STAKEHOLDER_TYPES.items()
+    },
+}
+
+
+def measure(setup, run, repeat: int) -> dict:
+    """
+    Time `run` on fresh inputs of `setup`. The number of calls per repeat is calibrated so that a repeat
+    takes at least MIN_REPEAT_TIME. Returns statistics of the time of a single call in seconds.
+    """
+    def timed_calls(number):
+        elapsed = 0.0
+        for _ in range(number):
+            inputs = setup()
+            start = time.perf_counter()
+            run(inputs)
+            elapsed += time.perf_counter() - start
+        return elapsed
+
+    number = 1
+    while (elapsed := timed_calls(number)) < MIN_REPEAT_TIME and number < 10 ** 6:
+        number = max(number * 2, int(number * MIN_REPEAT_TIME / max(elapsed, 1e-9)))
+
+    times = [timed_calls(number) / number for _ in range(repeat)]
+    return {
+        "number": number,
+        "repeat": repeat,
+        "min": min(times),
+        "median": statistics.median(times),
+        "mean": statistics.fmean(times),
+        "stdev": statistics.stdev(times) if repeat > 1 else 0.0,
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(names: list[str], scales: list[int], repeat: int) -> dict:
+    results = []
+    for name in names:
+        bench, unit = BENCHMARKS[name]
+        for scale in scales:
+            setup, run = bench(scale)
+            result = {"name": name, "scale": scale, "unit": unit, **measure(setup, run, repeat)}
+            results.append(result)
+            print(f"{name:<56} {scale:>7} {result['median'] * 1e3:>12.4f} ms", file=sys.stderr)
+    return {
+        "commit": git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "seed": SEED,
+        "results": results,
+    }
+
+
+def compare(report: dict, baseline: dict):
+    """
+    Print the ratio of the median times of `report` to those of `baseline` (above 1 is slower).
+    """
+    baseline_medians = {(result["name"], result["scale"]): result["median"] for result in baseline["results"]}
+    print(f"Compared with commit {baseline.get('commit')}", file=sys.stderr)
+    for result in report["results"]:
+        baseline_median = baseline_medians.get((result["name"], result["scale"]))
+        if baseline_median:
+            print(f"{result['name']:<56} {result['scale']:>7} {result['median'] / baseline_median:>8.2f}x",
+                  file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", type=int, nargs="+", default=list(DEFAULT_SCALES))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--filter", default="", help="only run benchmarks whose name contains this string")
+    parser.add_argument("--output", help="write the results to this JSON file instead of stdout")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare with")
+    args = parser.parse_args()
+
+    names = [name for name in BENCHMARKS if args.filter in name]
+    report = run_benchmarks(names, args.scales, args.repeat)
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            compare(report, json.load(baseline_file))
+
+
+if __name__ == "__main__":
+    main()
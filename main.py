@@ -4,7 +4,7 @@ import uvicorn
 from app.models.stakeholder import ResourceProvider, ResourceCapacity, ApplicationProvider, MetricNames
 from app.trust_evaluation.trust_evaluator import TrustEvaluator
 from app.models.attributes import TrustCalcModel
-from app.trust_evaluation.endpoints import evaluator_app
+from app.trust_evaluation.endpoints import create_app
 
 
 def main():
@@ -68,5 +68,5 @@ def main():
     
 if __name__ == "__main__":
     #main()
-    uvicorn.run(evaluator_app, host="0.0.0.0", port=8001)
+    uvicorn.run(create_app(), host="0.0.0.0", port=8001)
 
@@ -0,0 +1,77 @@
+import json
+import os
+import random
+
+import httpx
+import pytest
+
+# Settings required by the app, the tests never contact the aggregator or these databases
+for name, value in {
+    "TRUST_METRIC_AGGREGATOR_HOST": "localhost",
+    "TRUST_METRIC_AGGREGATOR_PORT": "8000",
+    "DATABASE_HOSTNAME": "localhost",
+    "DATABASE_PORT": "5432",
+    "DATABASE_USERNAME": "test",
+    "DATABASE_PASSWORD": "test",
+    "DATABASE_NAME": "test",
+}.items():
+    os.environ.setdefault(name, value)
+
+from app.utils import aggregator_client
+from benchmarks.fake_aggregator import resolve_query
+
+
+class MockAggregator:
+    """
+    Answers the GraphQL requests of the app with the synthetic values of the fake aggregator of the benchmarks,
+    or with `status` instead of data while it is set. `requests` holds the payloads of all requests.
+    """
+
+    def __init__(self):
+        self.requests = []
+        self.status = None
+        self._noise = random.Random(0)
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        payload = json.loads(request.content)
+        self.requests.append(payload)
+        if self.status is not None:
+            return httpx.Response(self.status, json={"errors": [{"message": "Injected error"}]})
+        return httpx.Response(
+            200, json={"data": resolve_query(payload.get("query") or "", payload.get("variables") or {}, self._noise)}
+        )
+
+    def client(self) -> aggregator_client.AggregatorClient:
+        """A new aggregator client sending its requests to this aggregator."""
+        return mock_aggregator_client(self.handle)
+
+
+def mock_aggregator_client(handler, **kwargs) -> aggregator_client.AggregatorClient:
+    options = dict(timeout=1.0, total_timeout=5.0, max_connections=10, max_keepalive_connections=10, retries=0,
+                   retry_backoff=0.0, http2=False)
+    return aggregator_client.AggregatorClient(
+        "http://aggregator", transport=httpx.MockTransport(handler), **{**options, **kwargs}
+    )
+
+
+@pytest.fixture
+def aggregator(monkeypatch):
+    """The MockAggregator behind the aggregator client of the app."""
+    mock_aggregator = MockAggregator()
+    monkeypatch.setattr(aggregator_client, "_aggregator_client", mock_aggregator.client())
+    yield mock_aggregator
+    aggregator_client.close_aggregator_client()
+
+
+@pytest.fixture
+def make_aggregator_client():
+    """Builds aggregator clients with `mock_aggregator_client` and closes them after the test."""
+    clients = []
+
+    def make(handler, **kwargs) -> aggregator_client.AggregatorClient:
+        clients.append(mock_aggregator_client(handler, **kwargs))
+        return clients[-1]
+
+    yield make
+    for client in clients:
+        client.close()
@@ -0,0 +1,87 @@
+import asyncio
+import hashlib
+import json
+import time
+
+import httpx
+
+QUERY = "query ($did: String!) { reputation(stakeholderDid: $did) { trust } }"
+DATA = {"reputation": {"trust": 0.5}}
+QUERY_HASH = hashlib.sha256(QUERY.encode()).hexdigest()
+
+
+class ScriptedAggregator:
+    """Answers the requests of a client with the given responses or errors in turn, then with `DATA`."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        response = self.responses.pop(0) if self.responses else httpx.Response(200, json={"data": DATA})
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+def test_unavailable_aggregator_is_retried(make_aggregator_client):
+    aggregator = ScriptedAggregator(httpx.Response(503), httpx.ConnectError("Connection refused"))
+    client = make_aggregator_client(aggregator.handle, retries=2)
+    assert client.query_sync(QUERY, {"did": "did:a0"}) == DATA
+    assert len(aggregator.requests) == 3
+
+
+def test_retries_give_up_after_the_last_attempt(make_aggregator_client):
+    aggregator = ScriptedAggregator(*[httpx.Response(503)] * 3)
+    client = make_aggregator_client(aggregator.handle, retries=1)
+    assert client.query_sync(QUERY, {"did": "did:a0"}) is None
+    assert len(aggregator.requests) == 2
+
+
+def test_bad_requests_are_not_retried(make_aggregator_client):
+    aggregator = ScriptedAggregator(httpx.Response(400, json={"errors": [{"message": "Syntax error"}]}))
+    client = make_aggregator_client(aggregator.handle, retries=2)
+    assert client.query_sync(QUERY, {"did": "did:a0"}) is None
+    assert len(aggregator.requests) == 1
+
+
+def test_total_timeout_covers_slow_requests(make_aggregator_client):
+    async def handle(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(10)
+        return httpx.Response(200, json={"data": DATA})
+
+    client = make_aggregator_client(handle, total_timeout=0.2)
+    start = time.monotonic()
+    assert client.query_sync(QUERY, {"did": "did:a0"}) is None
+    assert time.monotonic() - start < 2
+
+
+def persisted_query_error(status_code: int, message: str) -> httpx.Response:
+    return httpx.Response(status_code, json={"errors": [{"message": message}]})
+
+
+def test_unknown_persisted_queries_are_sent_with_their_document(make_aggregator_client):
+    aggregator = ScriptedAggregator(persisted_query_error(200, "PersistedQueryNotFound"))
+    client = make_aggregator_client(aggregator.handle, persisted_queries=True)
+    assert client.query_sync(QUERY, {"did": "did:a0"}, QUERY_HASH) == DATA
+
+    hash_payload, document_payload = [json.loads(request.content) for request in aggregator.requests]
+    assert "query" not in hash_payload
+    assert hash_payload["extensions"]["persistedQuery"]["sha256Hash"] == QUERY_HASH
+    assert document_payload["query"] == QUERY
+    assert document_payload["extensions"] == hash_payload["extensions"]
+    assert client.persisted_queries
+
+
+def test_persisted_queries_are_turned_off_when_not_supported(make_aggregator_client):
+    aggregator = ScriptedAggregator(persisted_query_error(400, "PersistedQueryNotSupported"))
+    client = make_aggregator_client(aggregator.handle, persisted_queries=True)
+    assert client.query_sync(QUERY, {"did": "did:a0"}, QUERY_HASH) == DATA
+    assert not client.persisted_queries
+
+    assert client.query_sync(QUERY, {"did": "did:a1"}, QUERY_HASH) == DATA
+    payloads = [json.loads(request.content) for request in aggregator.requests]
+    assert [("query" in payload, "extensions" in payload) for payload in payloads] == [
+        (False, True), (True, False), (True, False)
+    ]
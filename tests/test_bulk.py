@@ -0,0 +1,78 @@
+from datetime import datetime
+
+import pytest
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from app.models.schemas import StakeholderCreate
+from app.models.sql_models import Stakeholder, TrustModelState, TrustScore
+from app.trust_evaluation import bulk
+from app.utils.helpers import StakeholderType
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'bulk.db'}")
+    SQLModel.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+def test_stakeholders_registered_concurrently_are_reported(engine, monkeypatch):
+    new_stakeholder_values = bulk.new_stakeholder_values
+
+    def register_concurrently(stakeholder_did, *args):
+        # Another request registers did:p1 after it was checked
+        if stakeholder_did == "did:p1":
+            with Session(engine) as session:
+                session.add(Stakeholder(did="did:p1", type=StakeholderType.RESOURCE_PROVIDER, name="other",
+                                        owner="o", identity="vc", created_at=datetime.now()))
+                session.commit()
+        return new_stakeholder_values(stakeholder_did, *args)
+
+    monkeypatch.setattr(bulk, "new_stakeholder_values", register_concurrently)
+    stakeholders = [
+        (index, StakeholderCreate(did=did, stakeholder_type=StakeholderType.RESOURCE_PROVIDER, name=did, owner="o"))
+        for index, did in enumerate(["did:p0", "did:p1", "did:p2"])
+    ]
+    errors = []
+    with Session(engine) as session:
+        inserted_dids = bulk.insert_stakeholders(session, stakeholders, errors)
+
+    assert inserted_dids == ["did:p0", "did:p2"]
+    assert [(error.index, error.did) for error in errors] == [(1, "did:p1")]
+    with Session(engine) as session:
+        assert session.exec(select(Stakeholder.name).where(Stakeholder.did == "did:p1")).one() == "other"
+
+
+def test_deleting_providers_cascades_to_their_capacities(engine):
+    stakeholders = [
+        ("did:p0", StakeholderType.RESOURCE_PROVIDER, None),
+        ("did:c0", StakeholderType.RESOURCE_CAPACITY, "did:p0"),
+        ("did:c1", StakeholderType.RESOURCE_CAPACITY, "did:p0"),
+        ("did:p1", StakeholderType.RESOURCE_PROVIDER, None),
+        ("did:c2", StakeholderType.RESOURCE_CAPACITY, "did:p1"),
+        ("did:a0", StakeholderType.APPLICATION_PROVIDER, None),
+    ]
+    with Session(engine) as session:
+        for did, stakeholder_type, provider in stakeholders:
+            session.add(Stakeholder(**bulk.new_stakeholder_values(did, stakeholder_type, did, "o", provider=provider)))
+        for did in ("did:c0", "did:c1", "did:c2"):
+            session.add_all(
+                TrustModelState(did=did, metric=metric, alpha=1.0, beta=1.0, n_eff=2.0, updated_at=datetime.now())
+                for metric in ("availability", "latency")
+            )
+        session.add_all(
+            TrustScore(did=did, probabilistic_trust=50, deterministic_trust=50, computed_at=datetime.now())
+            for did, _, _ in stakeholders
+        )
+        session.commit()
+
+    with Session(engine) as session:
+        deleted = bulk.delete_stakeholders(session, ["did:p0", "did:c0", "did:a0", "did:x0", "did:p0"])
+
+    assert deleted == {"not_found": ["did:x0"], "stakeholders": 3, "resources": 1, "trust_model_states": 4,
+                       "trust_scores": 4}
+    with Session(engine) as session:
+        assert session.exec(select(Stakeholder.did).order_by(Stakeholder.did)).all() == ["did:c2", "did:p1"]
+        assert set(session.exec(select(TrustModelState.did)).all()) == {"did:c2"}
+        assert session.exec(select(TrustScore.did).order_by(TrustScore.did)).all() == ["did:c2", "did:p1"]
@@ -0,0 +1,42 @@
+import time
+
+from app.utils.cache import TrustResultCache
+
+
+def test_invalidating_a_provider_invalidates_its_capacities():
+    cache = TrustResultCache(max_size=10, ttl=60)
+    cache.put("did:p0", "model", 1)
+    cache.put("did:c0", "model", 2, provider_did="did:p0")
+    cache.put("did:c0", "other model", 3, provider_did="did:p0")
+    cache.put("did:c1", "model", 4, provider_did="did:p1")
+
+    assert cache.invalidate("did:p0") == 3
+    assert cache.get("did:c0", "model") is None
+    assert cache.get("did:c1", "model") == 4
+    assert cache.stats()["size"] == 1
+
+
+def test_provider_links_are_pruned_with_their_entries():
+    cache = TrustResultCache(max_size=2, ttl=60)
+    cache.put("did:c0", "model", 1, provider_did="did:p0")
+    cache.put("did:c1", "model", 2, provider_did="did:p0")
+    cache.put("did:c2", "model", 3, provider_did="did:p1")
+    # did:c0 was evicted
+    assert cache._dependents == {"did:p0": {"did:c1"}, "did:p1": {"did:c2"}}
+
+    cache.ttl = 0.01
+    cache.put("did:c1", "model", 2, provider_did="did:p0")
+    time.sleep(0.02)
+    assert cache.get("did:c1", "model") is None
+    assert cache._dependents == {"did:p1": {"did:c2"}}
+    assert set(cache._keys) == {"did:c2"}
+
+
+def test_entries_older_than_max_age_are_not_returned():
+    cache = TrustResultCache(max_size=10, ttl=60)
+    cache.put("did:p0", "model", 1)
+
+    assert cache.get("did:p0", "model", max_age=0) is None
+    assert cache.get("did:p0", "model", max_age=60) == 1
+    # The entry is only too old for this request
+    assert cache.get("did:p0", "model") == 1
@@ -0,0 +1,186 @@
+import json
+import random
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, create_engine, select
+
+from app.models.sql_models import Stakeholder, TrustScore
+from app.trust_evaluation.bulk import new_stakeholder_values
+from app.trust_evaluation.endpoints import create_app
+from app.trust_evaluation.evaluation import get_trust_result_cache
+from app.utils import aggregator_client, database
+from app.utils.helpers import StakeholderType
+from app.utils.settings import get_settings
+
+STAKEHOLDERS = [
+    {"did": "did:p0", "stakeholder_type": StakeholderType.RESOURCE_PROVIDER, "name": "P0", "owner": "did:o0"},
+    {"did": "did:c0", "stakeholder_type": StakeholderType.RESOURCE_CAPACITY, "name": "C0", "owner": "did:o0",
+     "provider": "did:p0"},
+    {"did": "did:c1", "stakeholder_type": StakeholderType.RESOURCE_CAPACITY, "name": "C1", "owner": "did:o0",
+     "provider": "did:p0"},
+    {"did": "did:a0", "stakeholder_type": StakeholderType.APPLICATION_PROVIDER, "name": "A0", "owner": "did:o1"},
+]
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    # The app creates its tables on this engine in its lifespan
+    monkeypatch.setattr(database, "_engine", engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def client(engine, aggregator):
+    with TestClient(create_app()) as client:
+        assert client.post("/stakeholders", json=STAKEHOLDERS).json()["inserted"] == len(STAKEHOLDERS)
+        yield client
+    get_trust_result_cache().clear()
+
+
+def test_max_age_skips_older_cached_responses(client, aggregator):
+    stakeholder_response = client.get("/stakeholder/did:c0").json()
+    n_requests = len(aggregator.requests)
+    assert client.get("/stakeholder/did:c0").json() == stakeholder_response
+    assert len(aggregator.requests) == n_requests
+
+    response = client.get("/stakeholder/did:c0", params={"max_age": 0})
+    assert response.status_code == 200
+    assert len(aggregator.requests) > n_requests
+
+
+def test_registering_a_did_deletes_its_stored_trust(client, engine):
+    with Session(engine) as session:
+        session.add_all([
+            TrustScore(did=did, probabilistic_trust=0, deterministic_trust=0, computed_at=datetime.now())
+            for did in ("did:a1", "did:a2")
+        ])
+        session.commit()
+
+    client.post("/stakeholder/did:a1", params={"stakeholder_type": StakeholderType.APPLICATION_PROVIDER,
+                                               "name": "A1", "owner": "did:o1"})
+    client.post("/stakeholders", json=[{"did": "did:a2", "stakeholder_type": StakeholderType.APPLICATION_PROVIDER,
+                                        "name": "A2", "owner": "did:o1"}])
+
+    with Session(engine) as session:
+        assert session.exec(select(TrustScore)).all() == []
+
+
+def test_only_requests_with_max_age_store_trust(client, engine):
+    client.get("/all_stakeholders")
+    with Session(engine) as session:
+        assert session.exec(select(TrustScore)).all() == []
+
+    client.get("/all_stakeholders", params={"max_age": 60})
+    with Session(engine) as session:
+        assert len(session.exec(select(TrustScore)).all()) == len(STAKEHOLDERS)
+
+
+def test_failed_aggregator_requests_give_default_trust(client, aggregator):
+    aggregator.status = 503
+
+    response = client.get("/all_stakeholders")
+    assert response.status_code == 200
+    assert [stakeholder["did"] for stakeholder in response.json()["stakeholders"]] == sorted(
+        stakeholder["did"] for stakeholder in STAKEHOLDERS
+    )
+    response = client.post("/stakeholders", params={"evaluate": True}, json=[
+        {"did": "did:c2", "stakeholder_type": StakeholderType.RESOURCE_CAPACITY, "name": "C2", "owner": "did:o0",
+         "provider": "did:p0"}
+    ])
+    assert response.status_code == 200
+    assert len(response.json()["stakeholders"]) == 1
+
+
+def test_capacities_without_a_provider_are_not_found(client, engine):
+    with Session(engine) as session:
+        session.add(Stakeholder(**new_stakeholder_values("did:c9", StakeholderType.RESOURCE_CAPACITY, "C9", "did:o0")))
+        session.commit()
+
+    response = client.get("/stakeholder/did:c9")
+    assert response.status_code == 404
+    assert response.json() == {"detail": "No provider of stakeholder did:c9."}
+
+
+
+
+def list_dids(client: TestClient, path: str = "/all_stakeholders", **params) -> tuple[list[str], str]:
+    response = client.get(path, params=params).json()
+    return [stakeholder["did"] for stakeholder in response["stakeholders"]], response["next_cursor"]
+
+
+def test_listings_are_paginated_by_did(client):
+    assert list_dids(client, limit=3) == (["did:a0", "did:c0", "did:c1"], "did:c1")
+    assert list_dids(client, limit=3, after="did:c1") == (["did:p0"], None)
+    # A page which ends with the last stakeholder has no next page
+    assert list_dids(client, limit=4) == (["did:a0", "did:c0", "did:c1", "did:p0"], None)
+    assert list_dids(client, "/stakeholders/did:o0", limit=2, after="did:c0") == (["did:c1", "did:p0"], None)
+
+
+def test_page_size_is_capped(client, monkeypatch):
+    monkeypatch.setattr(get_settings(), "max_page_size", 2)
+    assert list_dids(client) == (["did:a0", "did:c0"], "did:c0")
+    assert client.get("/all_stakeholders", params={"limit": 2}).status_code == 200
+    assert client.get("/all_stakeholders", params={"limit": 3}).status_code == 422
+    assert client.get("/all_stakeholders", params={"limit": 0}).status_code == 422
+
+
+def test_listings_are_streamed_as_ndjson(client):
+    stakeholders = client.get("/all_stakeholders").json()["stakeholders"]
+
+    response = client.get("/all_stakeholders", params={"stream": True, "limit": 3})
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert response.headers["x-next-cursor"] == "did:c1"
+    assert [json.loads(line) for line in response.iter_lines()] == stakeholders[:3]
+
+    response = client.get("/all_stakeholders", params={"after": "did:c1"}, headers={"Accept": "application/x-ndjson"})
+    assert "x-next-cursor" not in response.headers
+    assert [json.loads(line) for line in response.iter_lines()] == stakeholders[3:]
+
+
+class NoNoise(random.Random):
+    """Measurements of the fake aggregator without noise, so they do not depend on the order of requests."""
+
+    def normalvariate(self, mu=0.0, sigma=1.0):
+        return mu
+
+
+def get_trust_responses(client: TestClient) -> list[dict]:
+    """Stakeholders returned by the GET endpoints of stakeholders, without their creation times."""
+    stakeholder_responses = [
+        client.get("/stakeholder/did:c0").json(),
+        client.get("/stakeholder/did:a0", params={"max_age": 60}).json(),
+        *client.get("/all_stakeholders").json()["stakeholders"],
+        *client.get("/all_stakeholders", params={"limit": 2, "after": "did:a0"}).json()["stakeholders"],
+        *client.get("/stakeholders/did:o0", params={"max_age": 60}).json()["stakeholders"],
+        *map(json.loads, client.get("/all_stakeholders", params={"stream": True}).iter_lines()),
+    ]
+    for stakeholder_response in stakeholder_responses:
+        del stakeholder_response["created_at"]
+    return stakeholder_responses
+
+
+def test_async_router_responds_like_the_sync_router(tmp_path, monkeypatch, aggregator):
+    pytest.importorskip("aiosqlite")
+    monkeypatch.setattr(aggregator, "_noise", NoNoise())
+
+    trust_responses = {}
+    for async_mode in (False, True):
+        database_path = tmp_path / f"async_{async_mode}.db"
+        monkeypatch.setattr(database, "_engine", create_engine(f"sqlite:///{database_path}"))
+        monkeypatch.setattr(database, "_async_engine", create_async_engine(f"sqlite+aiosqlite:///{database_path}"))
+        monkeypatch.setattr(get_settings(), "async_mode", async_mode)
+        # The lifespan of the previous app closed its aggregator client
+        monkeypatch.setattr(aggregator_client, "_aggregator_client", aggregator.client())
+        with TestClient(create_app()) as client:
+            client.post("/stakeholders", json=STAKEHOLDERS)
+            trust_responses[async_mode] = get_trust_responses(client)
+        get_trust_result_cache().clear()
+
+    assert len(trust_responses[False]) == 15
+    assert trust_responses[True] == trust_responses[False]
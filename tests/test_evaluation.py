@@ -0,0 +1,53 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from app.models.sql_models import Stakeholder, TrustScore
+from app.trust_evaluation.evaluation import get_trust_result_cache, iter_stakeholder_responses
+from app.trust_evaluation.table import METRIC_FIELD_COLUMNS
+from app.utils.helpers import StakeholderType
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    SQLModel.metadata.create_all(engine)
+    yield engine
+    get_trust_result_cache().clear()
+    engine.dispose()
+
+
+def stakeholder_rows():
+    provider = Stakeholder(did="did:p0", type=StakeholderType.RESOURCE_PROVIDER, name="P0", owner="o",
+                           created_at=datetime(2024, 1, 1))
+    capacity = Stakeholder(did="did:c0", type=StakeholderType.RESOURCE_CAPACITY, name="C0", owner="o",
+                           provider=provider.did, created_at=datetime(2024, 1, 1))
+    return [(provider, None), (capacity, provider)]
+
+
+TRUST_ATTRIBUTES = {
+    "did:p0": {},
+    "did:c0": {"performance": {field: 0.5 for field in METRIC_FIELD_COLUMNS}},
+}
+
+
+def evaluate(engine, **kwargs):
+    return list(iter_stakeholder_responses(stakeholder_rows(), engine, **kwargs))
+
+
+def trust_scores(engine):
+    with Session(engine) as session:
+        return session.exec(select(TrustScore)).all()
+
+
+def test_responses_without_max_age_are_not_materialized(engine):
+    evaluate(engine, trust_attributes=TRUST_ATTRIBUTES)
+    assert trust_scores(engine) == []
+
+
+def test_stale_scores_are_materialized_and_served(engine):
+    stakeholder_responses = evaluate(engine, max_age=0, trust_attributes=TRUST_ATTRIBUTES)
+    assert {trust_score.did for trust_score in trust_scores(engine)} == {"did:p0", "did:c0"}
+    assert evaluate(engine, max_age=3600) == stakeholder_responses
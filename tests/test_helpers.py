@@ -0,0 +1,94 @@
+import random
+import re
+
+import numpy as np
+import pytest
+
+from app.models.graphql_queries import GraphQLQueryFPath, query_registry
+from app.models.stakeholder import _chunk_query_targets, get_new_attributes_batch
+from app.utils.helpers import _alias_top_level_fields, build_batched_graphql_query, build_batched_graphql_variables, \
+    prob_transform, prob_transform_array, split_batched_graphql_data
+from benchmarks.fake_aggregator import resolve_query
+
+QUERY = """
+fragment TrustFields on Trust {
+    trust
+}
+
+query ($did: String!, $limit: Int) {
+    first(stakeholderDid: $did) {
+        ...TrustFields
+    }
+    # Fields with underscores keep their name when the data is split
+    second_field(stakeholderDid: $did, limit: $limit) {
+        nested(limit: $limit) { value }
+    }
+}
+"""
+
+
+def test_only_top_level_fields_are_aliased():
+    assert _alias_top_level_fields(" first(x: $d) { b ...F } ...G other { c }", "s1_") == (
+        " s1_first: first(x: $d) { b ...F } ...G s1_other: other { c }"
+    )
+
+
+def test_batched_query_aliases_every_copy():
+    batch_size = 12
+    batched_query = build_batched_graphql_query(QUERY, batch_size)
+
+    assert batched_query.count("fragment TrustFields") == 1
+    variable_definitions = re.search(r"query \((.*?)\) \{", batched_query).group(1)
+    assert variable_definitions == ", ".join(f"$did_{i}: String!, $limit_{i}: Int" for i in range(batch_size))
+    assert re.findall(r"(\w+): (\w+)\(stakeholderDid: \$(\w+)", batched_query) == [
+        (f"s{i}_{field}", field, f"did_{i}") for i in range(batch_size) for field in ("first", "second_field")
+    ]
+    for i in range(batch_size):
+        assert f"s{i}_second_field: second_field(stakeholderDid: $did_{i}, limit: $limit_{i})" in batched_query
+        assert f"nested(limit: $limit_{i}) {{ value }}" in batched_query
+
+
+def test_split_data_matches_single_queries():
+    dids = [f"did:c{i}" for i in range(11)]
+    query = query_registry.get(GraphQLQueryFPath.APPLICATION_PROVIDER).document
+    batched_query = build_batched_graphql_query(query, len(dids))
+    variables = build_batched_graphql_variables([{"did": did} for did in dids])
+    assert variables["did_10"] == "did:c10"
+
+    noise = random.Random(0)
+    split_data = split_batched_graphql_data(resolve_query(batched_query, variables, noise), len(dids))
+    assert split_data == [resolve_query(query, {"did": did}, noise) for did in dids]
+
+
+def test_failed_requests_and_missing_aliases_give_empty_data():
+    assert split_batched_graphql_data(None, 2) == [None, None]
+    assert split_batched_graphql_data({"s1_first": {"trust": 0.5}}, 2) == [{}, {"first": {"trust": 0.5}}]
+
+
+def test_targets_without_a_did_are_skipped(aggregator):
+    capacity, provider = GraphQLQueryFPath.RESOURCE_CAPACITY, GraphQLQueryFPath.RESOURCE_PROVIDER
+    query_targets = [("did:c0", capacity), (None, provider), ("did:c1", capacity), ("did:c0", capacity)]
+    assert list(_chunk_query_targets(query_targets, 1)) == [(capacity, ["did:c0"]), (capacity, ["did:c1"])]
+
+    aggregator.status = 503
+    assert get_new_attributes_batch(query_targets, 10) == {"did:c0": {}, "did:c1": {}}
+    assert [request["variables"] for request in aggregator.requests] == [{"did_0": "did:c0", "did_1": "did:c1"}]
+
+
+@pytest.mark.parametrize("behaviour", [1, -1, 0])
+@pytest.mark.parametrize("minimum, maximum", [(0.0, 1.0), (-5.0, 20.0), (3.0, 3.0)])
+def test_prob_transform_array_matches_scalar(minimum, maximum, behaviour):
+    # Values below, at and above the limits, and inside the range
+    values = np.concatenate([[minimum - 1, minimum, maximum, maximum + 1], np.linspace(minimum, maximum, 23)])
+    expected = [prob_transform(minimum, maximum, behaviour, value) for value in values]
+    assert prob_transform_array(minimum, maximum, behaviour, values).tolist() == pytest.approx(expected, rel=1e-15)
+
+    behaviours = np.full(len(values), behaviour)
+    assert prob_transform_array(np.full(len(values), minimum), maximum, behaviours, values).tolist() == pytest.approx(
+        expected, rel=1e-15
+    )
+
+
+def test_prob_transform_array_rejects_unknown_behaviours():
+    with pytest.raises(ValueError):
+        prob_transform_array(0.0, 1.0, [1, 2], [0.5, 0.5])
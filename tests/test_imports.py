@@ -0,0 +1,22 @@
+import subprocess
+import sys
+
+
+def test_importing_the_app_does_not_read_the_settings():
+    # Without the environment of the tests, building the settings would fail
+    result = subprocess.run(
+        [sys.executable, "-c", "import sys, app.trust_evaluation.endpoints, app.utils.settings as s; "
+                               "assert s._settings is None"],
+        env={}, capture_output=True, text=True
+    )
+    assert result.returncode == 0, result.stderr
+
+
+def test_the_trust_engine_does_not_import_the_web_stack():
+    result = subprocess.run(
+        [sys.executable, "-c", "import sys, app.trust_evaluation.trust_evaluator; "
+                               "print(sorted({'fastapi', 'httpx', 'sqlalchemy', 'sqlmodel'} & set(sys.modules)))"],
+        env={}, capture_output=True, text=True
+    )
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == "[]"
@@ -0,0 +1,62 @@
+import random
+
+import numpy as np
+import pytest
+
+from app.trust_evaluation.probabilistic import SingleFeatureTrustModel, SingleFeatureTrustModelBank
+
+
+def test_window_volatility_matches_numpy():
+    rng = random.Random(7)
+    model = SingleFeatureTrustModel("availability")
+    measurements = []
+    for _ in range(50):
+        observation = rng.random()
+        model.observe(observation)
+        measurements.append(observation)
+        window = measurements[-model.window_size:]
+        expected = np.std(window) if len(window) >= 2 else 0.0
+        assert model.estimate_volatility() == pytest.approx(expected, abs=1e-13)
+    assert model.measurements == tuple(measurements[-model.window_size:])
+
+
+def test_measurements_are_read_only():
+    model = SingleFeatureTrustModel("availability")
+    model.observe(0.5)
+    with pytest.raises(AttributeError):
+        model.measurements.append(0.7)
+    model.measurements = [0.1, 0.2]
+    assert model.measurements == (0.1, 0.2)
+
+
+
+@pytest.mark.parametrize("window_size", [0, -1])
+def test_empty_windows_are_rejected(window_size):
+    with pytest.raises(ValueError):
+        SingleFeatureTrustModel("availability", window_size=window_size)
+    with pytest.raises(ValueError):
+        SingleFeatureTrustModelBank(1, ["availability"], window_size=window_size)
+
+def test_bank_matches_scalar_models():
+    rng = random.Random(11)
+    names = ["availability", "latency"]
+    models = [[SingleFeatureTrustModel(name) for name in names] for _ in range(3)]
+    bank = SingleFeatureTrustModelBank(len(models), names)
+    for _ in range(20):
+        # Missing measurements are NaN in the bank and not observed by the scalar models
+        observations = [[rng.random() if rng.random() > 0.2 else np.nan for _ in names] for _ in models]
+        bank.observe(observations)
+        for row, row_models in enumerate(models):
+            for column, model in enumerate(row_models):
+                if not np.isnan(observations[row][column]):
+                    model.observe(observations[row][column])
+
+    for row, row_models in enumerate(models):
+        for column, model in enumerate(row_models):
+            bank_state, state = bank.get_state(row, column), model.get_state()
+            assert bank_state["measurements"] == state["measurements"]
+            # The scalar model updates its volatility incrementally, so both only agree up to rounding
+            for key in ("alpha", "beta", "n_eff"):
+                assert bank_state[key] == pytest.approx(state[key], rel=1e-12)
+            assert bank.adjusted_trust_score[row, column] == pytest.approx(model.adjusted_trust_score, rel=1e-12)
+            assert bank.to_model(row, column).get_state() == bank_state
@@ -0,0 +1,30 @@
+from app.models.stakeholder import ApplicationProvider, ResourceCapacity, ResourceProvider
+from app.trust_evaluation.registry import TrustedStakeholderRegistry
+
+
+def test_registry_indexes_capacities_by_provider():
+    provider = ResourceProvider("P0", "did:p0")
+    capacities = [ResourceCapacity("C0", "did:c0", provider), ResourceCapacity("C1", "did:c1", provider)]
+    registry = TrustedStakeholderRegistry()
+    registry.add(capacities[1])
+    registry.add(ApplicationProvider("A0", "did:a0"))
+    registry.add(provider)
+    registry.add(capacities[0])
+    registry.add_raw("did:c2", "C2", "did:p1")
+    registry.add(capacities[1])
+
+    assert [(name, did.raw) for name, did in registry.as_list()] == [
+        ("C1", "did:c1"), ("A0", "did:a0"), ("P0", "did:p0"), ("C0", "did:c0"), ("C2", "did:c2")
+    ]
+    assert len(registry) == 5 and "did:c0" in registry and "did:x0" not in registry
+    assert registry.trusted_capacities("did:p0") == {"did:c0", "did:c1"}
+    assert registry.trusted_capacities("did:p1") == {"did:c2"}
+    assert registry.trusted_capacities("did:a0") == set()
+
+    registry.remove("did:c1")
+    registry.remove("did:c2")
+    registry.remove("did:x0")
+    assert "did:c1" not in registry and len(registry) == 3
+    assert registry.trusted_capacities("did:p0") == {"did:c0"}
+    assert registry.trusted_capacities("did:p1") == set()
+    assert [did.raw for _, did in registry.as_list()] == ["did:a0", "did:p0", "did:c0"]
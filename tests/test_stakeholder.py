@@ -0,0 +1,70 @@
+import random
+
+import pytest
+
+from app.models.graphql_queries import query_registry
+from app.models.stakeholder import ApplicationProvider, AttributeBinder, ResourceCapacity, ResourceProvider
+from app.utils.helpers import camel_to_snake_case
+from benchmarks.fake_aggregator import resolve_query
+
+
+def bind_with_lookups(stakeholder, new_trust_attributes: dict):
+    """The former binding of update_attributes, which converted and looked up every name of a response."""
+    for trust_attribute_key, trust_attribute_value in new_trust_attributes.items():
+        for attr_key, attr_value in trust_attribute_value.items():
+            trust_attribute = getattr(stakeholder, camel_to_snake_case(trust_attribute_key))
+            if camel_to_snake_case(trust_attribute_key) == 'performance':
+                if (trust_attribute and
+                        hasattr(trust_attribute, 'metrics') and
+                        camel_to_snake_case(attr_key) in trust_attribute.metrics):
+                    trust_attribute.metrics[camel_to_snake_case(attr_key)].append(attr_value)
+            else:
+                if trust_attribute and hasattr(trust_attribute, camel_to_snake_case(attr_key)):
+                    setattr(trust_attribute, camel_to_snake_case(attr_key), attr_value)
+
+
+def attribute_values(stakeholder) -> dict:
+    """Values of the members of the trust attributes of a stakeholder, except performance models and DIDs."""
+    return {
+        name: {
+            member: getattr(trust_attribute, member)
+            for cls in type(trust_attribute).__mro__ for member in getattr(cls, "__slots__", ())
+            if member not in ("sftm", "did")
+        }
+        for name, trust_attribute in vars(stakeholder).items() if hasattr(trust_attribute, "trust")
+    }
+
+
+def build_stakeholders(index: int):
+    provider = ResourceProvider(f"P{index}", f"did:p{index}")
+    return [
+        provider, ResourceCapacity(f"C{index}", f"did:c{index}", provider), ApplicationProvider(f"A{index}", f"did:a{index}")
+    ]
+
+
+def test_binder_binds_like_the_name_lookups():
+    noise = random.Random(0)
+    binders = {}
+    for index in range(3):
+        for stakeholder, expected_stakeholder, unbound_stakeholder in zip(
+            build_stakeholders(index), build_stakeholders(index), build_stakeholders(index)
+        ):
+            query = query_registry.get(stakeholder.graphql_query_fpath).document
+            new_trust_attributes = resolve_query(query, {"did": stakeholder.did.raw}, noise)
+            # Subfields without a member or metric are ignored
+            new_trust_attributes["reputation"]["unknownField"] = 0.1
+            if "performance" in new_trust_attributes:
+                new_trust_attributes["performance"]["unknownMetric"] = 0.2
+
+            binders.setdefault(type(stakeholder), AttributeBinder()).bind(stakeholder, new_trust_attributes)
+            bind_with_lookups(expected_stakeholder, new_trust_attributes)
+            assert attribute_values(stakeholder) == attribute_values(expected_stakeholder)
+            assert attribute_values(stakeholder) != attribute_values(unbound_stakeholder)
+
+
+def test_binder_rejects_unknown_fields():
+    stakeholder = ApplicationProvider("A0", "did:a0")
+    with pytest.raises(AttributeError):
+        AttributeBinder().bind(stakeholder, {"performance": {"availability": 0.5}})
+    with pytest.raises(AttributeError):
+        bind_with_lookups(stakeholder, {"performance": {"availability": 0.5}})
@@ -0,0 +1,69 @@
+import pytest
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from app.models.sql_models import TrustModelState
+from app.trust_evaluation.probabilistic import SingleFeatureTrustModelBank
+from app.trust_evaluation.state_store import TrustModelStateStore
+
+METRICS = ["availability", "latency"]
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    SQLModel.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+def restore(store, dids):
+    performance_models = SingleFeatureTrustModelBank(len(dids), METRICS)
+    store.restore_bank(performance_models, dids)
+    return performance_models
+
+
+def stored_n_eff(engine):
+    with Session(engine) as session:
+        return {(state.did, state.metric): state.n_eff for state in session.exec(select(TrustModelState))}
+
+
+def test_measurements_are_observed_once_per_interval(engine):
+    with TrustModelStateStore(engine, observation_interval=3600) as store:
+        restore(store, ["did:c0"]).observe([[0.9, float("nan")]])
+        store.flush()
+    n_eff = stored_n_eff(engine)
+    # Metrics without a measurement are not written
+    assert list(n_eff) == [("did:c0", "availability")]
+
+    with TrustModelStateStore(engine, observation_interval=3600) as store:
+        performance_models = restore(store, ["did:c0"])
+        performance_models.observe([[0.9, 0.5]])
+        assert performance_models.n_eff[0, 0] == n_eff["did:c0", "availability"]
+        store.flush()
+    assert stored_n_eff(engine)["did:c0", "availability"] == n_eff["did:c0", "availability"]
+
+    with TrustModelStateStore(engine) as store:
+        restore(store, ["did:c0"]).observe([[0.9, 0.5]])
+        store.flush()
+    assert stored_n_eff(engine)["did:c0", "availability"] > n_eff["did:c0", "availability"]
+
+
+def test_flush_keeps_states_written_concurrently(engine):
+    with TrustModelStateStore(engine) as store:
+        restore(store, ["did:c0"]).observe([[0.9, 0.5]])
+        store.flush()
+
+    with TrustModelStateStore(engine) as first_store, TrustModelStateStore(engine) as second_store:
+        first_models = restore(first_store, ["did:c0", "did:c1"])
+        second_models = restore(second_store, ["did:c0", "did:c1"])
+        first_models.observe([[0.9, 0.5], [0.2, 0.3]])
+        second_models.observe([[0.1, 0.1], [0.8, 0.8]])
+        first_store.flush()
+        second_store.flush()
+
+    with Session(engine) as session:
+        states = {(state.did, state.metric): state for state in session.exec(select(TrustModelState))}
+    for row, did in enumerate(["did:c0", "did:c1"]):
+        for column, metric in enumerate(METRICS):
+            assert states[did, metric].alpha == first_models.alpha[row, column]
@@ -0,0 +1,140 @@
+import logging
+
+import numpy as np
+import pytest
+
+from app.models.stakeholder import ApplicationProvider, ResourceCapacity, ResourceProvider
+from app.trust_evaluation.probabilistic import SingleFeatureTrustModelBank
+from app.trust_evaluation.table import METRIC_COLUMNS, METRIC_FIELD_COLUMNS, StakeholderTable
+from app.trust_evaluation.trust_evaluator import DualModelTrustEvaluator, TrustEvaluator
+from app.utils.helpers import StakeholderType
+from app.models.attributes import TrustCalcModel
+from app.utils.metrics import DISTRUST
+
+
+def build_table():
+    return StakeholderTable(
+        ["did:p0", "did:c0", "x:c1", "did:a0"],
+        ["P0", "C0", "C1", "A0"],
+        [StakeholderType.RESOURCE_PROVIDER, StakeholderType.RESOURCE_CAPACITY, StakeholderType.RESOURCE_CAPACITY,
+         StakeholderType.APPLICATION_PROVIDER],
+        [-1, 0, 0, -1]
+    )
+
+
+def test_evaluate_table_logs_distrust_at_debug_level(caplog):
+    table = build_table()
+    rows = np.arange(len(table))
+    trust_attributes = {did: {} for did in table.dids}
+
+    with caplog.at_level(logging.DEBUG, logger="app.trust_evaluation.trust_evaluator"):
+        probabilistic_trust, deterministic_trust = DualModelTrustEvaluator().evaluate_table(
+            table, rows, trust_attributes
+        )
+
+    assert "C1: distrust due to identity" in caplog.messages
+    assert probabilistic_trust[2] == deterministic_trust[2] == 0
+
+
+def test_distrust_is_counted_once_per_model():
+    table = build_table()
+    before = dict(DISTRUST._values)
+    DualModelTrustEvaluator().evaluate_table(table, np.arange(len(table)), {did: {} for did in table.dids})
+
+    for model in ("probabilistic", "deterministic"):
+        assert DISTRUST._values[model, "identity"] - before.get((model, "identity"), 0) == 1
+
+
+def build_stakeholders():
+    provider = ResourceProvider("P0", "did:p0")
+    return [provider], [
+        ResourceCapacity("C0", "did:c0", provider),
+        ResourceCapacity("C1", "did:c1", provider),
+        ResourceCapacity("C2", "x:c2", provider),
+        ApplicationProvider("A0", "did:a0"),
+        ResourceCapacity("C3", "did:c3", provider),
+    ]
+
+
+def trust_attributes(round_index):
+    """
+    Attributes of `build_stakeholders` for one round, C1 misses half of its metrics, C2 is distrusted and
+    the request of C3 failed.
+    """
+    metrics = list(METRIC_FIELD_COLUMNS)
+    return {
+        "did:p0": {"compliance": {"trust": 0.9}, "reputation": {"trust": 0.8}},
+        "did:c0": {"performance": {field: 0.1 * (column + round_index) for column, field in enumerate(metrics)},
+                   "historicalBehavior": {"trust": 0.7}},
+        "did:c1": {"performance": {field: 0.3 + 0.05 * round_index for field in metrics[::2]},
+                   "location": {"lat": 46.05, "lon": 14.5}},
+        "x:c2": {"performance": {field: 0.5 for field in metrics}},
+        "did:a0": {"compliance": {"trust": 0.6}},
+        "did:c3": {},
+    }
+
+
+def trusted_dids(evaluator):
+    return [did.raw for _, did in evaluator.trusted_stakeholders.as_list()]
+
+
+def evaluate_objects(evaluator, providers, stakeholders, attributes):
+    """Evaluate with `compute_trust` one stakeholder at a time, providers first."""
+    trust = []
+    for stakeholder in providers + stakeholders:
+        evaluator.compute_trust(stakeholder, attributes[stakeholder.did.raw])
+        evaluator.trust_evaluation(stakeholder)
+        trust.append(stakeholder.trust)
+    return trust
+
+
+@pytest.mark.parametrize("model", [TrustCalcModel.PROBABILISTIC, TrustCalcModel.DETERMINISTIC])
+def test_batch_matches_objects(model):
+    object_evaluator, batch_evaluator = TrustEvaluator(model), TrustEvaluator(model)
+    object_stakeholders, batch_stakeholders = build_stakeholders(), build_stakeholders()
+
+    for round_index in range(3):
+        attributes = trust_attributes(round_index)
+        object_trust = evaluate_objects(object_evaluator, *object_stakeholders, attributes)
+        batch_trust = []
+        for stakeholders in batch_stakeholders:
+            batch_trust.extend(batch_evaluator.compute_trust_batch(stakeholders, attributes))
+            for stakeholder in stakeholders:
+                batch_evaluator.trust_evaluation(stakeholder)
+
+        # The weighted sum of a group is one matrix-vector product, its rounding can differ from np.dot per object
+        assert batch_trust == pytest.approx(object_trust, rel=1e-12, abs=0)
+        assert object_trust[3] == 0
+        assert trusted_dids(batch_evaluator) == trusted_dids(object_evaluator)
+
+
+def test_table_matches_objects():
+    object_evaluator, table_evaluator = DualModelTrustEvaluator(), DualModelTrustEvaluator()
+    providers, stakeholders = build_stakeholders()
+    table = StakeholderTable(
+        ["did:p0", "did:c0", "did:c1", "x:c2", "did:a0", "did:c3"],
+        ["P0", "C0", "C1", "C2", "A0", "C3"],
+        [StakeholderType.RESOURCE_PROVIDER] + [StakeholderType.RESOURCE_CAPACITY] * 3
+        + [StakeholderType.APPLICATION_PROVIDER, StakeholderType.RESOURCE_CAPACITY],
+        [-1, 0, 0, 0, -1, 0]
+    )
+    performance_models = SingleFeatureTrustModelBank(4, METRIC_COLUMNS)
+
+    for round_index in range(3):
+        attributes = trust_attributes(round_index)
+        object_trust = [
+            object_evaluator.evaluate(stakeholder, attributes[stakeholder.did.raw])
+            for stakeholder in providers + stakeholders
+        ]
+        provider_trust = table_evaluator.evaluate_table(table, np.arange(1), attributes)
+        stakeholder_trust = table_evaluator.evaluate_table(table, np.arange(1, 6), attributes, performance_models)
+        probabilistic_trust, deterministic_trust = (
+            np.concatenate(trust) for trust in zip(provider_trust, stakeholder_trust)
+        )
+
+        # The bank and the matrix-vector products only agree with the objects up to rounding
+        assert list(probabilistic_trust) == pytest.approx([trust for trust, _ in object_trust], rel=1e-12, abs=0)
+        assert list(deterministic_trust) == pytest.approx([trust for _, trust in object_trust], rel=1e-12, abs=0)
+        assert probabilistic_trust[3] == deterministic_trust[3] == 0
+        for evaluator in ("probabilistic", "deterministic"):
+            assert trusted_dids(getattr(table_evaluator, evaluator)) == trusted_dids(getattr(object_evaluator, evaluator))